@@ -0,0 +1,24 @@
+"""add attachment thumbnails
+
+Revision ID: V20261018__10
+Revises: V20261018__9
+Create Date: 2026-10-18 18:02:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__10'
+down_revision = 'V20261018__9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('attachments', sa.Column('thumbnail', sa.String(length=220), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('attachments', 'thumbnail')
@@ -0,0 +1,44 @@
+"""add ledger counters
+
+Revision ID: V20261018__1
+Revises: V20240308__1
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import fastapi_users_db_sqlalchemy
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__1'
+down_revision = 'V20240308__1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ledger_counters',
+        sa.Column('user_id', fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('amount_sum', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name=op.f('fk_ledger_counters_user_id_user'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'kind', name=op.f('pk_ledger_counters'))
+    )
+    # Backfill, afterwards the app keeps the counters up to date
+    op.execute(
+        """
+        INSERT INTO ledger_counters (user_id, kind, row_count, amount_sum)
+        SELECT user_id, 'expense', count(*), sum(amount)
+        FROM expenses GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 'invoice', count(*), sum(amount)
+        FROM invoices GROUP BY user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ledger_counters')
@@ -0,0 +1,60 @@
+"""add search indexes
+
+Revision ID: V20261018__2
+Revises: V20261018__1
+Create Date: 2026-10-18 11:40:07.915344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__2'
+down_revision = 'V20261018__1'
+branch_labels = None
+depends_on = None
+
+TRGM_INDEXES = [
+    ('ix_expenses_title_trgm', 'expenses', 'title'),
+    ('ix_expenses_description_trgm', 'expenses', 'description'),
+    ('ix_invoices_title_trgm', 'invoices', 'title'),
+    ('ix_invoices_description_trgm', 'invoices', 'description'),
+]
+
+
+def upgrade() -> None:
+    # On RDS pg_trgm is trusted, the app user can create it
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # GIN builds on big tables take a while, CONCURRENTLY keeps writes going
+    # but can't run in a transaction
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        for name, table, column in TRGM_INDEXES:
+            # A failed concurrent build leaves an INVALID index behind
+            invalid = connection.scalar(
+                sa.text(
+                    "SELECT NOT indisvalid FROM pg_index"
+                    " WHERE indexrelid = to_regclass(:name)"
+                ),
+                {"name": name},
+            )
+            if invalid:
+                op.drop_index(
+                    name, table_name=table, postgresql_concurrently=True
+                )
+            op.create_index(
+                name, table, [column], unique=False,
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(TRGM_INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True,
+                if_exists=True,
+            )
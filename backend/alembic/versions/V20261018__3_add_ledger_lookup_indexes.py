@@ -0,0 +1,63 @@
+"""add ledger lookup indexes
+
+Revision ID: V20261018__3
+Revises: V20261018__2
+Create Date: 2026-10-18 13:05:44.120937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__3'
+down_revision = 'V20261018__2'
+branch_labels = None
+depends_on = None
+
+# Match the model query shapes, where user_id = ? order by id desc for the
+# lists, the keyset sort keys, and the log lookups by parent id
+INDEXES = [
+    ('ix_expenses_user_id_id', 'expenses', ['user_id', sa.text('id DESC')]),
+    ('ix_expenses_user_id_created', 'expenses', ['user_id', 'created', 'id']),
+    ('ix_expenses_user_id_amount', 'expenses', ['user_id', 'amount', 'id']),
+    ('ix_invoices_user_id_id', 'invoices', ['user_id', sa.text('id DESC')]),
+    ('ix_invoices_user_id_created', 'invoices', ['user_id', 'created', 'id']),
+    ('ix_invoices_user_id_amount', 'invoices', ['user_id', 'amount', 'id']),
+    ('ix_expense_logs_user_id_id', 'expense_logs', ['user_id', sa.text('id DESC')]),
+    ('ix_expense_logs_expense_id_id', 'expense_logs', ['expense_id', sa.text('id DESC')]),
+    ('ix_invoice_logs_user_id_id', 'invoice_logs', ['user_id', sa.text('id DESC')]),
+    ('ix_invoice_logs_invoice_id_id', 'invoice_logs', ['invoice_id', sa.text('id DESC')]),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY doesn't lock out writes but can't run in a transaction
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            # A failed concurrent build leaves an INVALID index behind
+            invalid = connection.scalar(
+                sa.text(
+                    "SELECT NOT indisvalid FROM pg_index"
+                    " WHERE indexrelid = to_regclass(:name)"
+                ),
+                {"name": name},
+            )
+            if invalid:
+                op.drop_index(
+                    name, table_name=table, postgresql_concurrently=True
+                )
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,53 @@
+"""add expense import ref
+
+Revision ID: V20261018__4
+Revises: V20261018__3
+Create Date: 2026-10-18 14:20:31.507262
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__4'
+down_revision = 'V20261018__3'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_expenses_user_id_import_ref'
+
+
+def upgrade() -> None:
+    # Nullable without a default, a catalog only change
+    op.add_column(
+        'expenses', sa.Column('import_ref', sa.String(length=64), nullable=True)
+    )
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        # A failed concurrent build leaves an INVALID index behind
+        invalid = connection.scalar(
+            sa.text(
+                "SELECT NOT indisvalid FROM pg_index"
+                " WHERE indexrelid = to_regclass(:name)"
+            ),
+            {"name": INDEX},
+        )
+        if invalid:
+            op.drop_index(
+                INDEX, table_name='expenses', postgresql_concurrently=True
+            )
+        op.create_index(
+            INDEX, 'expenses', ['user_id', 'import_ref'], unique=True,
+            postgresql_where=sa.text('import_ref IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX, table_name='expenses', postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column('expenses', 'import_ref')
@@ -0,0 +1,49 @@
+"""add ledger monthly rollup
+
+Revision ID: V20261018__5
+Revises: V20261018__4
+Create Date: 2026-10-18 15:02:48.331905
+
+"""
+from alembic import op
+import fastapi_users_db_sqlalchemy
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__5'
+down_revision = 'V20261018__4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ledger_monthly_rollup',
+        sa.Column('user_id', fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('currency_code', sa.String(length=10), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('amount_sum', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name=op.f('fk_ledger_monthly_rollup_user_id_user'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'kind', 'currency_code', name=op.f('pk_ledger_monthly_rollup'))
+    )
+    # Backfill in UTC months, afterwards the app keeps the rollup up to date
+    op.execute(
+        """
+        INSERT INTO ledger_monthly_rollup
+            (user_id, month, kind, currency_code, row_count, amount_sum)
+        SELECT user_id, date_trunc('month', created AT TIME ZONE 'UTC')::date,
+            'expense', currency_code, count(*), sum(amount)
+        FROM expenses GROUP BY 1, 2, 4
+        UNION ALL
+        SELECT user_id, date_trunc('month', created AT TIME ZONE 'UTC')::date,
+            'invoice', currency_code, count(*), sum(amount)
+        FROM invoices GROUP BY 1, 2, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ledger_monthly_rollup')
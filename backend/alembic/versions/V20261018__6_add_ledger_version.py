@@ -0,0 +1,33 @@
+"""add expense and invoice version
+
+Revision ID: V20261018__6
+Revises: V20261018__5
+Create Date: 2026-10-18 18:02:14.731604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__6'
+down_revision = 'V20261018__5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A constant default is stored in the catalog, no table rewrite
+    for table in ('expenses', 'invoices'):
+        op.add_column(
+            table,
+            sa.Column(
+                'version', sa.Integer(), server_default=sa.text('1'),
+                nullable=False,
+            ),
+        )
+
+
+def downgrade() -> None:
+    for table in ('expenses', 'invoices'):
+        op.drop_column(table, 'version')
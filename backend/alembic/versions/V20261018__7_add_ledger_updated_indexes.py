@@ -0,0 +1,54 @@
+"""add ledger updated indexes
+
+Revision ID: V20261018__7
+Revises: V20261018__6
+Create Date: 2026-10-18 19:42:10.508311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__7'
+down_revision = 'V20261018__6'
+branch_labels = None
+depends_on = None
+
+# max(updated) per user, the part of a list's ETag that moves on updates
+INDEXES = [
+    ('ix_expenses_user_id_updated', 'expenses', ['user_id', 'updated']),
+    ('ix_invoices_user_id_updated', 'invoices', ['user_id', 'updated']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY doesn't lock out writes but can't run in a transaction
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            # A failed concurrent build leaves an INVALID index behind
+            invalid = connection.scalar(
+                sa.text(
+                    "SELECT NOT indisvalid FROM pg_index"
+                    " WHERE indexrelid = to_regclass(:name)"
+                ),
+                {"name": name},
+            )
+            if invalid:
+                op.drop_index(
+                    name, table_name=table, postgresql_concurrently=True
+                )
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,41 @@
+"""store attachment keys
+
+Revision ID: V20261018__8
+Revises: V20261018__7
+Create Date: 2026-10-18 14:05:31.118204
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__8'
+down_revision = 'V20261018__7'
+branch_labels = None
+depends_on = None
+
+TABLES = ['expenses', 'invoices']
+# Attachments were public objects stored as their URL, they're stored as
+# their key now and read through presigned URLs
+LOCATION = 'https://{bucket}.s3.eu-central-1.amazonaws.com/'
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(sa.text(
+            f"UPDATE {table} SET attachment"
+            " = regexp_replace(attachment, '^https://[^/]+/', '')"
+            " WHERE attachment LIKE 'https://%'"
+        ))
+
+
+def downgrade() -> None:
+    location = LOCATION.format(bucket=os.getenv("STORAGE_BUCKET"))
+    for table in TABLES:
+        op.execute(sa.text(
+            f"UPDATE {table} SET attachment = :location || attachment"
+            " WHERE attachment NOT LIKE 'https://%'"
+        ).bindparams(location=location))
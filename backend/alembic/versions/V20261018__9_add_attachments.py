@@ -0,0 +1,53 @@
+"""add attachments
+
+Revision ID: V20261018__9
+Revises: V20261018__8
+Create Date: 2026-10-18 16:21:07.904518
+
+"""
+from alembic import op
+import fastapi_users_db_sqlalchemy
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'V20261018__9'
+down_revision = 'V20261018__8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'attachments',
+        sa.Column('key', sa.String(length=200), nullable=False),
+        sa.Column('user_id', fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('refs', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name=op.f('fk_attachments_user_id_user'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('key', name=op.f('pk_attachments'))
+    )
+    op.create_index('ix_attachments_user_id', 'attachments', ['user_id'], unique=False)
+    # Objects already stored keep their key, without a hash. Only the
+    # user's own keys are counted, anything else an invoice points at
+    # isn't ours to delete.
+    op.execute(
+        """
+        INSERT INTO attachments (key, user_id, refs)
+        SELECT attachment, user_id, count(*) FROM (
+            SELECT attachment, user_id FROM expenses
+            UNION ALL
+            SELECT attachment, user_id FROM invoices
+        ) AS refs
+        WHERE attachment LIKE user_id::text || '/%'
+        GROUP BY attachment, user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attachments_user_id', table_name='attachments')
+    op.drop_table('attachments')
@@ -1,21 +1,149 @@
+import asyncio
 import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import AsyncGenerator
 
 from app import settings
-from sqlalchemy import MetaData
+from app.utils.response_cache import response_cache
+from sqlalchemy import MetaData, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import registry, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 db_user = os.getenv("DB_USER")
 db_password = os.getenv("DB_PASSWORD")
 db_address = os.getenv("DB_ADDRESS")
 db_port = os.getenv("DB_PORT")
-DATABASE_URL = (
-    f"postgresql+asyncpg://{db_user}:{db_password}"
-    f"@{db_address}:{db_port}/{settings.app_name}"
-)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def build_database_url(address, port) -> str:
+    return (
+        f"postgresql+asyncpg://{db_user}:{db_password}"
+        f"@{address}:{port}/{settings.app_name}"
+    )
+
+
+DATABASE_URL = build_database_url(db_address, db_port)
+
+
+class PoolStats:
+    # Upper bounds in milliseconds, the last bucket catches everything else
+    wait_buckets_ms = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_histogram = [0] * (len(self.wait_buckets_ms) + 1)
+
+    def record_wait(self, elapsed_ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += elapsed_ms
+            self.wait_max_ms = max(self.wait_max_ms, elapsed_ms)
+            self.wait_histogram[
+                bisect_left(self.wait_buckets_ms, elapsed_ms)
+            ] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{b}ms" for b in self.wait_buckets_ms] + ["inf"]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": (
+                    self.wait_total_ms / self.checkouts
+                    if self.checkouts else 0.0
+                ),
+                "wait_max_ms": self.wait_max_ms,
+                "wait_histogram": dict(zip(labels, self.wait_histogram)),
+            }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool recording how long every checkout waited for a connection,
+    including the time needed to open a new one.
+    """
+    stats = pool_stats
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+
+def get_engine_options(stats: PoolStats = pool_stats) -> dict:
+    poolclass = InstrumentedAsyncAdaptedQueuePool
+    if stats is not pool_stats:
+        # Pools are recreated by class on dispose, so the stats instance
+        # has to live on the class rather than on the pool
+        poolclass = type(poolclass.__name__, (poolclass,), {"stats": stats})
+    options = {
+        "echo": settings.db_echo,
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        },
+    }
+    if settings.db_pgbouncer_transaction_mode:
+        # https://docs.sqlalchemy.org/en/20/dialects/postgresql.html#using-connection-pools-with-pgbouncer
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Server connections are shared, the names must not collide
+            "prepared_statement_name_func": (
+                lambda: f"__asyncpg_{uuid.uuid4()}__"
+            ),
+        }
+    return options
+
+
+def get_pool_status(engine) -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+        "timeout": pool.timeout(),
+        **pool.stats.snapshot(),
+    }
+
+
+engine = create_async_engine(DATABASE_URL, **get_engine_options())
 async_session = sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
@@ -33,12 +161,217 @@ mapper_registry = registry(
 )
 
 
+class RequestSession:
+    """
+    Unit of work shared by everything running inside one HTTP request, the
+    fastapi-users dependencies and the model methods alike. The session is
+    opened on first use and committed once by DBSessionMiddleware.
+
+    An AsyncSession must not be used by two tasks at the same time, so code
+    that fans out with asyncio.gather has to open a session per task instead
+    of going through get_db / get_db_cm. Once the response has started the
+    unit of work is finished and anything running later, like background
+    tasks or streaming bodies, gets its own session.
+    """
+    def __init__(self):
+        self.session: AsyncSession | None = None
+        self.finished = False
+
+    def get(self) -> AsyncSession:
+        if self.session is None:
+            self.session = async_session()
+        return self.session
+
+    async def commit(self):
+        if self.session is not None and self.session.in_transaction():
+            await self.session.commit()
+            await response_cache.invalidate(record_user_writes(self.session))
+            run_after_commit(self.session)
+
+    async def close(self):
+        if self.session is not None:
+            # Anything not committed by now is rolled back, so are its writes
+            # and whatever was cached after reading them
+            await response_cache.invalidate(
+                self.session.info.pop("written_users", ())
+            )
+            self.session.info.pop("after_commit", None)
+            await self.session.close()
+            self.session = None
+
+    async def finish(self, commit: bool):
+        if commit:
+            await self.commit()
+        await self.close()
+        self.finished = True
+
+
+def get_request_session() -> RequestSession | None:
+    request_session = request_session_var.get()
+    if request_session is None or request_session.finished:
+        return None
+    return request_session
+
+
+request_session_var: ContextVar[RequestSession | None] = ContextVar(
+    "request_session", default=None
+)
+
+
 async def get_db():
+    request_session = get_request_session()
+    if request_session is not None:
+        yield request_session.get()
+        return
     async with async_session() as session:
         yield session
 
 
 async def get_db_cm() -> AsyncGenerator:
+    request_session = get_request_session()
+    if request_session is not None:
+        # Committed by the middleware once the request is done
+        yield request_session.get()
+        return
     async with async_session() as session:
         async with session.begin():
             yield session
+        await response_cache.invalidate(record_user_writes(session))
+        run_after_commit(session)
+
+
+class Replica:
+    def __init__(self, address: str):
+        host, _, port = address.partition(":")
+        self.address = address
+        self.engine = create_async_engine(
+            build_database_url(host, port or db_port),
+            **get_engine_options(PoolStats()),
+        )
+        self.session = sessionmaker(
+            self.engine, expire_on_commit=False, class_=AsyncSession
+        )
+        self.down_until = 0.0
+        self.lag_checked_at = 0.0
+        self.lag_seconds = 0.0
+
+    @property
+    def available(self) -> bool:
+        # A lagging replica is put aside like a down one, once the deadline
+        # passes it gets picked again and its lag is re-probed
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self):
+        self.down_until = time.monotonic() + settings.db_replica_retry_after
+
+    async def check_lag(self, session: AsyncSession):
+        now = time.monotonic()
+        if now - self.lag_checked_at < settings.db_replica_lag_check_interval:
+            return
+        self.lag_checked_at = now
+        # NULL when connected to a primary, treat it as not lagging
+        lag = await session.scalar(text(
+            "SELECT COALESCE(EXTRACT(EPOCH FROM "
+            "now() - pg_last_xact_replay_timestamp()), 0)"
+        ))
+        self.lag_seconds = float(lag)
+        if self.lag_seconds > settings.db_replica_max_lag_seconds:
+            self.down_until = now + settings.db_replica_lag_check_interval
+
+
+class ReplicaRouter:
+    """
+    Picks a replica for read only sessions. Users who wrote within the
+    stickiness window read from the primary so they see their own writes.
+    The window is tracked per process, the Remix server talks to whichever
+    task the load balancer picks, so keep it above the replication lag.
+    """
+    def __init__(self, addresses: list[str]):
+        self.replicas = [Replica(address) for address in addresses]
+        self._next = 0
+        self._last_writes: dict = {}
+
+    def mark_write(self, user_id):
+        now = time.monotonic()
+        if len(self._last_writes) > 10_000:
+            window = settings.db_read_your_writes_seconds
+            self._last_writes = {
+                k: v for k, v in self._last_writes.items()
+                if now - v < window
+            }
+        self._last_writes[user_id] = now
+
+    def is_sticky(self, user_id) -> bool:
+        last_write = self._last_writes.get(user_id)
+        return last_write is not None and (
+            time.monotonic() - last_write
+            < settings.db_read_your_writes_seconds
+        )
+
+    def candidates(self, user_id) -> list[Replica]:
+        if not self.replicas or (user_id and self.is_sticky(user_id)):
+            return []
+        # Round robin, starting from the next replica in line
+        self._next = (self._next + 1) % len(self.replicas)
+        ordered = self.replicas[self._next:] + self.replicas[:self._next]
+        return [replica for replica in ordered if replica.available]
+
+    async def open_session(self, user_id) -> AsyncSession | None:
+        for replica in self.candidates(user_id):
+            session = replica.session()
+            try:
+                await session.connection()
+                await replica.check_lag(session)
+            except (OSError, DBAPIError, PoolTimeoutError,
+                    asyncio.TimeoutError):
+                replica.mark_down()
+                await session.close()
+                continue
+            if not replica.available:
+                await session.close()
+                continue
+            return session
+        return None
+
+
+replica_router = ReplicaRouter(settings.db_replica_addresses)
+
+
+def mark_user_write(session: AsyncSession, user_id):
+    """
+    Flags the user as a writer of this session. The read-your-writes window
+    starts once the session commits, see record_user_writes.
+    """
+    session.info.setdefault("written_users", set()).add(user_id)
+
+
+def record_user_writes(session: AsyncSession) -> set:
+    written_users = session.info.pop("written_users", set())
+    for user_id in written_users:
+        replica_router.mark_write(user_id)
+    return written_users
+
+
+def after_commit(session: AsyncSession, callback):
+    """
+    Calls callback once the session commits, a rollback drops it. For work
+    that must only start when what it reads is committed.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+def run_after_commit(session: AsyncSession):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+async def get_read_db_cm(user_id=None) -> AsyncGenerator:
+    session = await replica_router.open_session(user_id)
+    if session is None:
+        async with asynccontextmanager(get_db_cm)() as session:
+            yield session
+        return
+    try:
+        yield session
+    finally:
+        await session.close()
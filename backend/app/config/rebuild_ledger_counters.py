@@ -0,0 +1,16 @@
+# Recounts ledger_counters from the expenses and invoices tables. Run it after
+# bulk loading data behind the API's back, i.e. after populate_db.py.
+# python app/config/rebuild_ledger_counters.py
+import asyncio
+
+from app.models import *  # noqa
+from app.models.ledger_counter_model import LedgerCounter
+
+
+async def main():
+    await LedgerCounter.rebuild()
+    print("Ledger counters rebuilt")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
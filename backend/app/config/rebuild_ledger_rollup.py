@@ -0,0 +1,16 @@
+# Recounts ledger_monthly_rollup from the expenses and invoices tables. Run it
+# after bulk loading data behind the API's back, i.e. after populate_db.py.
+# python app/config/rebuild_ledger_rollup.py
+import asyncio
+
+from app.models import *  # noqa
+from app.models.ledger_rollup_model import LedgerMonthlyRollup
+
+
+async def main():
+    await LedgerMonthlyRollup.rebuild()
+    print("Ledger monthly rollup rebuilt")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,20 +2,29 @@ from __future__ import print_function
 
 import os
 import uuid
-from typing import Annotated, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Any, Optional
 
-import sib_api_v3_sdk
+from app import settings
 from app.models.user_model import User, get_access_token_db, get_user_db
+from app.services.email_service import (RESET_PASSWORD_TEMPLATE,
+                                        VERIFY_EMAIL_TEMPLATE, EmailJob,
+                                        email_queue)
+from app.utils.password_pool import PasswordHashPool, password_context
+from app.utils.token_cache import TokenCache
 from fastapi import Depends, Request, Response
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
+from fastapi_users import (BaseUserManager, FastAPIUsers, UUIDIDMixin,
+                          exceptions, models, schemas)
 from fastapi_users.authentication import AuthenticationBackend, BearerTransport
 from fastapi_users.authentication.strategy import (AccessTokenDatabase,
                                                    DatabaseStrategy, Strategy)
 from fastapi_users.db import SQLAlchemyUserDatabase
 from fastapi_users.password import PasswordHelper
 from httpx_oauth.clients.google import GoogleOAuth2
-from sib_api_v3_sdk.rest import ApiException
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
 
 # Key is invalid
@@ -24,38 +33,120 @@ google_oauth_client = GoogleOAuth2(
     os.getenv("GOOGLE_OAUTH_CLIENT_SECRET"),
 )
 
+token_cache = TokenCache(
+    settings.auth_cache_ttl, settings.auth_cache_max_entries
+) if settings.auth_cache_max_entries else None
+
+
+password_pool = PasswordHashPool(
+    PasswordHelper(password_context(settings.password_bcrypt_rounds)),
+    settings.password_hash_workers,
+)
+
+
+def drop_cached_user(user: User):
+    if token_cache is not None:
+        token_cache.drop_user(user.id)
+
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
+    """
+    Login, registration and password changes hash on password_pool, the
+    rarer paths (reset password, first OAuth login) still hash through
+    password_helper, the same context run inline.
+    """
     reset_password_token_secret = os.getenv("AUTH_VERIFICATION_SECRET")
     verification_token_secret = os.getenv("AUTH_VERIFICATION_SECRET")
 
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            await password_pool.hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = (
+            await password_pool.verify_and_update(
+                credentials.password, user.hashed_password
+            )
+        )
+        if not verified:
+            return None
+        # Hashed with fewer rounds than configured now, redone with them
+        if updated_password_hash is not None:
+            await self.user_db.update(
+                user, {"hashed_password": updated_password_hash}
+            )
+            drop_cached_user(user)
+        return user
+
+    async def create(
+        self, user_create: schemas.UC, safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await password_pool.hash(password)
+
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {
+                key: value for key, value in update_dict.items()
+                if key != "password"
+            }
+            update_dict["hashed_password"] = await password_pool.hash(password)
+        return await super()._update(user, update_dict)
+
     async def on_after_register(
                 self, user: User, request: Optional[Request] = None
             ):
         print(f"User {user.id} has registered.")
 
-    async def on_after_forgot_password(
-        self, user: User, token: str, request: Optional[Request] = None
+    # Password changes, deactivation and the rest go through here, the
+    # cached snapshots of the user must not outlive them
+    async def on_after_update(
+        self, user: User, update_dict: dict[str, Any],
+        request: Optional[Request] = None,
     ):
-        configuration = sib_api_v3_sdk.Configuration()
-        configuration.api_key['api-key'] = os.getenv("BREVO_API_KEY")
+        drop_cached_user(user)
 
-        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
-            sib_api_v3_sdk.ApiClient(configuration)
-        )
-        subject = "Reset your password"
-        sender = {"name": "Sando", "email": "akrachunov@gmail.com"}
-        to = [{"email": user.email}]
-        params = {"token": token}
-        send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-            sender=sender, to=to, subject=subject, template_id=2, params=params
-        )
+    async def on_after_reset_password(
+        self, user: User, request: Optional[Request] = None
+    ):
+        drop_cached_user(user)
 
-        try:
-            api_response = api_instance.send_transac_email(send_smtp_email)
-            print(api_response)
-        except ApiException as e:
-            print(f"Exception when calling SMTPApi->send_transac_email: {e}")
+    async def on_after_delete(
+        self, user: User, request: Optional[Request] = None
+    ):
+        drop_cached_user(user)
+
+    # The mail is only queued, the endpoints don't wait for Brevo
+    async def on_after_forgot_password(
+        self, user: User, token: str, request: Optional[Request] = None
+    ):
+        await email_queue.enqueue(EmailJob(
+            to=user.email, template_id=RESET_PASSWORD_TEMPLATE,
+            subject="Reset your password", params={"token": token},
+        ))
         print(
             f"User {user.id} has forgot their password. Reset token: {token}"
         )
@@ -63,26 +154,10 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     async def on_after_request_verify(
         self, user: User, token: str, request: Optional[Request] = None
     ):
-        configuration = sib_api_v3_sdk.Configuration()
-        # Key is invalid
-        configuration.api_key['api-key'] = os.getenv("BREVO_API_KEY")
-
-        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
-            sib_api_v3_sdk.ApiClient(configuration)
-        )
-        subject = "Verify your email"
-        sender = {"name": "Sando", "email": "akrachunov@gmail.com"}
-        to = [{"email": user.email}]
-        params = {"token": token}
-        send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-            sender=sender, to=to, subject=subject, template_id=1, params=params
-        )
-
-        try:
-            api_response = api_instance.send_transac_email(send_smtp_email)
-            print(api_response)
-        except ApiException as e:
-            print(f"Exception when calling SMTPApi->send_transac_email: {e}")
+        await email_queue.enqueue(EmailJob(
+            to=user.email, template_id=VERIFY_EMAIL_TEMPLATE,
+            subject="Verify your email", params={"token": token},
+        ))
         print(
             f"Verification requested for user {user.id}. "
             f"Verification token: {token}"
@@ -91,13 +166,14 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     async def on_after_verify(
             self, user: User, request: Optional[Request] = None
     ):
+        drop_cached_user(user)
         print(f"User {user.id} has been verified.")
 
 
 async def get_user_manager(
             user_db: SQLAlchemyUserDatabase = Depends(get_user_db)
         ):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_pool.helper)
 
 
 class AutoRedirectBearerAuthentication(BearerTransport):
@@ -117,12 +193,69 @@ class AutoRedirectBearerAuthentication(BearerTransport):
 bearer_transport = BearerTransport(tokenUrl="auth/bearer/login")
 
 
+def user_snapshot(user: User) -> dict:
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+    }
+
+
+def user_from_snapshot(snapshot: dict) -> User:
+    # A new detached instance per request, it can be added to the request
+    # session (PATCH /users/me) without clashing with another request's
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+class CachedDatabaseStrategy(DatabaseStrategy):
+    """
+    DatabaseStrategy reading the user of a known token from token_cache,
+    only the first request of a token queries accesstoken and user.
+    """
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager
+    ) -> Optional[User]:
+        if token is None or token_cache is None:
+            return await super().read_token(token, user_manager)
+        snapshot = token_cache.get(token)
+        if snapshot is not None:
+            return user_from_snapshot(snapshot)
+
+        now = datetime.now(timezone.utc)
+        max_age = None
+        if self.lifetime_seconds:
+            max_age = now - timedelta(seconds=self.lifetime_seconds)
+        access_token = await self.database.get_by_token(token, max_age)
+        if access_token is None:
+            return None
+        try:
+            user_id = user_manager.parse_id(access_token.user_id)
+            generation = token_cache.generation(user_id)
+            user = await user_manager.get(user_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        expires_in = None
+        if self.lifetime_seconds:
+            expires_in = (access_token.created_at - max_age).total_seconds()
+        token_cache.set(
+            token, user_id, generation, user_snapshot(user), expires_in
+        )
+        return user
+
+    async def destroy_token(self, token: str, user: User) -> None:
+        if token_cache is not None:
+            token_cache.discard(token)
+        await super().destroy_token(token, user)
+
+
 def get_database_strategy(
         access_token_db: AccessTokenDatabase = Depends(get_access_token_db)
 ) -> DatabaseStrategy:
     # TODO: The expiration time must match the value set in Remix
     # think about setting common aws parameter for production
-    return DatabaseStrategy(
+    return CachedDatabaseStrategy(
         access_token_db, lifetime_seconds=60 * 60 * 24 * 30
     )
 
@@ -8,11 +8,16 @@ from app.config.database import get_db_cm
 from app.config.users import (bearer_auth_backend, current_superuser,
                               fastapi_users, google_bearer_auth_backend,
                               google_oauth_client)
-from app.routers import (expense_log_router, expense_router,
-                         invoice_log_router, invoice_router)
+from app.routers import (admin_router, analytics_router, dashboard_router,
+                         expense_log_router, expense_router,
+                         invoice_log_router, invoice_router, summary_router)
 from app.schemas.user_schema import (UserCreate, UserRead, UserReadRegister,
                                      UserUpdate)
+from app.services.email_service import email_queue
 from app.utils.app_exceptions import AppExceptionCase, app_exception_handler
+from app.utils.db_session_middleware import DBSessionMiddleware
+from app.utils.fast_json import FastJSONResponse
+from app.utils.previews import preview_pool
 from app.utils.request_exceptions import (http_exception_handler,
                                           request_validation_exception_handler)
 from app.utils.ws_manager import WsConnectionManager
@@ -24,16 +29,39 @@ from fastapi.openapi.utils import get_openapi
 from fastapi_pagination import add_pagination
 from sqlalchemy import text
 
+
+# The email worker is started with the app, on shutdown what's still queued
+# is sent and the thumbnails being rendered are stored before the process
+# exits
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    email_queue.start()
+    yield
+    await email_queue.stop()
+    await preview_pool.stop()
+
+
+# Everything that goes through a response_model is rendered by orjson too,
+# list endpoints skip the model and hand their rows straight to it
 if os.getenv("DEV_ENVIRONMENT") == "development":
-    app = FastAPI()
+    app = FastAPI(
+        default_response_class=FastJSONResponse, lifespan=lifespan
+    )
 elif os.getenv("DEV_ENVIRONMENT") == "production":
-    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    app = FastAPI(
+        docs_url=None, redoc_url=None, openapi_url=None,
+        default_response_class=FastJSONResponse, lifespan=lifespan,
+    )
 
 logfire.configure()
 logfire.instrument_fastapi(app)
 
 ws_manager = WsConnectionManager()
 
+# One database session per request, shared by the auth dependencies and the
+# model methods and committed once before the response is sent
+app.add_middleware(DBSessionMiddleware)
+
 # TODO No any request to the API originate in the browser which means that
 # the CSRFMiddleware and the CORSMiddleware are no needed.
 # CSRFMiddleware - on first request cookie will be set in the browser.
@@ -145,6 +173,10 @@ app.include_router(expense_router.router)
 app.include_router(expense_log_router.router)
 app.include_router(invoice_router.router)
 app.include_router(invoice_log_router.router)
+app.include_router(summary_router.router)
+app.include_router(dashboard_router.router)
+app.include_router(analytics_router.router)
+app.include_router(admin_router.router)
 
 
 # Healthcheck
@@ -3,3 +3,6 @@ from app.models.expense_model import *  # noqa
 from app.models.expense_log_model import *  # noqa
 from app.models.invoice_model import *  # noqa
 from app.models.invoice_log_model import *  # noqa
+from app.models.ledger_counter_model import *  # noqa
+from app.models.ledger_rollup_model import *  # noqa
+from app.models.attachment_model import *  # noqa
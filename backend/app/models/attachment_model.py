@@ -0,0 +1,181 @@
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial
+from typing import Optional
+
+from app.config.database import (after_commit, get_db_cm, get_read_db_cm,
+                                 mapper_registry)
+from app.utils.attachments import (check_upload, content_key, digest,
+                                   thumbnail_key)
+from app.utils.aws import (StreamingUpload, copy_user_file, delete_user_file,
+                           put_user_file, read_user_file)
+from app.utils.previews import FORMATS, preview_pool
+from app.utils.service_result import ServiceResult
+from sqlalchemy import (DateTime, ForeignKey, Index, String, delete, func,
+                        select, text, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+@mapper_registry.mapped
+class Attachment:
+    """
+    A stored object and how many expenses and invoices point at it. Keys
+    are {user_id}/{sha256 of the content}, so a user's duplicate is the
+    same row and isn't stored twice. Rows from before content addressing
+    carry the key they were uploaded under and no hash. Counted in the
+    transaction of the write that adds or drops the reference, the object
+    goes with the last one. So does its thumbnail, rendered once the row
+    is committed.
+    """
+    __tablename__ = "attachments"
+    __table_args__ = (
+        Index("ix_attachments_user_id", "user_id"),
+    )
+
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE")
+    )
+    sha256: Mapped[Optional[str]] = mapped_column(String(64))
+    size: Mapped[Optional[int]]
+    content_type: Mapped[Optional[str]] = mapped_column(String(100))
+    thumbnail: Mapped[Optional[str]] = mapped_column(String(220))
+    refs: Mapped[int] = mapped_column(server_default=text("0"))
+    created: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self):
+        return f'Attachment("{self.key}", refs={self.refs})'
+
+    @classmethod
+    async def acquire(
+        cls, db: AsyncSession, user_id, key: str | None
+    ) -> bool:
+        # The row lock it takes holds off a release of the last reference
+        # until this transaction is done, or makes this miss the row after
+        if not key:
+            return False
+        q = update(cls).where(cls.key == key, cls.user_id == user_id).values(
+            refs=cls.refs + 1
+        ).returning(cls.key)
+        return await db.scalar(q) is not None
+
+    @classmethod
+    async def add(cls, db: AsyncSession, user_id, key: str, sha256: str,
+                  size: int, content_type: str):
+        q = insert(cls).values(
+            key=key, user_id=user_id, sha256=sha256, size=size,
+            content_type=content_type, refs=1,
+        )
+        q = q.on_conflict_do_update(
+            index_elements=[cls.key], set_={"refs": cls.refs + 1}
+        )
+        await db.execute(q)
+        if preview_pool.enabled(content_type):
+            after_commit(db, partial(
+                preview_pool.schedule, cls.make_thumbnail, key, content_type
+            ))
+
+    @classmethod
+    async def release(cls, db: AsyncSession, user_id, key: str | None):
+        # Keys it doesn't know (an invoice's attachment is whatever the
+        # client sent) are never deleted
+        if not key:
+            return
+        row = (await db.execute(
+            update(cls).where(cls.key == key, cls.user_id == user_id).values(
+                refs=cls.refs - 1
+            ).returning(cls.refs, cls.thumbnail)
+        )).one_or_none()
+        if row is not None and row.refs <= 0:
+            await db.execute(delete(cls).where(cls.key == key))
+            await delete_user_file(key)
+            if row.thumbnail:
+                await delete_user_file(row.thumbnail)
+
+    @classmethod
+    async def make_thumbnail(cls, key: str, content_type: str):
+        """
+        Renders the thumbnail of the object at key and stores it beside it.
+        One released in the meantime takes the thumbnail with it.
+        """
+        data = await read_user_file(key)
+        image, format = await preview_pool.render(data, content_type)
+        thumbnail = thumbnail_key(key, format)
+        await put_user_file(thumbnail, image, FORMATS[format][1])
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            stored = await db.scalar(
+                update(cls).where(cls.key == key).values(
+                    thumbnail=thumbnail
+                ).returning(cls.key)
+            )
+        if stored is None:
+            await delete_user_file(thumbnail)
+
+    @classmethod
+    async def get_thumbnail(cls, db: AsyncSession, model, item_id: int,
+                            user_id) -> str | None:
+        # The thumbnail of the attachment of an expense or an invoice
+        return await db.scalar(
+            select(cls.thumbnail).join(model, model.attachment == cls.key)
+            .where(model.id == item_id, model.user_id == user_id)
+        )
+
+    @classmethod
+    async def find(cls, user_id, sha256: str) -> str | None:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user_id) as db:
+            return await db.scalar(select(cls.key).where(
+                cls.key == content_key(user_id, sha256)
+            ))
+
+    @classmethod
+    async def store(cls, upload: StreamingUpload, user_id) -> str:
+        """
+        Finishes a streamed upload under the key of its content and counts
+        the reference. Content the user already has isn't stored again: an
+        upload smaller than a part is never sent, the parts of a bigger
+        one are dropped.
+        """
+        sha256 = upload.sha256.hexdigest()
+        key = content_key(user_id, sha256)
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            if await cls.acquire(db, user_id, key):
+                await upload.abort()
+                return key
+            await upload.complete(key)
+            await cls.add(
+                db, user_id, key, sha256, upload.size, upload.content_type
+            )
+        return key
+
+    @classmethod
+    async def adopt(
+        cls, db: AsyncSession, user_id, key: str
+    ) -> ServiceResult:
+        """
+        Counts a reference to what a presigned upload stored under key, the
+        object is moved to the key of its content or dropped for the one
+        the user already has. A key that's already counted (the one an
+        upload request with the content's sha256 got back) is taken as is.
+        """
+        if await cls.acquire(db, user_id, key):
+            return ServiceResult(key)
+        checked = await check_upload(user_id, key)
+        if not checked.success:
+            return checked
+        sha256, size, content_type = await digest(key)
+        stored = content_key(user_id, sha256)
+        if await cls.acquire(db, user_id, stored):
+            await delete_user_file(key)
+        else:
+            if key != stored:
+                await copy_user_file(key, stored)
+            await cls.add(db, user_id, stored, sha256, size, content_type)
+        return ServiceResult(stored)
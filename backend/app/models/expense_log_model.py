@@ -4,17 +4,25 @@ from multiprocessing import parent_process
 from typing import Optional
 
 from app import schemas
-from app.config.database import get_db_cm, mapper_registry
+from app.config.database import (get_db_cm, get_read_db_cm,
+                                 mapper_registry, mark_user_write)
 from app.models.base import CreatedUpdateBase
-from app.utils.app_exceptions import AppException
+from app.utils.app_exceptions import AppException, AppExceptionCase
+from app.utils.fast_json import row_dicts, schema_columns
+from app.utils.keyset import keyset_paginate
 from app.utils.service_result import ServiceResult
-from sqlalchemy import Column, DateTime, ForeignKey, String, desc, func, select
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, String, desc,
+                        func, select, text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
 @mapper_registry.mapped
 class ExpenseLog(CreatedUpdateBase):
     __tablename__ = "expense_logs"
+    __table_args__ = (
+        Index("ix_expense_logs_user_id_id", "user_id", text("id DESC")),
+        Index("ix_expense_logs_expense_id_id", "expense_id", text("id DESC")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(64))
@@ -31,13 +39,26 @@ class ExpenseLog(CreatedUpdateBase):
     def __repr__(self):
         return f'ExpenseLog({self.id}, "{self.title}")'
 
+    @classmethod
+    def of(cls, expense) -> "ExpenseLog":
+        # The state the expense was left in by a create or an update
+        return cls(
+            title=expense.title,
+            description=expense.description,
+            amount=expense.amount,
+            currency_code=expense.currency_code,
+            user_id=expense.user_id,
+            expense_id=expense.id,
+        )
+
     @classmethod
     async def create(cls, item: schemas.ExpenseLog) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, item.user_id)
             expense_log = cls(**item.model_dump())
             db.add(expense_log)
-            await db.commit()
+            await db.flush()
 
             if not expense_log:
                 return ServiceResult(AppException.CreateObject())
@@ -45,8 +66,8 @@ class ExpenseLog(CreatedUpdateBase):
 
     @classmethod
     async def get(cls, expense_log_id: int, user) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(
                 cls.id == expense_log_id, cls.user_id == user.id
             )
@@ -61,17 +82,33 @@ class ExpenseLog(CreatedUpdateBase):
 
     @classmethod
     async def get_all(cls, user, expense_id: int) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
-            q = select(cls).where(
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.ExpenseLogRead)).where(
                 cls.user_id == user.id, cls.expense_id == expense_id
             ).order_by(desc(cls.id))
-            return ServiceResult([x async for x in await db.stream_scalars(q)])
+            return ServiceResult(row_dicts(await db.execute(q)))
+
+    @classmethod
+    async def get_all_cursor(
+        cls, user, expense_id: int, cursor, sort, size
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.ExpenseLogRead)).where(
+                cls.user_id == user.id, cls.expense_id == expense_id
+            )
+            try:
+                page = await keyset_paginate(db, q, cls, cursor, sort, size)
+            except AppExceptionCase as e:
+                return ServiceResult(e)
+            return ServiceResult(dict(page, items=row_dicts(page["items"])))
 
     @classmethod
     async def delete(cls, expense_id: int, user) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
             q = select(cls).where(
                 cls.expense_id == expense_id, cls.user_id == user.id
             )
@@ -81,13 +118,14 @@ class ExpenseLog(CreatedUpdateBase):
                     AppException.GetObject({"expense_id": expense_id})
                 )
             await db.delete(expense_logs)
-            await db.commit()
+            await db.flush()
             return ServiceResult(True)
 
     @classmethod
     async def update(cls, expense_log_id, data, user) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
             q = select(cls).where(
                 cls.id == expense_log_id, cls.user_id == user.id
             )
@@ -100,6 +138,6 @@ class ExpenseLog(CreatedUpdateBase):
                 setattr(expense_log, key, value)
             expense_log.user_id = user.id
             db.add(expense_log)
-            await db.commit()
+            await db.flush()
             # await db.refresh(expense_log)
             return ServiceResult(expense_log)
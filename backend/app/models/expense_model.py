@@ -3,21 +3,111 @@ from contextlib import asynccontextmanager
 from multiprocessing import parent_process
 from typing import Optional
 
-from app import schemas
-from app.config.database import get_db_cm, mapper_registry
+from app import schemas, settings
+from app.config.database import (get_db_cm, get_read_db_cm,
+                                 mapper_registry, mark_user_write)
+from app.models.attachment_model import Attachment
 from app.models.base import CreatedUpdateBase
-from app.utils.app_exceptions import AppException
-from app.utils.aws import delete_user_file, upload_user_file
+from app.models.expense_log_model import ExpenseLog
+from app.models.ledger_counter_model import EXPENSE, LedgerCounter
+from app.models.ledger_rollup_model import LedgerMonthlyRollup
+from app.utils.app_exceptions import AppException, AppExceptionCase
+from app.utils.attachments import upload_form
+from app.utils.bulk import fill_ids, validate_items
+from app.utils.conditional import detail_validator
+from app.utils.fast_json import row_dicts, schema_columns
+from app.utils.keyset import keyset_paginate
+from app.utils.search import apply_search
+from app.utils.response_cache import cached
 from app.utils.service_result import ServiceResult
+from app.utils.statement_import import fingerprint, statement_rows
+from app.utils.versioned import current_row, not_written
+from fastapi_pagination import resolve_params
 from fastapi_pagination.ext.sqlalchemy import paginate
 from pydantic import ValidationError
-from sqlalchemy import Column, DateTime, ForeignKey, String, desc, func, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, String, case,
+                        delete, desc, func, insert, select, text, true,
+                        update)
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import (Mapped, aliased, mapped_column, relationship,
+                            selectinload)
+
+
+# Statement imports are COPYed here first, then merged into expenses in one
+# statement that skips what was imported before and writes the logs and
+# the monthly rollup
+IMPORT_COLUMNS = [
+    "line", "title", "description", "amount", "currency_code", "created",
+    "fingerprint",
+]
+IMPORT_STAGING = """
+    CREATE TEMP TABLE expense_import (
+        line integer, title text, description text,
+        amount double precision, currency_code text,
+        created timestamptz, fingerprint text
+    ) ON COMMIT DROP
+"""
+IMPORT_MERGE = """
+    WITH numbered AS (
+        SELECT *, fingerprint || ':' || row_number() OVER (
+            PARTITION BY fingerprint ORDER BY line
+        ) AS import_ref
+        FROM expense_import
+    ), inserted AS (
+        INSERT INTO expenses (
+            title, description, amount, currency_code, user_id, created,
+            import_ref
+        )
+        SELECT title, description, amount, currency_code, :user_id,
+            coalesce(created, now()), import_ref
+        FROM numbered ORDER BY line
+        ON CONFLICT (user_id, import_ref) WHERE import_ref IS NOT NULL
+        DO NOTHING
+        RETURNING id, title, description, amount, currency_code, user_id,
+            created
+    ), logged AS (
+        INSERT INTO expense_logs (
+            title, description, amount, currency_code, user_id, expense_id
+        )
+        SELECT title, description, amount, currency_code, user_id, id
+        FROM inserted
+    ), rolled_up AS (
+        INSERT INTO ledger_monthly_rollup (
+            user_id, month, kind, currency_code, row_count, amount_sum
+        )
+        SELECT user_id, date_trunc('month', created AT TIME ZONE 'UTC')::date,
+            'expense', currency_code, count(*), sum(amount)
+        FROM inserted GROUP BY 1, 2, 4
+        ON CONFLICT (user_id, month, kind, currency_code) DO UPDATE SET
+            row_count = ledger_monthly_rollup.row_count + excluded.row_count,
+            amount_sum = ledger_monthly_rollup.amount_sum + excluded.amount_sum
+    )
+    SELECT count(*), coalesce(sum(amount), 0) FROM inserted
+"""
 
 
 @mapper_registry.mapped
 class Expense(CreatedUpdateBase):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_user_id_id", "user_id", text("id DESC")),
+        Index("ix_expenses_user_id_created", "user_id", "created", "id"),
+        Index("ix_expenses_user_id_amount", "user_id", "amount", "id"),
+        Index("ix_expenses_user_id_updated", "user_id", "updated"),
+        Index(
+            "ix_expenses_user_id_import_ref", "user_id", "import_ref",
+            unique=True, postgresql_where=text("import_ref IS NOT NULL"),
+        ),
+        Index(
+            "ix_expenses_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_expenses_description_trgm", "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(64))
@@ -25,6 +115,11 @@ class Expense(CreatedUpdateBase):
     amount: Mapped[float]
     currency_code: Mapped[str] = mapped_column(String(10))
     attachment: Mapped[Optional[str]] = mapped_column(String(200))
+    # Set for imported rows, it's what makes re-importing a statement a no-op
+    import_ref: Mapped[Optional[str]] = mapped_column(String(64))
+    # Bumped by every update, an update or delete sent with an older one is
+    # refused instead of overwriting what it never saw
+    version: Mapped[int] = mapped_column(server_default=text("1"))
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("user.id"))
     user: Mapped["User"] = relationship(back_populates="expenses")  # noqa
     logs: Mapped[list["ExpenseLog"]] = relationship(  # noqa
@@ -33,38 +128,142 @@ class Expense(CreatedUpdateBase):
         passive_deletes=True,
     )
 
+    # A path and not a presigned URL, a cached page still has a good one.
+    # It redirects to the thumbnail once that's rendered, 404 until then.
+    @hybrid_property
+    def thumbnail_url(self) -> str | None:
+        if self.attachment is None:
+            return None
+        return f"/expenses/{self.id}/attachment/thumbnail"
+
+    @thumbnail_url.inplace.expression
+    @classmethod
+    def _thumbnail_url_expression(cls):
+        return case((cls.attachment.is_not(None), func.concat(
+            "/expenses/", cls.id, "/attachment/thumbnail"
+        )))
+
     def __repr__(self):
         return f'Expense({self.id}, "{self.title}")'
 
     @classmethod
     async def create(
-        cls, user, title, description, amount, attachment
+        cls, user, title, description, amount, attachment, log=False
     ) -> ServiceResult:
-        url = None
-        if attachment:
-            url = upload_user_file(attachment, user.id)
-
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
             expense = cls(
                 title=title,
                 description=description,
                 amount=amount,
-                attachment=url,
+                attachment=attachment,
                 currency_code="USD",
                 user_id=user.id
             )
             db.add(expense)
-            await db.commit()
+            await db.flush()
+            await LedgerCounter.apply(db, user.id, EXPENSE, 1, amount)
+            await LedgerMonthlyRollup.apply(
+                db, user.id, EXPENSE, expense.created, expense.currency_code,
+                1, amount,
+            )
+            if log:
+                db.add(ExpenseLog.of(expense))
+                await db.flush()
 
             if not expense:
                 return ServiceResult(AppException.CreateObject())
             return ServiceResult(expense)
 
     @classmethod
-    async def get(cls, expense_id: int, user) -> ServiceResult:
+    async def create_bulk(cls, user, items: list) -> ServiceResult:
+        if len(items) > settings.bulk_max_items:
+            return ServiceResult(AppException.TooManyItems(
+                {"max_items": settings.bulk_max_items}
+            ))
+        results, valid = validate_items(items, schemas.BulkItem)
+        if not valid:
+            return ServiceResult(fill_ids(results, []))
+
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
+            rows = [dict(item.model_dump(), user_id=user.id) for item in valid]
+            # One multi row INSERT ... RETURNING per batch of rows, the ids
+            # come back in the order of the rows
+            ids = (await db.scalars(
+                insert(cls).returning(cls.id, sort_by_parameter_order=True),
+                rows,
+            )).all()
+            await db.execute(insert(ExpenseLog), [
+                dict(row, expense_id=id) for row, id in zip(rows, ids)
+            ])
+            amount = sum(row["amount"] for row in rows)
+            await LedgerCounter.apply(db, user.id, EXPENSE, len(ids), amount)
+            await LedgerMonthlyRollup.apply_rows(db, cls, EXPENSE, ids)
+            return ServiceResult(fill_ids(results, ids))
+
+    @classmethod
+    def import_statement(cls, user, file, import_format) -> ServiceResult:
+        # Runs while the response streams, on a session of its own
+        return ServiceResult(cls._import_rows(user, file, import_format))
+
+    @classmethod
+    async def _import_rows(cls, user, file, import_format):
+        counts = {"rows": 0, "skipped": 0, "errors": 0}
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            mark_user_write(db, user.id)
+            await db.execute(text(IMPORT_STAGING))
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            batch = []
+            async for row, data in statement_rows(file, import_format):
+                counts["rows"] += 1
+                if data is None:
+                    counts["skipped"] += 1
+                    continue
+                try:
+                    expense = schemas.Expense.model_validate(data)
+                except ValidationError as e:
+                    counts["errors"] += 1
+                    yield {"event": "error", "row": row, "errors": e.errors(
+                        include_url=False, include_context=False,
+                        include_input=False,
+                    )}
+                    continue
+                batch.append((
+                    row, expense.title, expense.description,
+                    float(expense.amount), expense.currency_code,
+                    expense.created, fingerprint(data["reference"], expense),
+                ))
+                if len(batch) >= settings.import_batch_rows:
+                    await raw.driver_connection.copy_records_to_table(
+                        "expense_import", records=batch, columns=IMPORT_COLUMNS
+                    )
+                    batch = []
+                    yield {"event": "progress", **counts}
+            if batch:
+                await raw.driver_connection.copy_records_to_table(
+                    "expense_import", records=batch, columns=IMPORT_COLUMNS
+                )
+            created, amount = (await db.execute(
+                text(IMPORT_MERGE), {"user_id": user.id}
+            )).one()
+            await LedgerCounter.apply(db, user.id, EXPENSE, created, amount)
+        # Only reported once committed
+        valid = counts["rows"] - counts["skipped"] - counts["errors"]
+        yield {
+            "event": "done", **counts,
+            "created": created, "duplicates": valid - created,
+        }
+
+    @classmethod
+    @cached("get", schema=schemas.ExpenseRead)
+    async def get(cls, expense_id: int, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(cls.id == expense_id, cls.user_id == user.id)
             expense = await db.scalar(q)
             if not expense:
@@ -76,9 +275,90 @@ class Expense(CreatedUpdateBase):
             return ServiceResult(expense)
 
     @classmethod
+    def _latest_logs(cls, user, logs_limit: int, *columns):
+        return select(*columns).where(
+            ExpenseLog.expense_id == cls.id, ExpenseLog.user_id == user.id
+        ).order_by(desc(ExpenseLog.id)).limit(logs_limit).lateral()
+
+    @classmethod
+    async def get_with_logs(
+        cls, expense_id: int, user, logs_limit: int
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            # One statement, a row per log joined laterally, an expense
+            # without logs still comes back as one row with no log
+            latest = cls._latest_logs(user, logs_limit, ExpenseLog)
+            log = aliased(ExpenseLog, latest)
+            q = select(cls, log).outerjoin(log, true()).where(
+                cls.id == expense_id, cls.user_id == user.id
+            ).order_by(desc(log.id))
+            rows = (await db.execute(q)).all()
+            if not rows:
+                return ServiceResult(
+                    AppException.GetObject({"expense_id": expense_id})
+                )
+            expense = rows[0][0]
+            expense.latest_logs = [log for _, log in rows if log is not None]
+            return ServiceResult(expense)
+
+    @classmethod
+    async def get_validator(
+        cls, expense_id: int, user, logs_limit: int | None = None
+    ) -> ServiceResult:
+        """
+        The ETag and Last-Modified of the detail, read off the version and
+        timestamps without fetching the expense or its logs
+        """
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls.id, cls.version, cls.created, cls.updated).where(
+                cls.id == expense_id, cls.user_id == user.id
+            )
+            if logs_limit is not None:
+                latest = cls._latest_logs(
+                    user, logs_limit, ExpenseLog.id, ExpenseLog.updated
+                )
+                q = q.add_columns(
+                    latest.c.id.label("log_id"),
+                    latest.c.updated.label("log_updated"),
+                ).outerjoin(latest, true()).order_by(desc(latest.c.id))
+            rows = (await db.execute(q)).all()
+            if not rows:
+                return ServiceResult(
+                    AppException.GetObject({"expense_id": expense_id})
+                )
+            logs = None
+            if logs_limit is not None:
+                logs = [
+                    (row.log_id, row.log_updated) for row in rows
+                    if row.log_id is not None
+                ]
+            return ServiceResult(detail_validator(rows[0], logs))
+
+    @classmethod
+    @cached("get_list_state")
+    async def get_list_state(cls, user) -> ServiceResult:
+        """
+        Row count, max id and max updated of the user's expenses, any insert,
+        update or delete moves one of them. Index lookups only, the count
+        is the ledger counter's.
+        """
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            mine = cls.user_id == user.id
+            q = select(
+                LedgerCounter.count_query(user.id, EXPENSE).scalar_subquery(),
+                select(func.max(cls.id)).where(mine).scalar_subquery(),
+                select(func.max(cls.updated)).where(mine).scalar_subquery(),
+            )
+            return ServiceResult(tuple((await db.execute(q)).one()))
+
+    @classmethod
+    @cached("first", schema=schemas.ExpenseRead)
     async def first(cls, user) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(cls.user_id == user.id)
             expense = await db.scalar(q)
             if not expense:
@@ -90,76 +370,243 @@ class Expense(CreatedUpdateBase):
             return ServiceResult(expense)
 
     @classmethod
+    @cached("get_all", params=resolve_params)
     async def get_all(cls, user, search_param) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
-            q = select(cls).where(
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            # Plain rows of the ExpenseRead columns, nothing is hydrated
+            q = select(*schema_columns(cls, schemas.ExpenseRead)).where(
                 cls.user_id == user.id
             ).order_by(desc(cls.id))
             if search_param:
-                q = q.where(cls.title.ilike(f"%{search_param}%"))
-            res = await paginate(db, q)
+                q = apply_search(q, cls, search_param)
+                res = await paginate(db, q, transformer=row_dicts)
+            else:
+                res = await paginate(
+                    db, q,
+                    count_query=LedgerCounter.count_query(user.id, EXPENSE),
+                    transformer=row_dicts,
+                )
             return ServiceResult(res)
-            # TODO: implement streaming connection
-            # return ServiceResult([x async for x in await paginate(db.stream_scalars(q))])
 
     @classmethod
-    async def delete(cls, expense_id: int, user) -> ServiceResult:
+    def export(cls, user, include_logs=False) -> ServiceResult:
+        # Nothing runs until the response body is sent, the rows come from a
+        # session of their own and not from the request session
+        return ServiceResult(cls._stream_all(user, include_logs))
+
+    @classmethod
+    async def _stream_all(cls, user, include_logs):
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls).where(cls.user_id == user.id).order_by(cls.id)
+            if include_logs:
+                q = q.options(selectinload(cls.logs))
+            q = q.execution_options(yield_per=settings.export_batch_size)
+            result = await db.stream_scalars(q)
+            async for batch in result.partitions():
+                for expense in batch:
+                    yield expense
+                    # Written out already, the logs go with it (cascade)
+                    db.expunge(expense)
+
+    @classmethod
+    async def get_all_cursor(
+        cls, user, search_param, cursor, sort, size
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.ExpenseRead)).where(
+                cls.user_id == user.id
+            )
+            if search_param:
+                q = apply_search(q, cls, search_param, ranked=False)
+            try:
+                page = await keyset_paginate(db, q, cls, cursor, sort, size)
+            except AppExceptionCase as e:
+                return ServiceResult(e)
+            return ServiceResult(dict(page, items=row_dicts(page["items"])))
+
+    @classmethod
+    async def delete(
+        cls, expense_id: int, user, version: int | None = None
+    ) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
-            q = select(cls).where(cls.id == expense_id, cls.user_id == user.id)
-            expense = await db.scalar(q)
-            if expense.attachment:
-                delete_user_file(f"{user.id}/{expense.attachment}")
-            if not expense:
+            mark_user_write(db, user.id)
+            q = delete(cls).where(cls.id == expense_id, cls.user_id == user.id)
+            if version is not None:
+                q = q.where(cls.version == version)
+            q = q.returning(
+                cls.amount, cls.created, cls.currency_code, cls.attachment
+            )
+            expense = (await db.execute(q)).one_or_none()
+            if expense is None:
+                return ServiceResult(await not_written(
+                    db, cls, expense_id, user.id, version,
+                    {"expense_id": expense_id},
+                ))
+            await LedgerCounter.apply(
+                db, user.id, EXPENSE, -1, -expense.amount
+            )
+            await LedgerMonthlyRollup.apply(
+                db, user.id, EXPENSE, expense.created, expense.currency_code,
+                -1, -expense.amount,
+            )
+            await Attachment.release(db, user.id, expense.attachment)
+            return ServiceResult(True)
+
+    @classmethod
+    async def delete_attachment(cls, expense_id: int, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            mark_user_write(db, user.id)
+            current = current_row(
+                cls, expense_id, user.id, None, cls.attachment
+            )
+            q = update(cls).where(cls.id == current.c.id).values(
+                attachment=None, version=cls.version + 1
+            ).returning(current.c.attachment)
+            attachment = await db.scalar(q)
+            if attachment is None:
                 return ServiceResult(
                     AppException.GetObject({"expense_id": expense_id})
                 )
-            await db.delete(expense)
-            await db.commit()
+            await Attachment.release(db, user.id, attachment)
             return ServiceResult(True)
 
+    # Asked before an attachment is uploaded, one already there would be
+    # kept and the upload lost
     @classmethod
-    async def delete_attachment(cls, expense_id: int, user) -> ServiceResult:
+    async def accepts_attachment(cls, expense_id, user) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
-            q = select(cls).where(cls.id == expense_id, cls.user_id == user.id)
-            expense = await db.scalar(q)
-            file_name = expense.attachment.split("/")[-1]
-            delete_user_file(f"{user.id}/{file_name}")
-            if not expense:
+            row = (await db.execute(select(cls.attachment).where(
+                cls.id == expense_id, cls.user_id == user.id
+            ))).one_or_none()
+            if row is None:
                 return ServiceResult(
                     AppException.GetObject({"expense_id": expense_id})
                 )
+            return ServiceResult(row.attachment is None)
 
-            expense.attachment = None
-            db.add(expense)
-            await db.commit()
-            return ServiceResult(True)
-
+    # The client sends the file straight to S3 with the presigned POST and
+    # confirms it with attach(). Content the user already has, going by the
+    # sha256 they sent, isn't sent at all: its key is confirmed instead.
     @classmethod
-    async def update(
-        cls, expense_id, user, title, description, amount, attachment
+    async def upload_attachment(
+        cls, expense_id, user, filename, content_type, sha256=None
     ) -> ServiceResult:
+        accepted = await cls.accepts_attachment(expense_id, user)
+        if not accepted.success:
+            return accepted
+        if not accepted.value:
+            return ServiceResult(
+                AppException.AttachmentExists({"expense_id": expense_id})
+            )
+        if sha256 and (key := await Attachment.find(user.id, sha256)):
+            return ServiceResult({"key": key, "exists": True})
+        return upload_form(user.id, filename, content_type)
+
+    @classmethod
+    async def attach(cls, expense_id, user, key) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
-            q = select(cls).where(cls.id == expense_id, cls.user_id == user.id)
-            expense = await db.scalar(q)
-            if not expense:
+            mark_user_write(db, user.id)
+            adopted = await Attachment.adopt(db, user.id, key)
+            if not adopted.success:
+                return adopted
+            key = adopted.value
+            q = update(cls).where(
+                cls.id == expense_id, cls.user_id == user.id,
+                cls.attachment.is_(None),
+            ).values(
+                attachment=key, version=cls.version + 1
+            ).returning(cls)
+            expense = await db.scalar(
+                q, execution_options={"populate_existing": True}
+            )
+            if expense is None:
+                await Attachment.release(db, user.id, key)
+                exists = await db.scalar(select(cls.id).where(
+                    cls.id == expense_id, cls.user_id == user.id
+                ))
+                error = (
+                    AppException.AttachmentExists if exists
+                    else AppException.GetObject
+                )
+                return ServiceResult(error({"expense_id": expense_id}))
+            return ServiceResult(expense)
+
+    @classmethod
+    async def get_attachment(cls, expense_id, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            row = (await db.execute(select(cls.attachment).where(
+                cls.id == expense_id, cls.user_id == user.id
+            ))).one_or_none()
+            if row is None or row.attachment is None:
                 return ServiceResult(
                     AppException.GetObject({"expense_id": expense_id})
                 )
+            return ServiceResult(row.attachment)
 
-            if not expense.attachment:
-                if attachment:
-                    url = upload_user_file(attachment, user.id)
-                    expense.attachment = url
+    @classmethod
+    async def get_thumbnail(cls, expense_id, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            thumbnail = await Attachment.get_thumbnail(
+                db, cls, expense_id, user.id
+            )
+            if thumbnail is None:
+                return ServiceResult(
+                    AppException.GetObject({"expense_id": expense_id})
+                )
+            return ServiceResult(thumbnail)
 
-            expense.title = title
-            expense.description = description
-            expense.amount = amount
-            db.add(expense)
+    @classmethod
+    async def update(
+        cls, expense_id, user, title, description, amount, attachment,
+        log=False, version: int | None = None,
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            mark_user_write(db, user.id)
+            current = current_row(
+                cls, expense_id, user.id, version, cls.amount, cls.attachment
+            )
+            q = update(cls).where(cls.id == current.c.id).values(
+                title=title,
+                description=description,
+                amount=amount,
+                # An attachment is only ever added, never replaced
+                attachment=func.coalesce(cls.attachment, attachment),
+                version=cls.version + 1,
+            ).returning(cls, current.c.amount, current.c.attachment)
+            row = (await db.execute(
+                q, execution_options={"populate_existing": True}
+            )).one_or_none()
+            if row is None:
+                return ServiceResult(await not_written(
+                    db, cls, expense_id, user.id, version,
+                    {"expense_id": expense_id},
+                ))
+            expense, old_amount, old_attachment = row
+            # The upload was counted when it was stored, one the coalesce
+            # kept out isn't referenced
+            if attachment and old_attachment is not None:
+                await Attachment.release(db, user.id, attachment)
 
-            await db.flush()
-            await db.refresh(expense)
+            # The counters only move with the amount
+            if amount != old_amount:
+                await LedgerCounter.apply(
+                    db, user.id, EXPENSE, 0, amount - old_amount
+                )
+                await LedgerMonthlyRollup.apply(
+                    db, user.id, EXPENSE, expense.created,
+                    expense.currency_code, 0, amount - old_amount,
+                )
+            if log:
+                db.add(ExpenseLog.of(expense))
+                await db.flush()
             return ServiceResult(expense)
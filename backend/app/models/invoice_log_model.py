@@ -4,17 +4,25 @@ from multiprocessing import parent_process
 from typing import Optional
 
 from app import schemas
-from app.config.database import get_db_cm, mapper_registry
+from app.config.database import (get_db_cm, get_read_db_cm,
+                                 mapper_registry, mark_user_write)
 from app.models.base import CreatedUpdateBase
-from app.utils.app_exceptions import AppException
+from app.utils.app_exceptions import AppException, AppExceptionCase
+from app.utils.fast_json import row_dicts, schema_columns
+from app.utils.keyset import keyset_paginate
 from app.utils.service_result import ServiceResult
-from sqlalchemy import Column, DateTime, ForeignKey, String, desc, func, select
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, String, desc,
+                        func, select, text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
 @mapper_registry.mapped
 class InvoiceLog(CreatedUpdateBase):
     __tablename__ = "invoice_logs"
+    __table_args__ = (
+        Index("ix_invoice_logs_user_id_id", "user_id", text("id DESC")),
+        Index("ix_invoice_logs_invoice_id_id", "invoice_id", text("id DESC")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(64))
@@ -31,13 +39,26 @@ class InvoiceLog(CreatedUpdateBase):
     def __repr__(self):
         return f'InvoiceLog({self.id}, "{self.title}")'
 
+    @classmethod
+    def of(cls, invoice) -> "InvoiceLog":
+        # The state the invoice was left in by a create or an update
+        return cls(
+            title=invoice.title,
+            description=invoice.description,
+            amount=invoice.amount,
+            currency_code=invoice.currency_code,
+            user_id=invoice.user_id,
+            invoice_id=invoice.id,
+        )
+
     @classmethod
     async def create(cls, item: schemas.InvoiceLog) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, item.user_id)
             invoice_log = cls(**item.model_dump())
             db.add(invoice_log)
-            await db.commit()
+            await db.flush()
 
             if not invoice_log:
                 return ServiceResult(AppException.CreateObject())
@@ -45,8 +66,8 @@ class InvoiceLog(CreatedUpdateBase):
 
     @classmethod
     async def get(cls, invoice_log_id: int, user) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(
                 cls.id == invoice_log_id, cls.user_id == user.id
             )
@@ -61,17 +82,33 @@ class InvoiceLog(CreatedUpdateBase):
 
     @classmethod
     async def get_all(cls, user, invoice_id: int) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
-            q = select(cls).where(
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.InvoiceLogRead)).where(
                 cls.user_id == user.id, cls.invoice_id == invoice_id
             ).order_by(desc(cls.id))
-            return ServiceResult([x async for x in await db.stream_scalars(q)])
+            return ServiceResult(row_dicts(await db.execute(q)))
+
+    @classmethod
+    async def get_all_cursor(
+        cls, user, invoice_id: int, cursor, sort, size
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.InvoiceLogRead)).where(
+                cls.user_id == user.id, cls.invoice_id == invoice_id
+            )
+            try:
+                page = await keyset_paginate(db, q, cls, cursor, sort, size)
+            except AppExceptionCase as e:
+                return ServiceResult(e)
+            return ServiceResult(dict(page, items=row_dicts(page["items"])))
 
     @classmethod
     async def delete(cls, invoice_log_id: int, user) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
             q = select(cls).where(
                 cls.id == invoice_log_id, cls.user_id == user.id
             )
@@ -81,13 +118,14 @@ class InvoiceLog(CreatedUpdateBase):
                     AppException.GetObject({"invoice_log_id": invoice_log_id})
                 )
             await db.delete(invoice_log)
-            await db.commit()
+            await db.flush()
             return ServiceResult(True)
 
     @classmethod
     async def update(cls, invoice_log_id, data, user) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
             q = select(cls).where(
                 cls.id == invoice_log_id, cls.user_id == user.id
             )
@@ -100,6 +138,6 @@ class InvoiceLog(CreatedUpdateBase):
                 setattr(invoice_log, key, value)
             invoice_log.user_id = user.id
             db.add(invoice_log)
-            await db.commit()
+            await db.flush()
             # await db.refresh(invoice_log)
             return ServiceResult(invoice_log)
@@ -3,19 +3,52 @@ from contextlib import asynccontextmanager
 from multiprocessing import parent_process
 from typing import Optional
 
-from app import schemas
-from app.config.database import get_db_cm, mapper_registry
+from app import schemas, settings
+from app.config.database import (get_db_cm, get_read_db_cm,
+                                 mapper_registry, mark_user_write)
+from app.models.attachment_model import Attachment
 from app.models.base import CreatedUpdateBase
-from app.utils.app_exceptions import AppException
+from app.models.invoice_log_model import InvoiceLog
+from app.models.ledger_counter_model import INVOICE, LedgerCounter
+from app.models.ledger_rollup_model import LedgerMonthlyRollup
+from app.utils.app_exceptions import AppException, AppExceptionCase
+from app.utils.attachments import upload_form
+from app.utils.bulk import fill_ids, validate_items
+from app.utils.conditional import detail_validator
+from app.utils.fast_json import row_dicts, schema_columns
+from app.utils.keyset import keyset_paginate
+from app.utils.search import apply_search
+from app.utils.response_cache import cached
 from app.utils.service_result import ServiceResult
+from app.utils.versioned import current_row, not_written
+from fastapi_pagination import resolve_params
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import Column, DateTime, ForeignKey, String, desc, func, select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, String, case,
+                        delete, desc, func, insert, select, text, true,
+                        update)
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import (Mapped, aliased, mapped_column, relationship,
+                            selectinload)
 
 
 @mapper_registry.mapped
 class Invoice(CreatedUpdateBase):
     __tablename__ = "invoices"
+    __table_args__ = (
+        Index("ix_invoices_user_id_id", "user_id", text("id DESC")),
+        Index("ix_invoices_user_id_created", "user_id", "created", "id"),
+        Index("ix_invoices_user_id_amount", "user_id", "amount", "id"),
+        Index("ix_invoices_user_id_updated", "user_id", "updated"),
+        Index(
+            "ix_invoices_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_invoices_description_trgm", "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(64))
@@ -23,6 +56,9 @@ class Invoice(CreatedUpdateBase):
     amount: Mapped[float]
     currency_code: Mapped[str] = mapped_column(String(10))
     attachment: Mapped[Optional[str]] = mapped_column(String(200))
+    # Bumped by every update, an update or delete sent with an older one is
+    # refused instead of overwriting what it never saw
+    version: Mapped[int] = mapped_column(server_default=text("1"))
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("user.id"))
     user: Mapped["User"] = relationship(back_populates="invoices")  # noqa
     logs: Mapped[list["InvoiceLog"]] = relationship(  # noqa
@@ -31,25 +67,81 @@ class Invoice(CreatedUpdateBase):
         passive_deletes=True,
     )
 
+    # A path and not a presigned URL, a cached page still has a good one.
+    # It redirects to the thumbnail once that's rendered, 404 until then.
+    @hybrid_property
+    def thumbnail_url(self) -> str | None:
+        if self.attachment is None:
+            return None
+        return f"/invoices/{self.id}/attachment/thumbnail"
+
+    @thumbnail_url.inplace.expression
+    @classmethod
+    def _thumbnail_url_expression(cls):
+        return case((cls.attachment.is_not(None), func.concat(
+            "/invoices/", cls.id, "/attachment/thumbnail"
+        )))
+
     def __repr__(self):
         return f'Invoice({self.id}, "{self.title}")'
 
     @classmethod
-    async def create(cls, item: schemas.Invoice) -> ServiceResult:
+    async def create(cls, item: schemas.Invoice, log=False) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, item.user_id)
             invoice = cls(**item.model_dump())
             db.add(invoice)
-            await db.commit()
+            await db.flush()
+            await Attachment.acquire(db, item.user_id, invoice.attachment)
+            await LedgerCounter.apply(
+                db, item.user_id, INVOICE, 1, item.amount
+            )
+            await LedgerMonthlyRollup.apply(
+                db, item.user_id, INVOICE, invoice.created,
+                invoice.currency_code, 1, item.amount,
+            )
+            if log:
+                db.add(InvoiceLog.of(invoice))
+                await db.flush()
 
             if not invoice:
                 return ServiceResult(AppException.CreateObject())
             return ServiceResult(invoice)
 
     @classmethod
-    async def get(cls, invoice_id: int, user) -> ServiceResult:
+    async def create_bulk(cls, user, items: list) -> ServiceResult:
+        if len(items) > settings.bulk_max_items:
+            return ServiceResult(AppException.TooManyItems(
+                {"max_items": settings.bulk_max_items}
+            ))
+        results, valid = validate_items(items, schemas.BulkItem)
+        if not valid:
+            return ServiceResult(fill_ids(results, []))
+
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
+            mark_user_write(db, user.id)
+            rows = [dict(item.model_dump(), user_id=user.id) for item in valid]
+            # One multi row INSERT ... RETURNING per batch of rows, the ids
+            # come back in the order of the rows
+            ids = (await db.scalars(
+                insert(cls).returning(cls.id, sort_by_parameter_order=True),
+                rows,
+            )).all()
+            await db.execute(insert(InvoiceLog), [
+                dict(row, invoice_id=id) for row, id in zip(rows, ids)
+            ])
+            amount = sum(row["amount"] for row in rows)
+            await LedgerCounter.apply(db, user.id, INVOICE, len(ids), amount)
+            await LedgerMonthlyRollup.apply_rows(db, cls, INVOICE, ids)
+            return ServiceResult(fill_ids(results, ids))
+
+    @classmethod
+    @cached("get", schema=schemas.InvoiceRead)
+    async def get(cls, invoice_id: int, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(cls.id == invoice_id, cls.user_id == user.id)
             invoice = await db.scalar(q)
             if not invoice:
@@ -61,9 +153,90 @@ class Invoice(CreatedUpdateBase):
             return ServiceResult(invoice)
 
     @classmethod
+    def _latest_logs(cls, user, logs_limit: int, *columns):
+        return select(*columns).where(
+            InvoiceLog.invoice_id == cls.id, InvoiceLog.user_id == user.id
+        ).order_by(desc(InvoiceLog.id)).limit(logs_limit).lateral()
+
+    @classmethod
+    async def get_with_logs(
+        cls, invoice_id: int, user, logs_limit: int
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            # One statement, a row per log joined laterally, an invoice
+            # without logs still comes back as one row with no log
+            latest = cls._latest_logs(user, logs_limit, InvoiceLog)
+            log = aliased(InvoiceLog, latest)
+            q = select(cls, log).outerjoin(log, true()).where(
+                cls.id == invoice_id, cls.user_id == user.id
+            ).order_by(desc(log.id))
+            rows = (await db.execute(q)).all()
+            if not rows:
+                return ServiceResult(
+                    AppException.GetObject({"invoice_id": invoice_id})
+                )
+            invoice = rows[0][0]
+            invoice.latest_logs = [log for _, log in rows if log is not None]
+            return ServiceResult(invoice)
+
+    @classmethod
+    async def get_validator(
+        cls, invoice_id: int, user, logs_limit: int | None = None
+    ) -> ServiceResult:
+        """
+        The ETag and Last-Modified of the detail, read off the version and
+        timestamps without fetching the invoice or its logs
+        """
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls.id, cls.version, cls.created, cls.updated).where(
+                cls.id == invoice_id, cls.user_id == user.id
+            )
+            if logs_limit is not None:
+                latest = cls._latest_logs(
+                    user, logs_limit, InvoiceLog.id, InvoiceLog.updated
+                )
+                q = q.add_columns(
+                    latest.c.id.label("log_id"),
+                    latest.c.updated.label("log_updated"),
+                ).outerjoin(latest, true()).order_by(desc(latest.c.id))
+            rows = (await db.execute(q)).all()
+            if not rows:
+                return ServiceResult(
+                    AppException.GetObject({"invoice_id": invoice_id})
+                )
+            logs = None
+            if logs_limit is not None:
+                logs = [
+                    (row.log_id, row.log_updated) for row in rows
+                    if row.log_id is not None
+                ]
+            return ServiceResult(detail_validator(rows[0], logs))
+
+    @classmethod
+    @cached("get_list_state")
+    async def get_list_state(cls, user) -> ServiceResult:
+        """
+        Row count, max id and max updated of the user's invoices, any insert,
+        update or delete moves one of them. Index lookups only, the count
+        is the ledger counter's.
+        """
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            mine = cls.user_id == user.id
+            q = select(
+                LedgerCounter.count_query(user.id, INVOICE).scalar_subquery(),
+                select(func.max(cls.id)).where(mine).scalar_subquery(),
+                select(func.max(cls.updated)).where(mine).scalar_subquery(),
+            )
+            return ServiceResult(tuple((await db.execute(q)).one()))
+
+    @classmethod
+    @cached("first", schema=schemas.InvoiceRead)
     async def first(cls, user) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
             q = select(cls).where(cls.user_id == user.id)
             invoice = await db.scalar(q)
             if not invoice:
@@ -75,46 +248,219 @@ class Invoice(CreatedUpdateBase):
             return ServiceResult(invoice)
 
     @classmethod
-    async def get_all(cls, user) -> ServiceResult:
-        db_context = asynccontextmanager(get_db_cm)
-        async with db_context() as db:
-            q = select(cls).where(
+    @cached("get_all", params=resolve_params)
+    async def get_all(cls, user, search_param) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            # Plain rows of the InvoiceRead columns, nothing is hydrated
+            q = select(*schema_columns(cls, schemas.InvoiceRead)).where(
                 cls.user_id == user.id
             ).order_by(desc(cls.id))
-            res = await paginate(db, q)
+            if search_param:
+                q = apply_search(q, cls, search_param)
+                res = await paginate(db, q, transformer=row_dicts)
+            else:
+                res = await paginate(
+                    db, q,
+                    count_query=LedgerCounter.count_query(user.id, INVOICE),
+                    transformer=row_dicts,
+                )
             return ServiceResult(res)
-            # TODO: implement streaming connection
-            # return ServiceResult([x async for x in await db.stream_scalars(q)])
 
     @classmethod
-    async def delete(cls, invoice_id: int, user) -> ServiceResult:
+    def export(cls, user, include_logs=False) -> ServiceResult:
+        # Nothing runs until the response body is sent, the rows come from a
+        # session of their own and not from the request session
+        return ServiceResult(cls._stream_all(user, include_logs))
+
+    @classmethod
+    async def _stream_all(cls, user, include_logs):
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls).where(cls.user_id == user.id).order_by(cls.id)
+            if include_logs:
+                q = q.options(selectinload(cls.logs))
+            q = q.execution_options(yield_per=settings.export_batch_size)
+            result = await db.stream_scalars(q)
+            async for batch in result.partitions():
+                for invoice in batch:
+                    yield invoice
+                    # Written out already, the logs go with it (cascade)
+                    db.expunge(invoice)
+
+    @classmethod
+    async def get_all_cursor(
+        cls, user, search_param, cursor, sort, size
+    ) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(*schema_columns(cls, schemas.InvoiceRead)).where(
+                cls.user_id == user.id
+            )
+            if search_param:
+                q = apply_search(q, cls, search_param, ranked=False)
+            try:
+                page = await keyset_paginate(db, q, cls, cursor, sort, size)
+            except AppExceptionCase as e:
+                return ServiceResult(e)
+            return ServiceResult(dict(page, items=row_dicts(page["items"])))
+
+    @classmethod
+    async def delete(
+        cls, invoice_id: int, user, version: int | None = None
+    ) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
-            q = select(cls).where(cls.id == invoice_id, cls.user_id == user.id)
-            invoice = await db.scalar(q)
-            if not invoice:
+            mark_user_write(db, user.id)
+            q = delete(cls).where(cls.id == invoice_id, cls.user_id == user.id)
+            if version is not None:
+                q = q.where(cls.version == version)
+            q = q.returning(
+                cls.amount, cls.created, cls.currency_code, cls.attachment
+            )
+            invoice = (await db.execute(q)).one_or_none()
+            if invoice is None:
+                return ServiceResult(await not_written(
+                    db, cls, invoice_id, user.id, version,
+                    {"invoice_id": invoice_id},
+                ))
+            await LedgerCounter.apply(
+                db, user.id, INVOICE, -1, -invoice.amount
+            )
+            await LedgerMonthlyRollup.apply(
+                db, user.id, INVOICE, invoice.created, invoice.currency_code,
+                -1, -invoice.amount,
+            )
+            await Attachment.release(db, user.id, invoice.attachment)
+            return ServiceResult(True)
+
+    # Asked before an attachment is uploaded, one already there would be
+    # kept and the upload lost
+    @classmethod
+    async def accepts_attachment(cls, invoice_id, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            row = (await db.execute(select(cls.attachment).where(
+                cls.id == invoice_id, cls.user_id == user.id
+            ))).one_or_none()
+            if row is None:
                 return ServiceResult(
                     AppException.GetObject({"invoice_id": invoice_id})
                 )
-            await db.delete(invoice)
-            await db.commit()
-            return ServiceResult(True)
+            return ServiceResult(row.attachment is None)
+
+    # The client sends the file straight to S3 with the presigned POST and
+    # confirms it with attach(). Content the user already has, going by the
+    # sha256 they sent, isn't sent at all: its key is confirmed instead.
+    @classmethod
+    async def upload_attachment(
+        cls, invoice_id, user, filename, content_type, sha256=None
+    ) -> ServiceResult:
+        accepted = await cls.accepts_attachment(invoice_id, user)
+        if not accepted.success:
+            return accepted
+        if not accepted.value:
+            return ServiceResult(
+                AppException.AttachmentExists({"invoice_id": invoice_id})
+            )
+        if sha256 and (key := await Attachment.find(user.id, sha256)):
+            return ServiceResult({"key": key, "exists": True})
+        return upload_form(user.id, filename, content_type)
 
     @classmethod
-    async def update(cls, invoice_id, data, user) -> ServiceResult:
+    async def attach(cls, invoice_id, user, key) -> ServiceResult:
         db_context = asynccontextmanager(get_db_cm)
         async with db_context() as db:
-            q = select(cls).where(cls.id == invoice_id, cls.user_id == user.id)
-            invoice = await db.scalar(q)
-            if not invoice:
+            mark_user_write(db, user.id)
+            adopted = await Attachment.adopt(db, user.id, key)
+            if not adopted.success:
+                return adopted
+            key = adopted.value
+            q = update(cls).where(
+                cls.id == invoice_id, cls.user_id == user.id,
+                cls.attachment.is_(None),
+            ).values(
+                attachment=key, version=cls.version + 1
+            ).returning(cls)
+            invoice = await db.scalar(
+                q, execution_options={"populate_existing": True}
+            )
+            if invoice is None:
+                await Attachment.release(db, user.id, key)
+                exists = await db.scalar(select(cls.id).where(
+                    cls.id == invoice_id, cls.user_id == user.id
+                ))
+                error = (
+                    AppException.AttachmentExists if exists
+                    else AppException.GetObject
+                )
+                return ServiceResult(error({"invoice_id": invoice_id}))
+            return ServiceResult(invoice)
+
+    @classmethod
+    async def get_attachment(cls, invoice_id, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            row = (await db.execute(select(cls.attachment).where(
+                cls.id == invoice_id, cls.user_id == user.id
+            ))).one_or_none()
+            if row is None or row.attachment is None:
                 return ServiceResult(
                     AppException.GetObject({"invoice_id": invoice_id})
                 )
-            for key, value in data.model_dump().items():
-                setattr(invoice, key, value)
-            invoice.user_id = user.id
-            db.add(invoice)
+            return ServiceResult(row.attachment)
 
-            await db.flush()
-            await db.refresh(invoice)
+    @classmethod
+    async def get_thumbnail(cls, invoice_id, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            thumbnail = await Attachment.get_thumbnail(
+                db, cls, invoice_id, user.id
+            )
+            if thumbnail is None:
+                return ServiceResult(
+                    AppException.GetObject({"invoice_id": invoice_id})
+                )
+            return ServiceResult(thumbnail)
+
+    @classmethod
+    async def update(cls, invoice_id, data, user, log=False) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            mark_user_write(db, user.id)
+            current = current_row(
+                cls, invoice_id, user.id, data.version, cls.amount,
+                cls.attachment,
+            )
+            q = update(cls).where(cls.id == current.c.id).values(
+                **data.model_dump(exclude={"version"}),
+                version=cls.version + 1,
+            ).returning(cls, current.c.amount, current.c.attachment)
+            row = (await db.execute(
+                q, execution_options={"populate_existing": True}
+            )).one_or_none()
+            if row is None:
+                return ServiceResult(await not_written(
+                    db, cls, invoice_id, user.id, data.version,
+                    {"invoice_id": invoice_id},
+                ))
+            invoice, old_amount, old_attachment = row
+            # The attachment is whatever the client sent, only stored ones
+            # are counted
+            if invoice.attachment != old_attachment:
+                await Attachment.release(db, user.id, old_attachment)
+                await Attachment.acquire(db, user.id, invoice.attachment)
+
+            # The counters only move with the amount
+            if data.amount != old_amount:
+                await LedgerCounter.apply(
+                    db, user.id, INVOICE, 0, data.amount - old_amount
+                )
+                await LedgerMonthlyRollup.apply(
+                    db, user.id, INVOICE, invoice.created,
+                    invoice.currency_code, 0, data.amount - old_amount,
+                )
+            if log:
+                db.add(InvoiceLog.of(invoice))
+                await db.flush()
             return ServiceResult(invoice)
@@ -0,0 +1,98 @@
+import uuid
+from contextlib import asynccontextmanager
+
+from app.config.database import get_db_cm, get_read_db_cm, mapper_registry
+from app.utils.service_result import ServiceResult
+from sqlalchemy import ForeignKey, String, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+EXPENSE = "expense"
+INVOICE = "invoice"
+
+
+@mapper_registry.mapped
+class LedgerCounter:
+    """
+    Per user row count and amount sum of expenses and invoices, maintained in
+    the same transaction as the writes so totals never need a COUNT(*).
+    """
+    __tablename__ = "ledger_counters"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)
+    row_count: Mapped[int] = mapped_column(default=0)
+    amount_sum: Mapped[float] = mapped_column(default=0)
+
+    def __repr__(self):
+        return f'LedgerCounter({self.user_id}, "{self.kind}")'
+
+    @classmethod
+    async def apply(
+        cls, db: AsyncSession, user_id, kind: str, count=0, amount=0.0
+    ):
+        q = insert(cls).values(
+            user_id=user_id, kind=kind, row_count=count, amount_sum=amount
+        )
+        q = q.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.kind],
+            set_={
+                "row_count": cls.row_count + count,
+                "amount_sum": cls.amount_sum + amount,
+            },
+        )
+        await db.execute(q)
+
+    @classmethod
+    def count_query(cls, user_id, kind: str):
+        # Ready to be handed to paginate() instead of the COUNT(*) subquery
+        return select(func.coalesce(
+            select(cls.row_count).where(
+                cls.user_id == user_id, cls.kind == kind
+            ).scalar_subquery(),
+            0,
+        ))
+
+    @classmethod
+    async def get_totals(cls, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls).where(cls.user_id == user.id)
+            return ServiceResult(cls.totals(await db.scalars(q)))
+
+    @staticmethod
+    def totals(counters) -> dict:
+        # Users without a counter row yet get zeros
+        counters = {counter.kind: counter for counter in counters}
+        totals = {}
+        for kind in (EXPENSE, INVOICE):
+            counter = counters.get(kind)
+            totals[f"{kind}s"] = {
+                "count": counter.row_count if counter else 0,
+                "amount": counter.amount_sum if counter else 0.0,
+            }
+        return totals
+
+    @classmethod
+    async def rebuild(cls) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            # Hold off writers so nothing lands between the delete and the
+            # re-count, reads keep going
+            await db.execute(text(
+                "LOCK TABLE expenses, invoices IN SHARE MODE"
+            ))
+            await db.execute(text(f"DELETE FROM {cls.__tablename__}"))
+            await db.execute(text(f"""
+                INSERT INTO {cls.__tablename__}
+                    (user_id, kind, row_count, amount_sum)
+                SELECT user_id, '{EXPENSE}', count(*), sum(amount)
+                FROM expenses GROUP BY user_id
+                UNION ALL
+                SELECT user_id, '{INVOICE}', count(*), sum(amount)
+                FROM invoices GROUP BY user_id
+            """))
+            return ServiceResult(True)
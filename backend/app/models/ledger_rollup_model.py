@@ -0,0 +1,132 @@
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+from app.config.database import get_db_cm, get_read_db_cm, mapper_registry
+from app.models.ledger_counter_model import EXPENSE, INVOICE
+from app.utils.service_result import ServiceResult
+from sqlalchemy import (Date, ForeignKey, Select, String, func, literal,
+                        select, text)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+# Months are UTC, the backfill migration groups the same way
+ROLLUP_SELECT = """
+    SELECT user_id, date_trunc('month', created AT TIME ZONE 'UTC')::date,
+        '{kind}', currency_code, count(*), sum(amount)
+    FROM {table} GROUP BY 1, 2, 4
+"""
+
+
+def month_of(created: datetime | None) -> date:
+    created = created or datetime.now(timezone.utc)
+    created = created.astimezone(timezone.utc)
+    return date(created.year, created.month, 1)
+
+
+@mapper_registry.mapped
+class LedgerMonthlyRollup:
+    """
+    Per user, month, kind and currency row count and amount sum, maintained
+    in the same transaction as the writes so charts read a row per month
+    instead of scanning the ledger
+    """
+    __tablename__ = "ledger_monthly_rollup"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)
+    currency_code: Mapped[str] = mapped_column(String(10), primary_key=True)
+    row_count: Mapped[int] = mapped_column(default=0)
+    amount_sum: Mapped[float] = mapped_column(default=0)
+
+    def __repr__(self):
+        return (
+            f'LedgerMonthlyRollup({self.user_id}, {self.month}, '
+            f'"{self.kind}", "{self.currency_code}")'
+        )
+
+    @classmethod
+    def _upsert(cls, q):
+        return q.on_conflict_do_update(
+            index_elements=[
+                cls.user_id, cls.month, cls.kind, cls.currency_code
+            ],
+            set_={
+                "row_count": cls.row_count + q.excluded.row_count,
+                "amount_sum": cls.amount_sum + q.excluded.amount_sum,
+            },
+        )
+
+    @classmethod
+    async def apply(
+        cls, db: AsyncSession, user_id, kind: str, created: datetime | None,
+        currency_code: str, count=0, amount=0.0,
+    ):
+        q = insert(cls).values(
+            user_id=user_id, month=month_of(created), kind=kind,
+            currency_code=currency_code, row_count=count, amount_sum=amount,
+        )
+        await db.execute(cls._upsert(q))
+
+    @classmethod
+    async def apply_rows(cls, db: AsyncSession, model, kind: str, ids: list):
+        # Rows inserted in bulk, grouped server side so created is exact
+        month = func.date_trunc(
+            "month", func.timezone("UTC", model.created)
+        ).cast(Date)
+        rows: Select = select(
+            model.user_id, month, literal(kind), model.currency_code,
+            func.count(), func.sum(model.amount),
+        ).where(model.id.in_(ids)).group_by(
+            model.user_id, month, model.currency_code
+        )
+        q = insert(cls).from_select(
+            [
+                "user_id", "month", "kind", "currency_code", "row_count",
+                "amount_sum",
+            ],
+            rows,
+        )
+        await db.execute(cls._upsert(q))
+
+    @classmethod
+    async def get_monthly(cls, user, start: date, end: date) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(cls).where(
+                cls.user_id == user.id, cls.month.between(start, end),
+                cls.row_count != 0,
+            ).order_by(cls.month, cls.kind, cls.currency_code)
+            return ServiceResult([
+                {
+                    "month": rollup.month,
+                    "kind": rollup.kind,
+                    "currency_code": rollup.currency_code,
+                    "count": rollup.row_count,
+                    "amount": rollup.amount_sum,
+                }
+                for rollup in await db.scalars(q)
+            ])
+
+    @classmethod
+    async def rebuild(cls) -> ServiceResult:
+        db_context = asynccontextmanager(get_db_cm)
+        async with db_context() as db:
+            # Hold off writers so nothing lands between the delete and the
+            # re-count, reads keep going
+            await db.execute(text(
+                "LOCK TABLE expenses, invoices IN SHARE MODE"
+            ))
+            await db.execute(text(f"DELETE FROM {cls.__tablename__}"))
+            await db.execute(text(
+                f"INSERT INTO {cls.__tablename__} (user_id, month, kind,"
+                " currency_code, row_count, amount_sum)"
+                + ROLLUP_SELECT.format(kind=EXPENSE, table="expenses")
+                + " UNION ALL "
+                + ROLLUP_SELECT.format(kind=INVOICE, table="invoices")
+            ))
+            return ServiceResult(True)
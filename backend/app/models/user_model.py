@@ -6,9 +6,9 @@ from fastapi_users.db import (SQLAlchemyBaseOAuthAccountTableUUID,
                               SQLAlchemyUserDatabase)
 from fastapi_users_db_sqlalchemy.access_token import (
     SQLAlchemyAccessTokenDatabase, SQLAlchemyBaseAccessTokenTableUUID)
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, relationship, selectinload
 
 
 @mapper_registry.mapped
@@ -19,9 +19,9 @@ class OAuthAccount(SQLAlchemyBaseOAuthAccountTableUUID):
 @mapper_registry.mapped
 class User(SQLAlchemyBaseUserTableUUID, CreatedUpdateBase):
     username = Column(String)
-    oauth_accounts: list[OAuthAccount] = relationship(
-        "OAuthAccount", lazy="joined"
-    )
+    # Loaded by UserDatabase on the OAuth paths only, every authenticated
+    # request reads the user and doesn't need them
+    oauth_accounts: list[OAuthAccount] = relationship("OAuthAccount")
     expenses: Mapped[list["Expense"]] = relationship(back_populates="user")
     invoices: Mapped[list["Invoice"]] = relationship(back_populates="user")
     expense_logs: Mapped[list["ExpenseLog"]] = relationship(
@@ -39,8 +39,29 @@ class AccessToken(SQLAlchemyBaseAccessTokenTableUUID):
     pass
 
 
+class UserDatabase(SQLAlchemyUserDatabase):
+    """
+    The OAuth callback goes through the accounts of the user it finds or
+    creates, they're loaded here since they aren't with the user
+    """
+    async def get_by_oauth_account(self, oauth: str, account_id: str):
+        statement = select(User).join(OAuthAccount).where(
+            OAuthAccount.oauth_name == oauth,
+            OAuthAccount.account_id == account_id,
+        ).options(selectinload(User.oauth_accounts))
+        return await self._get_user(statement)
+
+    async def add_oauth_account(self, user: User, create_dict: dict):
+        await self.session.refresh(user, ["oauth_accounts"])
+        oauth_account = OAuthAccount(**create_dict)
+        self.session.add(oauth_account)
+        user.oauth_accounts.append(oauth_account)
+        await self.session.commit()
+        return user
+
+
 async def get_user_db(session: AsyncSession = Depends(get_db)):
-    yield SQLAlchemyUserDatabase(session, User, OAuthAccount)
+    yield UserDatabase(session, User, OAuthAccount)
 
 
 async def get_access_token_db(session: AsyncSession = Depends(get_db)):
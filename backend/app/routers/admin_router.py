@@ -0,0 +1,54 @@
+from app.config.database import engine, get_pool_status, replica_router
+from app.config.users import current_superuser, password_pool, token_cache
+from app.services.email_service import email_queue
+from app.utils.previews import preview_pool
+from app.utils.response_cache import response_cache
+from app.utils.custom_api_route import APIRouter
+from fastapi import Depends
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(current_superuser)],
+)
+
+
+@router.get("/pool")
+async def pool_status():
+    return {
+        "primary": get_pool_status(engine),
+        "replicas": [
+            {
+                "address": replica.address,
+                "available": replica.available,
+                "lag_seconds": replica.lag_seconds,
+                **get_pool_status(replica.engine),
+            }
+            for replica in replica_router.replicas
+        ],
+    }
+
+
+@router.get("/cache")
+async def cache_status():
+    return response_cache.stats()
+
+
+@router.get("/auth-cache")
+async def auth_cache_status():
+    return token_cache.stats() if token_cache is not None else None
+
+
+@router.get("/password-pool")
+async def password_pool_status():
+    return password_pool.snapshot()
+
+
+@router.get("/email-queue")
+async def email_queue_status():
+    return email_queue.snapshot()
+
+
+@router.get("/previews")
+async def preview_pool_status():
+    return preview_pool.snapshot()
@@ -0,0 +1,36 @@
+from datetime import date
+from typing import Annotated
+
+from app import schemas
+from app.config.users import CurrentActiveUser
+from app.models.ledger_rollup_model import LedgerMonthlyRollup, month_of
+from app.utils.custom_api_route import APIRouter
+from app.utils.service_result import handle_result
+from fastapi import Query
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+MONTH = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+def parse_month(value: str) -> date:
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+
+def months_before(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 - count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Defaults to the last 12 months, both ends included
+@router.get("/monthly", response_model=list[schemas.MonthlyRollup])
+async def read_monthly(
+    user: CurrentActiveUser,
+    start: Annotated[str | None, Query(alias="from", pattern=MONTH)] = None,
+    end: Annotated[str | None, Query(alias="to", pattern=MONTH)] = None,
+):
+    end = parse_month(end) if end else month_of(None)
+    start = parse_month(start) if start else months_before(end, 11)
+    rollup = await LedgerMonthlyRollup.get_monthly(user, start, end)
+    return handle_result(rollup)
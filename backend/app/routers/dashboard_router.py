@@ -0,0 +1,13 @@
+from app import schemas
+from app.config.users import CurrentActiveUser
+from app.services.dashboard_service import DashboardService
+from app.utils.custom_api_route import APIRouter
+from app.utils.service_result import handle_result
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+@router.get("/", response_model=schemas.Dashboard)
+async def read_dashboard(user: CurrentActiveUser):
+    dashboard = await DashboardService.get(user)
+    return handle_result(dashboard)
@@ -5,16 +5,36 @@ from app.config.users import CurrentActiveUser
 from app.models.expense_log_model import ExpenseLog
 from app.models.user_model import User
 from app.utils.custom_api_route import APIRouter
+from app.utils.fast_json import rows_response
+from app.utils.keyset import DEFAULT_SORT
 from app.utils.service_result import handle_result
-from fastapi import Depends, Request
+from fastapi import Depends, Query, Request
 
 router = APIRouter(prefix="/expense_logs", tags=["expense_logs"])
 
 
-@router.get("/", response_model=list[schemas.ExpenseLogRead])
-async def read_items(user: CurrentActiveUser, expense_id: int):
+# Passing cursor (empty for the first page) returns a page of size logs at
+# a time, without it the whole history comes back
+@router.get(
+    "/",
+    response_model=(
+        list[schemas.ExpenseLogRead] | schemas.CursorPage[schemas.ExpenseLogRead]
+    ),
+)
+async def read_items(
+    user: CurrentActiveUser,
+    expense_id: int,
+    cursor: str | None = None,
+    sort: str = DEFAULT_SORT,
+    size: int = Query(20, ge=1, le=100),
+):
+    if cursor is not None:
+        expense_logs = await ExpenseLog.get_all_cursor(
+            user, expense_id, cursor, sort, size
+        )
+        return rows_response(handle_result(expense_logs))
     expense_logs = await ExpenseLog.get_all(user, expense_id)
-    return handle_result(expense_logs)
+    return rows_response(handle_result(expense_logs))
 
 
 @router.post("/")
@@ -1,16 +1,28 @@
+import json
 import os
 from dataclasses import dataclass
-from typing import Annotated
+from functools import partial
+from typing import Annotated, Literal
 
-from app import schemas
+from app import schemas, settings
 from app.config.users import CurrentActiveUser
+from app.models.attachment_model import Attachment
 from app.models.expense_model import Expense
 from app.models.user_model import User
-from app.utils.aws import get_location, s3, upload_user_file
+from app.utils.conditional import (detail_validator, is_conditional, is_fresh,
+                                   list_etag, not_modified, validator_headers)
 from app.utils.custom_api_route import APIRouter
+from app.utils.attachments import download_url, upload_key
+from app.utils.export import ExportFormat, export_response
+from app.utils.fast_json import rows_response
+from app.utils.keyset import DEFAULT_SORT
 from app.utils.service_result import handle_result
-from fastapi import Depends, File, Form, Query, Request, UploadFile
-from fastapi_pagination import Page, pagination_ctx
+from app.utils.statement_import import ImportFormat, guess_format
+from app.utils.uploads import form_body, read_form
+from fastapi import (Body, Depends, File, Query, Request, Response,
+                     UploadFile)
+from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi_pagination import Page, pagination_ctx, resolve_params
 from pydantic import ValidationError
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
@@ -19,15 +31,50 @@ router = APIRouter(prefix="/expenses", tags=["expenses"])
 Page = Page.with_custom_options(size=Query(5))
 
 
+# Passing cursor (empty for the first page) switches to keyset pagination,
+# no total count but every page costs the same. page/size stays the default.
+# Pages carry an ETag, If-None-Match gets a 304 before the page is queried.
 @router.get(
     "/",
-    response_model=Page[schemas.ExpenseRead],
+    response_model=(
+        Page[schemas.ExpenseRead] | schemas.CursorPage[schemas.ExpenseRead]
+    ),
     dependencies=[Depends(pagination_ctx(Page))]
 )
-async def read_items(request: Request, user: CurrentActiveUser):
+async def read_items(
+    request: Request,
+    user: CurrentActiveUser,
+    cursor: str | None = None,
+    sort: str = DEFAULT_SORT,
+):
     search_param = request.query_params.get("q")
-    expenses = await Expense.get_all(user, search_param)
-    return handle_result(expenses)
+    tag = list_etag(
+        request, user, handle_result(await Expense.get_list_state(user))
+    )
+    if is_fresh(request, tag):
+        return not_modified(tag)
+    if cursor is not None:
+        expenses = await Expense.get_all_cursor(
+            user, search_param, cursor, sort, resolve_params().size
+        )
+    else:
+        expenses = await Expense.get_all(user, search_param)
+    response = rows_response(handle_result(expenses))
+    response.headers.update(validator_headers(tag))
+    return response
+
+
+@router.get("/export")
+async def export_items(
+    user: CurrentActiveUser,
+    format: ExportFormat = ExportFormat.ndjson,
+    include_logs: bool = False,
+):
+    rows = handle_result(Expense.export(user, include_logs))
+    return export_response(
+        rows, format, "expenses",
+        schemas.ExpenseRead, schemas.ExpenseLogRead if include_logs else None,
+    )
 
 
 @router.get("/first", response_model=schemas.ExpenseRead)
@@ -36,46 +83,126 @@ async def first(user: CurrentActiveUser):
     return handle_result(expense)
 
 
-@router.get("/{expense_id}", response_model=schemas.ExpenseRead)
-async def read_item(expense_id: int, user: CurrentActiveUser):
-    expense = await Expense.get(expense_id, user)
-    return handle_result(expense)
+# include=logs embeds the latest logs_limit logs, older ones are paged
+# through /expense_logs/ with a cursor. A conditional request is answered
+# from the version alone when it still matches.
+@router.get(
+    "/{expense_id}",
+    response_model=schemas.ExpenseDetail | schemas.ExpenseRead,
+)
+async def read_item(
+    request: Request,
+    response: Response,
+    expense_id: int,
+    user: CurrentActiveUser,
+    include: Literal["logs"] | None = None,
+    logs_limit: int = Query(
+        settings.detail_logs_limit, ge=1, le=settings.max_detail_logs_limit
+    ),
+):
+    limit = logs_limit if include == "logs" else None
+    if is_conditional(request):
+        validator = handle_result(
+            await Expense.get_validator(expense_id, user, limit)
+        )
+        if is_fresh(request, *validator):
+            return not_modified(*validator)
+    if limit is not None:
+        expense = handle_result(
+            await Expense.get_with_logs(expense_id, user, limit)
+        )
+        logs = [(log.id, log.updated) for log in expense.latest_logs]
+    else:
+        expense = handle_result(await Expense.get(expense_id, user))
+        logs = None
+    response.headers.update(
+        validator_headers(*detail_validator(expense, logs))
+    )
+    return expense
 
 
-@router.post("/", response_model=schemas.ExpenseRead)
+# log=true on a create or an update writes the expense log in the same
+# transaction, no separate POST /expense_logs/ needed. The multipart body
+# is read here, the attachment streams to S3 as it arrives and is stored
+# under the hash of its content.
+@router.post(
+    "/", response_model=schemas.ExpenseRead,
+    openapi_extra=form_body(schemas.ExpenseForm),
+)
 async def create_item(
     request: Request,
     user: CurrentActiveUser,
-    title: Annotated[str, Form()],
-    description: Annotated[str, Form()],
-    amount: Annotated[float, Form()],
-    attachment: Annotated[UploadFile | None, File()] = None,
+    log: bool = False,
 ):
+    form, attachment = await read_form(
+        request, schemas.ExpenseForm, partial(upload_key, user.id),
+        finish=partial(Attachment.store, user_id=user.id),
+    )
     expense = await Expense.create(
-        user, title, description, amount, attachment
+        user, form.title, form.description, form.amount, attachment, log
     )
     return handle_result(expense)
 
 
-@router.put("/{expense_id}", response_model=schemas.ExpenseRead)
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_items(
+    user: CurrentActiveUser, items: Annotated[list[dict], Body()]
+):
+    created = await Expense.create_bulk(user, items)
+    return handle_result(created)
+
+
+# Streams NDJSON, an error event per rejected row, progress after every
+# batch and a done event with the totals once the import is committed
+@router.post("/import")
+async def import_items(
+    user: CurrentActiveUser,
+    file: Annotated[UploadFile, File()],
+    format: ImportFormat | None = None,
+):
+    events = handle_result(Expense.import_statement(
+        user, file, format or guess_format(file.filename)
+    ))
+    return StreamingResponse(
+        (json.dumps(event) + "\n" async for event in events),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.put(
+    "/{expense_id}", response_model=schemas.ExpenseRead,
+    openapi_extra=form_body(schemas.ExpenseUpdateForm),
+)
 async def update_item(
     request: Request,
     user: CurrentActiveUser,
     expense_id: int,
-    title: Annotated[str, Form()],
-    description: Annotated[str, Form()],
-    amount: Annotated[float, Form()],
-    attachment: Annotated[UploadFile | None, File()] = None,
+    log: bool = False,
 ):
+    async def accept_file():
+        return handle_result(
+            await Expense.accepts_attachment(expense_id, user)
+        )
+
+    form, attachment = await read_form(
+        request, schemas.ExpenseUpdateForm, partial(upload_key, user.id),
+        accept_file=accept_file,
+        finish=partial(Attachment.store, user_id=user.id),
+    )
     updated = await Expense.update(
-        expense_id, user, title, description, amount, attachment
+        expense_id, user, form.title, form.description, form.amount,
+        attachment, log, form.version,
     )
     return handle_result(updated)
 
 
+# Sending the version read makes an update or delete fail with 409 when
+# the expense was changed since
 @router.delete("/{expense_id}")
-async def delete_item(expense_id: int, user: CurrentActiveUser):
-    deleted = await Expense.delete(expense_id, user)
+async def delete_item(
+    expense_id: int, user: CurrentActiveUser, version: int | None = None
+):
+    deleted = await Expense.delete(expense_id, user, version)
     return handle_result(deleted)
 
 
@@ -83,3 +210,50 @@ async def delete_item(expense_id: int, user: CurrentActiveUser):
 async def delete_item_attachment(expense_id: int, user: CurrentActiveUser):
     deleted = await Expense.delete_attachment(expense_id, user)
     return handle_result(deleted)
+
+
+# The attachment's bytes never pass through the API: the client POSTs the
+# file to S3 with the presigned form, then confirms the key it was given
+@router.post(
+    "/{expense_id}/attachment/upload", response_model=schemas.AttachmentUpload
+)
+async def upload_item_attachment(
+    expense_id: int,
+    user: CurrentActiveUser,
+    upload: schemas.AttachmentUploadRequest,
+):
+    form = await Expense.upload_attachment(
+        expense_id, user, upload.filename, upload.content_type, upload.sha256
+    )
+    return handle_result(form)
+
+
+@router.post(
+    "/{expense_id}/attachment/confirm", response_model=schemas.ExpenseRead
+)
+async def confirm_item_attachment(
+    expense_id: int,
+    user: CurrentActiveUser,
+    confirm: schemas.AttachmentConfirm,
+):
+    expense = await Expense.attach(expense_id, user, confirm.key)
+    return handle_result(expense)
+
+
+# Attachments are private, they're read through a presigned GET that
+# expires after attachment_download_url_ttl
+@router.get(
+    "/{expense_id}/attachment", response_model=schemas.AttachmentDownload
+)
+async def read_item_attachment(expense_id: int, user: CurrentActiveUser):
+    key = handle_result(await Expense.get_attachment(expense_id, user))
+    return handle_result(download_url(user.id, key))
+
+
+# thumbnail_url, a redirect to a presigned GET of the thumbnail rendered
+# after the upload
+@router.get("/{expense_id}/attachment/thumbnail")
+async def read_item_thumbnail(expense_id: int, user: CurrentActiveUser):
+    key = handle_result(await Expense.get_thumbnail(expense_id, user))
+    download = handle_result(download_url(user.id, key))
+    return RedirectResponse(download["url"])
@@ -1,27 +1,70 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from app import schemas
+from app import schemas, settings
 from app.config.users import CurrentActiveUser
 from app.models.invoice_model import Invoice
 from app.models.user_model import User
+from app.utils.attachments import download_url
+from app.utils.conditional import (detail_validator, is_conditional, is_fresh,
+                                   list_etag, not_modified, validator_headers)
 from app.utils.custom_api_route import APIRouter
+from app.utils.export import ExportFormat, export_response
+from app.utils.fast_json import rows_response
+from app.utils.keyset import DEFAULT_SORT
 from app.utils.service_result import handle_result
-from fastapi import Depends, Query, Request
-from fastapi_pagination import Page, pagination_ctx
+from fastapi import Body, Depends, Query, Request, Response
+from fastapi.responses import RedirectResponse
+from fastapi_pagination import Page, pagination_ctx, resolve_params
 
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
 
 Page = Page.with_custom_options(size=Query(2))
 
+# Passing cursor (empty for the first page) switches to keyset pagination,
+# no total count but every page costs the same. page/size stays the default.
+# Pages carry an ETag, If-None-Match gets a 304 before the page is queried.
 @router.get(
     "/",
-    response_model=Page[schemas.ExpenseRead],
+    response_model=(
+        Page[schemas.InvoiceRead] | schemas.CursorPage[schemas.InvoiceRead]
+    ),
     dependencies=[Depends(pagination_ctx(Page))]
 )
-async def read_items(user: CurrentActiveUser):
-    invoices = await Invoice.get_all(user)
-    return handle_result(invoices)
+async def read_items(
+    request: Request,
+    user: CurrentActiveUser,
+    q: str | None = None,
+    cursor: str | None = None,
+    sort: str = DEFAULT_SORT,
+):
+    tag = list_etag(
+        request, user, handle_result(await Invoice.get_list_state(user))
+    )
+    if is_fresh(request, tag):
+        return not_modified(tag)
+    if cursor is not None:
+        invoices = await Invoice.get_all_cursor(
+            user, q, cursor, sort, resolve_params().size
+        )
+    else:
+        invoices = await Invoice.get_all(user, q)
+    response = rows_response(handle_result(invoices))
+    response.headers.update(validator_headers(tag))
+    return response
+
+
+@router.get("/export")
+async def export_items(
+    user: CurrentActiveUser,
+    format: ExportFormat = ExportFormat.ndjson,
+    include_logs: bool = False,
+):
+    rows = handle_result(Invoice.export(user, include_logs))
+    return export_response(
+        rows, format, "invoices",
+        schemas.InvoiceRead, schemas.InvoiceLogRead if include_logs else None,
+    )
 
 
 @router.get("/first", response_model=schemas.InvoiceRead)
@@ -30,18 +73,63 @@ async def first(user: CurrentActiveUser):
     return handle_result(invoice)
 
 
-@router.get("/{invoice_id}", response_model=schemas.InvoiceRead)
-async def read_item(invoice_id: int, user: CurrentActiveUser):
-    invoice = await Invoice.get(invoice_id, user)
-    return handle_result(invoice)
+# include=logs embeds the latest logs_limit logs, older ones are paged
+# through /invoice_logs/ with a cursor. A conditional request is answered
+# from the version alone when it still matches.
+@router.get(
+    "/{invoice_id}",
+    response_model=schemas.InvoiceDetail | schemas.InvoiceRead,
+)
+async def read_item(
+    request: Request,
+    response: Response,
+    invoice_id: int,
+    user: CurrentActiveUser,
+    include: Literal["logs"] | None = None,
+    logs_limit: int = Query(
+        settings.detail_logs_limit, ge=1, le=settings.max_detail_logs_limit
+    ),
+):
+    limit = logs_limit if include == "logs" else None
+    if is_conditional(request):
+        validator = handle_result(
+            await Invoice.get_validator(invoice_id, user, limit)
+        )
+        if is_fresh(request, *validator):
+            return not_modified(*validator)
+    if limit is not None:
+        invoice = handle_result(
+            await Invoice.get_with_logs(invoice_id, user, limit)
+        )
+        logs = [(log.id, log.updated) for log in invoice.latest_logs]
+    else:
+        invoice = handle_result(await Invoice.get(invoice_id, user))
+        logs = None
+    response.headers.update(
+        validator_headers(*detail_validator(invoice, logs))
+    )
+    return invoice
 
 
+# log=true on a create or an update writes the invoice log in the same
+# transaction, no separate POST /invoice_logs/ needed
 @router.post("/")
 async def create_item(
-    request: Request, invoice: schemas.Invoice, user: CurrentActiveUser
+    request: Request,
+    invoice: schemas.Invoice,
+    user: CurrentActiveUser,
+    log: bool = False,
 ):
     invoice.user_id = user.id
-    created = await Invoice.create(invoice)
+    created = await Invoice.create(invoice, log)
+    return handle_result(created)
+
+
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_items(
+    user: CurrentActiveUser, items: Annotated[list[dict], Body()]
+):
+    created = await Invoice.create_bulk(user, items)
     return handle_result(created)
 
 
@@ -50,13 +138,65 @@ async def update_item(
     request: Request,
     invoice_id: int,
     invoice: schemas.InvoiceUpdate,
-    user: CurrentActiveUser
+    user: CurrentActiveUser,
+    log: bool = False,
 ):
-    updated = await Invoice.update(invoice_id, invoice, user)
+    updated = await Invoice.update(invoice_id, invoice, user, log)
     return handle_result(updated)
 
 
+# Sending the version read makes an update or delete fail with 409 when
+# the invoice was changed since
 @router.delete("/{invoice_id}")
-async def delete_item(invoice_id: int, user: CurrentActiveUser):
-    deleted = await Invoice.delete(invoice_id, user)
+async def delete_item(
+    invoice_id: int, user: CurrentActiveUser, version: int | None = None
+):
+    deleted = await Invoice.delete(invoice_id, user, version)
     return handle_result(deleted)
+
+
+# The attachment's bytes never pass through the API: the client POSTs the
+# file to S3 with the presigned form, then confirms the key it was given
+@router.post(
+    "/{invoice_id}/attachment/upload", response_model=schemas.AttachmentUpload
+)
+async def upload_item_attachment(
+    invoice_id: int,
+    user: CurrentActiveUser,
+    upload: schemas.AttachmentUploadRequest,
+):
+    form = await Invoice.upload_attachment(
+        invoice_id, user, upload.filename, upload.content_type, upload.sha256
+    )
+    return handle_result(form)
+
+
+@router.post(
+    "/{invoice_id}/attachment/confirm", response_model=schemas.InvoiceRead
+)
+async def confirm_item_attachment(
+    invoice_id: int,
+    user: CurrentActiveUser,
+    confirm: schemas.AttachmentConfirm,
+):
+    invoice = await Invoice.attach(invoice_id, user, confirm.key)
+    return handle_result(invoice)
+
+
+# Attachments are private, they're read through a presigned GET that
+# expires after attachment_download_url_ttl
+@router.get(
+    "/{invoice_id}/attachment", response_model=schemas.AttachmentDownload
+)
+async def read_item_attachment(invoice_id: int, user: CurrentActiveUser):
+    key = handle_result(await Invoice.get_attachment(invoice_id, user))
+    return handle_result(download_url(user.id, key))
+
+
+# thumbnail_url, a redirect to a presigned GET of the thumbnail rendered
+# after the upload
+@router.get("/{invoice_id}/attachment/thumbnail")
+async def read_item_thumbnail(invoice_id: int, user: CurrentActiveUser):
+    key = handle_result(await Invoice.get_thumbnail(invoice_id, user))
+    download = handle_result(download_url(user.id, key))
+    return RedirectResponse(download["url"])
@@ -0,0 +1,13 @@
+from app import schemas
+from app.config.users import CurrentActiveUser
+from app.models.ledger_counter_model import LedgerCounter
+from app.utils.custom_api_route import APIRouter
+from app.utils.service_result import handle_result
+
+router = APIRouter(prefix="/summary", tags=["summary"])
+
+
+@router.get("/", response_model=schemas.LedgerSummary)
+async def read_summary(user: CurrentActiveUser):
+    totals = await LedgerCounter.get_totals(user)
+    return handle_result(totals)
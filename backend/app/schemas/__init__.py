@@ -2,3 +2,9 @@ from app.schemas.expense_schema import *
 from app.schemas.expense_log_schema import *
 from app.schemas.invoice_schema import *
 from app.schemas.invoice_log_schema import *
+from app.schemas.pagination_schema import *
+from app.schemas.summary_schema import *
+from app.schemas.bulk_schema import *
+from app.schemas.dashboard_schema import *
+from app.schemas.analytics_schema import *
+from app.schemas.attachment_schema import *
@@ -0,0 +1,11 @@
+from datetime import date
+
+from pydantic import BaseModel
+
+
+class MonthlyRollup(BaseModel):
+    month: date
+    kind: str
+    currency_code: str
+    count: int
+    amount: float
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class AttachmentUploadRequest(BaseModel):
+    filename: str = Field(max_length=255)
+    content_type: str
+    # Hex sha256 of the file, when the user already has it nothing is sent
+    sha256: Optional[str] = Field(default=None, pattern="^[0-9a-f]{64}$")
+
+
+# A form POST to url with fields and then the file, as the field named
+# file, stores it under key. exists means the content is stored already,
+# key is confirmed without an upload.
+class AttachmentUpload(BaseModel):
+    key: str
+    exists: bool = False
+    url: Optional[str] = None
+    fields: Optional[dict[str, str]] = None
+    expires_in: Optional[int] = None
+
+
+class AttachmentConfirm(BaseModel):
+    key: str = Field(max_length=200)
+
+
+class AttachmentDownload(BaseModel):
+    url: str
+    expires_in: int
@@ -0,0 +1,21 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class BulkItem(BaseModel):
+    title: str = Field(max_length=64)
+    description: Optional[str] = Field(default=None, max_length=200)
+    amount: float | int
+    currency_code: str = Field(default="USD", max_length=10)
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    errors: Optional[list[dict]] = None
+
+
+class BulkResult(BaseModel):
+    created: int
+    items: list[BulkItemResult]
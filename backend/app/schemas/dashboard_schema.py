@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from app.schemas.expense_schema import ExpenseRead
+from app.schemas.invoice_schema import InvoiceRead
+from app.schemas.summary_schema import LedgerSummary
+from app.schemas.user_schema import UserRead
+from pydantic import BaseModel
+
+
+class ActivityItem(BaseModel):
+    kind: str
+    parent_id: int
+    id: int
+    title: str
+    amount: float
+    currency_code: str
+    created: datetime
+
+
+class Dashboard(BaseModel):
+    user: UserRead
+    latest_expense: Optional[ExpenseRead] = None
+    latest_invoice: Optional[InvoiceRead] = None
+    totals: LedgerSummary
+    activity: list[ActivityItem]
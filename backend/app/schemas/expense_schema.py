@@ -2,15 +2,18 @@ import uuid
 from datetime import date, datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from app.schemas.expense_log_schema import ExpenseLogRead
+from pydantic import BaseModel, Field
 
 
 class Expense(BaseModel):
-    title: str
-    description: Optional[str]
+    # Lengths as in the table, so a bad row fails validation and not the
+    # statement it's part of
+    title: str = Field(max_length=64)
+    description: Optional[str] = Field(max_length=200)
     amount: float | int
-    currency_code: str
-    attachment: Optional[str]
+    currency_code: str = Field(max_length=10)
+    attachment: Optional[str] = Field(max_length=200)
     created: Optional[datetime] = None
     updated: Optional[datetime] = None
     user_id: Optional[uuid.UUID] = None
@@ -21,7 +24,31 @@ class ExpenseUpdate(BaseModel):
     description: Optional[str]
     amount: float | int
     attachment: Optional[str]
+    # The version the change was made against, None overwrites whatever is
+    # there
+    version: Optional[int] = None
+
+
+# The text fields of the multipart form an expense is created or updated
+# with, the attachment beside them is streamed to S3
+class ExpenseForm(BaseModel):
+    title: str
+    description: str
+    amount: float
+
+
+class ExpenseUpdateForm(ExpenseForm):
+    version: Optional[int] = None
 
 
 class ExpenseRead(Expense):
     id: int
+    version: int
+    # Where the attachment's thumbnail is read, None without an attachment
+    thumbnail_url: Optional[str] = None
+
+
+class ExpenseDetail(ExpenseRead):
+    # Filled from latest_logs, an Expense without it (logs not asked for)
+    # isn't one and never has its lazy logs relationship touched
+    logs: list[ExpenseLogRead] = Field(validation_alias="latest_logs")
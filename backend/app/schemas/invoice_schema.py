@@ -2,7 +2,8 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from app.schemas.invoice_log_schema import InvoiceLogRead
+from pydantic import BaseModel, Field
 
 
 class Invoice(BaseModel):
@@ -21,7 +22,19 @@ class InvoiceUpdate(BaseModel):
     description: Optional[str]
     amount: float | int
     attachment: Optional[str]
+    # The version the change was made against, None overwrites whatever is
+    # there
+    version: Optional[int] = None
 
 
 class InvoiceRead(Invoice):
     id: int
+    version: int
+    # Where the attachment's thumbnail is read, None without an attachment
+    thumbnail_url: Optional[str] = None
+
+
+class InvoiceDetail(InvoiceRead):
+    # Filled from latest_logs, an Invoice without it (logs not asked for)
+    # isn't one and never has its lazy logs relationship touched
+    logs: list[InvoiceLogRead] = Field(validation_alias="latest_logs")
@@ -0,0 +1,12 @@
+from typing import Generic, Optional, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T]
+    size: int
+    next: Optional[str] = None
+    prev: Optional[str] = None
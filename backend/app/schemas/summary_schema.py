@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class LedgerTotals(BaseModel):
+    count: int
+    amount: float
+
+
+class LedgerSummary(BaseModel):
+    expenses: LedgerTotals
+    invoices: LedgerTotals
@@ -0,0 +1,88 @@
+from contextlib import asynccontextmanager
+
+from app import settings
+from app.config.database import get_read_db_cm
+from app.models.expense_log_model import ExpenseLog
+from app.models.expense_model import Expense
+from app.models.invoice_log_model import InvoiceLog
+from app.models.invoice_model import Invoice
+from app.models.ledger_counter_model import EXPENSE, INVOICE, LedgerCounter
+from app.utils.service_result import ServiceResult
+from sqlalchemy import desc, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+
+
+def latest(model, user_id):
+    row = select(model).where(model.user_id == user_id).order_by(
+        desc(model.id)
+    ).limit(1).subquery()
+    return select(
+        func.to_jsonb(row.table_valued(), type_=JSONB)
+    ).scalar_subquery()
+
+
+def counters(user_id):
+    return select(func.jsonb_agg(
+        func.jsonb_build_object(
+            "kind", LedgerCounter.kind,
+            "row_count", LedgerCounter.row_count,
+            "amount_sum", LedgerCounter.amount_sum,
+        ),
+        type_=JSONB,
+    )).where(LedgerCounter.user_id == user_id).scalar_subquery()
+
+
+def log_activity(log, kind: str, parent, user_id, limit: int):
+    return select(
+        literal(kind).label("kind"),
+        parent.label("parent_id"),
+        log.id, log.title, log.amount, log.currency_code, log.created,
+    ).where(log.user_id == user_id).order_by(desc(log.id)).limit(limit)
+
+
+def activity(user_id, limit: int):
+    # Latest log entries of both kinds, each side an index range scan
+    logs = union_all(
+        log_activity(
+            ExpenseLog, EXPENSE, ExpenseLog.expense_id, user_id, limit
+        ),
+        log_activity(
+            InvoiceLog, INVOICE, InvoiceLog.invoice_id, user_id, limit
+        ),
+    ).subquery()
+    recent = select(logs).order_by(
+        desc(logs.c.created)
+    ).limit(limit).subquery()
+    return select(func.jsonb_agg(
+        aggregate_order_by(recent.table_valued(), desc(recent.c.created)),
+        type_=JSONB,
+    )).scalar_subquery()
+
+
+class DashboardService:
+    """
+    Everything the dashboard layout needs in one statement, so one
+    connection and one round trip instead of a request per panel
+    """
+    @classmethod
+    async def get(cls, user) -> ServiceResult:
+        db_context = asynccontextmanager(get_read_db_cm)
+        async with db_context(user.id) as db:
+            q = select(
+                latest(Expense, user.id).label("latest_expense"),
+                latest(Invoice, user.id).label("latest_invoice"),
+                counters(user.id).label("counters"),
+                activity(
+                    user.id, settings.dashboard_activity_limit
+                ).label("activity"),
+            )
+            row = (await db.execute(q)).one()
+            return ServiceResult({
+                "user": user,
+                "latest_expense": row.latest_expense,
+                "latest_invoice": row.latest_invoice,
+                "totals": LedgerCounter.totals(
+                    LedgerCounter(**counter) for counter in row.counters or []
+                ),
+                "activity": row.activity or [],
+            })
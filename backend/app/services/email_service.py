@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import random
+from dataclasses import asdict, dataclass, field
+from itertools import groupby
+from pathlib import Path
+
+import sib_api_v3_sdk
+from app import settings
+from loguru import logger
+
+SENDER = {"name": "Sando", "email": "akrachunov@gmail.com"}
+
+VERIFY_EMAIL_TEMPLATE = 1
+RESET_PASSWORD_TEMPLATE = 2
+
+
+@dataclass
+class EmailJob:
+    to: str
+    template_id: int
+    subject: str
+    params: dict = field(default_factory=dict)
+    attempts: int = 0
+
+
+class EmailTransport:
+    """
+    Sends a batch of jobs of one template, raises when the batch failed as
+    a whole so it's retried as a whole
+    """
+    async def send(self, jobs: list[EmailJob]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class BrevoTransport(EmailTransport):
+    """
+    One send_transac_email call per batch, a message version per job. The
+    API client and its connection pool are built once and kept, the SDK
+    blocks so the call runs on a thread and the event loop goes on.
+    """
+    def __init__(self, api_key: str | None):
+        configuration = sib_api_v3_sdk.Configuration()
+        configuration.api_key["api-key"] = api_key
+        self.client = sib_api_v3_sdk.ApiClient(configuration)
+        self.api = sib_api_v3_sdk.TransactionalEmailsApi(self.client)
+
+    async def send(self, jobs: list[EmailJob]):
+        email = sib_api_v3_sdk.SendSmtpEmail(
+            sender=SENDER,
+            template_id=jobs[0].template_id,
+            message_versions=[
+                sib_api_v3_sdk.SendSmtpEmailMessageVersions(
+                    to=[{"email": job.to}],
+                    subject=job.subject,
+                    params=job.params,
+                )
+                for job in jobs
+            ],
+        )
+        await asyncio.to_thread(self.api.send_transac_email, email)
+
+    async def close(self):
+        self.client.rest_client.pool_manager.clear()
+
+
+class FileTransport(EmailTransport):
+    """
+    Appends the jobs to a JSON lines file per template instead of sending
+    them, for local runs and tests
+    """
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    async def send(self, jobs: list[EmailJob]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"template_{jobs[0].template_id}.jsonl"
+        with path.open("a") as f:
+            for job in jobs:
+                f.write(json.dumps(asdict(job)) + "\n")
+
+
+class EmailQueue:
+    """
+    In process queue of transactional email. Hooks enqueue and return, a
+    single worker task sends what's queued in batches per template: the
+    first job waits batch_wait seconds for others to join it. A failed
+    batch is put back job by job after an exponential backoff with jitter,
+    a job failing max_attempts times is logged and dropped. Nothing
+    survives a restart, stop() sends what's queued before shutting down.
+    """
+    def __init__(self, transport: EmailTransport, maxsize: int,
+                 batch_size: int, batch_wait: float, max_attempts: int,
+                 retry_base_delay: float):
+        self.transport = transport
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.queue: asyncio.Queue | None = None
+        self.worker: asyncio.Task | None = None
+        self.retries: set[asyncio.Task] = set()
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self):
+        # Bound to the running loop, so it's started by the first enqueue
+        # when there's no app lifespan (scripts)
+        if (
+            self.worker is None or self.worker.done()
+            or self.worker.get_loop() is not asyncio.get_running_loop()
+        ):
+            self.queue = asyncio.Queue(self.maxsize)
+            self.worker = asyncio.create_task(self._run())
+
+    async def enqueue(self, job: EmailJob):
+        self.start()
+        # Waits only when maxsize jobs are already queued
+        await self.queue.put(job)
+
+    async def stop(self, timeout: float = 10):
+        if self.worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Email queue stopped with {self.queue.qsize()} jobs")
+        self.worker.cancel()
+        for task in self.retries:
+            task.cancel()
+        self.worker = None
+        await self.transport.close()
+
+    async def _drain(self):
+        # A failed batch schedules its retries before it's marked done, the
+        # queue is empty for good once it's joined with none waiting
+        while True:
+            await self.queue.join()
+            if not self.retries:
+                break
+            await asyncio.gather(*self.retries, return_exceptions=True)
+
+    async def _next_batch(self) -> list[EmailJob]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                batch.sort(key=lambda job: job.template_id)
+                for _, jobs in groupby(batch, key=lambda job: job.template_id):
+                    await self._send(list(jobs))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send(self, jobs: list[EmailJob]):
+        self.batches += 1
+        try:
+            await self.transport.send(jobs)
+        except Exception as e:
+            for job in jobs:
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    self.dropped += 1
+                    logger.error(
+                        f"Email to {job.to} dropped after {job.attempts}"
+                        f" attempts: {e!r}"
+                    )
+                    continue
+                self.retried += 1
+                task = asyncio.create_task(self._retry(job))
+                self.retries.add(task)
+                task.add_done_callback(self.retries.discard)
+            return
+        self.sent += len(jobs)
+
+    async def _retry(self, job: EmailJob):
+        delay = self.retry_base_delay * 2 ** (job.attempts - 1)
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        await self.queue.put(job)
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "waiting_retry": len(self.retries),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+def get_transport() -> EmailTransport:
+    if settings.email_transport == "file":
+        return FileTransport(settings.email_file_directory)
+    return BrevoTransport(os.getenv("BREVO_API_KEY"))
+
+
+email_queue = EmailQueue(
+    get_transport(),
+    maxsize=settings.email_queue_size,
+    batch_size=settings.email_batch_size,
+    batch_wait=settings.email_batch_wait,
+    max_attempts=settings.email_max_attempts,
+    retry_base_delay=settings.email_retry_base_delay,
+)
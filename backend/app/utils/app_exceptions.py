@@ -49,3 +49,52 @@ class AppException(object):
             """
             status_code = 401
             AppExceptionCase.__init__(self, status_code, context)
+
+    class InvalidCursor(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Pagination cursor or sort key can't be decoded
+            """
+            status_code = 400
+            AppExceptionCase.__init__(self, status_code, context)
+
+    class TooManyItems(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Bulk request carries more items than allowed
+            """
+            status_code = 413
+            AppExceptionCase.__init__(self, status_code, context)
+
+    class StaleObject(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Object was changed by someone else since the version sent
+            """
+            status_code = 409
+            AppExceptionCase.__init__(self, status_code, context)
+
+    class AttachmentTooLarge(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Attachment or form bigger than allowed, refused while it arrives
+            """
+            status_code = 413
+            AppExceptionCase.__init__(self, status_code, context)
+
+    class AttachmentType(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Attachment isn't of an allowed type, or its content isn't of
+            the type it was sent as
+            """
+            status_code = 415
+            AppExceptionCase.__init__(self, status_code, context)
+
+    class AttachmentExists(AppExceptionCase):
+        def __init__(self, context: dict = None):
+            """
+            Item already has an attachment, it's never replaced
+            """
+            status_code = 409
+            AppExceptionCase.__init__(self, status_code, context)
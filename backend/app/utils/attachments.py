@@ -0,0 +1,122 @@
+import hashlib
+import re
+import uuid
+from pathlib import PurePath
+
+from app import settings
+from app.utils import aws
+from app.utils.app_exceptions import AppException
+from app.utils.aws import call, delete_user_file
+from app.utils.service_result import ServiceResult
+from app.utils.uploads import SIGNATURE_SIZE, SIGNATURES
+from botocore.exceptions import ClientError
+
+
+def upload_key(user_id, filename: str) -> str:
+    # Where an upload lands until its content is known, a directory of its
+    # own per upload so two files of the same name never meet
+    name = re.sub(r"[^\w.-]", "_", PurePath(filename).name)[-100:]
+    return f"{user_id}/{uuid.uuid4().hex}/{name or 'attachment'}"
+
+
+def owns(user_id, key: str) -> bool:
+    return key.startswith(f"{user_id}/")
+
+
+def content_key(user_id, sha256: str) -> str:
+    return f"{user_id}/{sha256}"
+
+
+def thumbnail_key(key: str, format: str) -> str:
+    # Beside the attachment, one per content like the attachment itself
+    return f"{key}.thumbnail.{format}"
+
+
+def _digest(key: str) -> tuple[str, int, str]:
+    response = aws.s3.get_object(Bucket=aws.bucket_name(), Key=key)
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: response["Body"].read(1024 * 1024), b""):
+        sha256.update(chunk)
+    return (
+        sha256.hexdigest(), response["ContentLength"],
+        response["ContentType"],
+    )
+
+
+async def digest(key: str) -> tuple[str, int, str]:
+    """
+    sha256, size and type of a stored object. It's read from S3 on an S3
+    thread, the bytes never cross the event loop.
+    """
+    return await call(_digest, key=key)
+
+
+def upload_form(user_id, filename: str, content_type: str) -> ServiceResult:
+    """
+    Presigned POST the client sends the file to S3 with, the size and the
+    type are enforced by S3 itself
+    """
+    if content_type not in settings.attachment_types:
+        return ServiceResult(AppException.AttachmentType({
+            "content_type": content_type,
+            "allowed": settings.attachment_types,
+        }))
+    key = upload_key(user_id, filename)
+    post = aws.s3.generate_presigned_post(
+        aws.bucket_name(), key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.attachment_max_bytes],
+        ],
+        ExpiresIn=settings.attachment_upload_url_ttl,
+    )
+    return ServiceResult({
+        "key": key,
+        "url": post["url"],
+        "fields": post["fields"],
+        "expires_in": settings.attachment_upload_url_ttl,
+    })
+
+
+async def check_upload(user_id, key: str) -> ServiceResult:
+    """
+    Whether key is an object the user uploaded with upload_form, one that
+    isn't what it was sent as is deleted
+    """
+    if not owns(user_id, key):
+        return ServiceResult(AppException.GetObject({"key": key}))
+    try:
+        head = await call(
+            aws.s3.head_object, Bucket=aws.bucket_name(), Key=key
+        )
+        first = await call(
+            aws.s3.get_object, Bucket=aws.bucket_name(), Key=key,
+            Range=f"bytes=0-{SIGNATURE_SIZE - 1}",
+        )
+    except ClientError:
+        return ServiceResult(AppException.GetObject({"key": key}))
+    content_type = head.get("ContentType")
+    signatures = SIGNATURES.get(content_type)
+    head_bytes = await call(first["Body"].read)
+    if content_type not in settings.attachment_types or (
+        signatures and not head_bytes.startswith(signatures)
+    ):
+        await delete_user_file(key)
+        return ServiceResult(AppException.AttachmentType({
+            "content_type": content_type,
+            "allowed": settings.attachment_types,
+        }))
+    return ServiceResult(key)
+
+
+def download_url(user_id, key: str | None) -> ServiceResult:
+    if not key or not owns(user_id, key):
+        return ServiceResult(AppException.GetObject({"key": key}))
+    url = aws.s3.generate_presigned_url(
+        "get_object", Params={"Bucket": aws.bucket_name(), "Key": key},
+        ExpiresIn=settings.attachment_download_url_ttl,
+    )
+    return ServiceResult({
+        "url": url, "expires_in": settings.attachment_download_url_ttl
+    })
@@ -1,33 +1,168 @@
+import asyncio
+import functools
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
-from fastapi import UploadFile
+from app import settings
 
+# STORAGE_ENDPOINT_URL points the client at an S3 stand-in (MinIO, moto
+# server), unset it's AWS
 s3 = boto3.client(
     "s3",
     region_name=os.getenv("STORAGE_REGION"),
     aws_access_key_id=os.getenv("STORAGE_ACCESS_KEY"),
     aws_secret_access_key=os.getenv("STORAGE_SECRET"),
+    endpoint_url=os.getenv("STORAGE_ENDPOINT_URL"),
 )
 
+# boto3 clients are thread safe, every call to S3 runs on these threads and
+# none of them holds up the event loop
+executor = ThreadPoolExecutor(
+    settings.upload_workers, thread_name_prefix="s3"
+)
+
+
+async def call(method, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(method, **kwargs)
+    )
+
+
+def bucket_name():
+    return os.getenv("STORAGE_BUCKET")
+
+
+class StreamingUpload:
+    """
+    An object written to S3 while its bytes are still arriving. Every
+    part_size bytes go up as a part of a multipart upload, up to
+    concurrency parts at once: write() waits for one of them to finish
+    beyond that, which is what stops the request body being read faster
+    than S3 takes it. An object smaller than a part is sent with a single
+    put_object once complete() is called, abort() drops what was sent.
+    The content's sha256 is taken as it passes, complete() can store the
+    object under a key made of it. Objects are private, they're read
+    through presigned URLs.
+    """
+    def __init__(self, key: str, content_type: str, part_size: int,
+                 concurrency: int, client=None, bucket: str | None = None):
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.client = client or s3
+        self.bucket = bucket or bucket_name()
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.upload_id = None
+        self.buffer = bytearray()
+        self.parts: list[asyncio.Task] = []
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        self.sha256.update(data)
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            part = bytes(self.buffer[:self.part_size])
+            del self.buffer[:self.part_size]
+            await self._send_part(part)
+
+    async def _send_part(self, body: bytes):
+        for task in self.parts:
+            # A part that failed fails the upload now, not at the end
+            if task.done() and task.exception():
+                raise task.exception()
+        if self.upload_id is None:
+            response = await call(
+                self.client.create_multipart_upload,
+                Bucket=self.bucket, Key=self.key,
+                ContentType=self.content_type,
+            )
+            self.upload_id = response["UploadId"]
+        await self.slots.acquire()
+        self.parts.append(asyncio.create_task(
+            self._upload_part(len(self.parts) + 1, body)
+        ))
 
-def get_location(file_path: str):
-    bucket = os.getenv("STORAGE_BUCKET")
-    domain = "s3.eu-central-1.amazonaws.com"
-    url = f"https://{bucket}.{domain}/{file_path}"
-    return url
+    async def _upload_part(self, number: int, body: bytes) -> dict:
+        try:
+            response = await call(
+                self.client.upload_part,
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=number, Body=body,
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self.slots.release()
 
+    async def complete(self, key: str | None = None) -> str:
+        # The parts of a multipart upload belong to the key it was started
+        # with, the finished object is copied to another one
+        key = key or self.key
+        if self.upload_id is None:
+            await call(
+                self.client.put_object,
+                Bucket=self.bucket, Key=key, Body=bytes(self.buffer),
+                ContentType=self.content_type,
+            )
+        else:
+            if self.buffer:
+                await self._send_part(bytes(self.buffer))
+            parts = await asyncio.gather(*self.parts)
+            await call(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            if key != self.key:
+                await copy_user_file(
+                    self.key, key, self.client, self.bucket
+                )
+        self.buffer.clear()
+        return key
 
-def upload_user_file(attachment: UploadFile, user_id: str):
-    s3.upload_fileobj(
-        attachment.file,
-        os.getenv("STORAGE_BUCKET"),
-        f"{user_id}/{attachment.filename}",
-        ExtraArgs={'ACL': 'public-read'},
+    async def abort(self):
+        self.buffer.clear()
+        await asyncio.gather(*self.parts, return_exceptions=True)
+        if self.upload_id is not None:
+            await call(
+                self.client.abort_multipart_upload,
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            )
+
+
+def _read(key: str) -> bytes:
+    return s3.get_object(Bucket=bucket_name(), Key=key)["Body"].read()
+
+
+async def read_user_file(key: str) -> bytes:
+    # The request and the body both read on an S3 thread
+    return await call(_read, key=key)
+
+
+async def put_user_file(key: str, body: bytes, content_type: str):
+    await call(
+        s3.put_object, Bucket=bucket_name(), Key=key, Body=body,
+        ContentType=content_type,
     )
-    return get_location(f"{user_id}/{attachment.filename}")
 
 
-def delete_user_file(file_path: str):
-    s3.delete_object(Bucket=os.getenv("STORAGE_BUCKET"), Key=file_path)
+async def delete_user_file(file_path: str):
+    await call(
+        s3.delete_object, Bucket=bucket_name(), Key=file_path
+    )
     return True
+
+
+async def copy_user_file(source: str, target: str, client=None,
+                         bucket: str | None = None):
+    # Moves the object, S3 copies it without it passing through here
+    client = client or s3
+    bucket = bucket or bucket_name()
+    await call(
+        client.copy_object, Bucket=bucket, Key=target,
+        CopySource={"Bucket": bucket, "Key": source},
+    )
+    await call(client.delete_object, Bucket=bucket, Key=source)
@@ -0,0 +1,36 @@
+from pydantic import BaseModel, ValidationError
+
+
+def validate_items(
+    items: list, schema: type[BaseModel]
+) -> tuple[list[dict], list[BaseModel]]:
+    """
+    Validates every item on its own so one bad row doesn't sink the batch.
+    Returns a result per item, in request order, and the valid items, the
+    ids get filled into the results once the rows are inserted.
+    """
+    results, valid = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append(schema.model_validate(item))
+            results.append({"index": index})
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "errors": e.errors(
+                    include_url=False, include_context=False,
+                    include_input=False,
+                ),
+            })
+    return results, valid
+
+
+def fill_ids(results: list[dict], ids: list[int]) -> dict:
+    ids = iter(ids)
+    for result in results:
+        if "errors" not in result:
+            result["id"] = next(ids)
+    return {
+        "created": sum("id" in result for result in results),
+        "items": results,
+    }
@@ -0,0 +1,80 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+# Revalidated on every use and never kept by a shared cache, the bodies are
+# one user's
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def detail_validator(item, logs=None) -> tuple[str, datetime | None]:
+    """
+    ETag and Last-Modified of a detail body, item is the object or a row
+    with its id, version, created and updated. logs are (id, updated) of the
+    embedded logs, None when there are none. Dropping a log moves no
+    timestamp, so a detail with logs only gets an ETag.
+    """
+    if logs is None:
+        tag = etag(item.id, item.version, item.updated)
+        return tag, item.updated or item.created
+    return etag(item.id, item.version, item.updated, tuple(logs)), None
+
+
+def list_etag(request: Request, user, state) -> str:
+    """
+    Strong ETag of a list page. state is what any insert, update or delete
+    of the user's rows moves (row count, max id and max updated), the query
+    string picks the page out of it.
+    """
+    return etag(user.id, tuple(state), sorted(request.query_params.items()))
+
+
+def is_conditional(request: Request) -> bool:
+    return (
+        "if-none-match" in request.headers
+        or "if-modified-since" in request.headers
+    )
+
+
+def is_fresh(
+    request: Request, tag: str, modified: datetime | None = None
+) -> bool:
+    """
+    If-None-Match wins over If-Modified-Since when both are sent, the
+    latter only has a second's resolution
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or tag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(tag: str, modified: datetime | None = None) -> dict:
+    headers = {"ETag": tag, "Cache-Control": CACHE_CONTROL}
+    if modified:
+        headers["Last-Modified"] = format_datetime(
+            modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def not_modified(tag: str, modified: datetime | None = None) -> Response:
+    # Nothing is fetched past the validator and nothing is serialized
+    return Response(status_code=304, headers=validator_headers(tag, modified))
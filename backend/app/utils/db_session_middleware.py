@@ -0,0 +1,32 @@
+from app.config.database import RequestSession, request_session_var
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class DBSessionMiddleware:
+    """
+    Opens a request scoped unit of work and commits it right before the
+    response starts, so the client never sees data that isn't committed yet.
+    Error responses roll back. Work done after the response has started
+    (background tasks, streaming bodies) runs on its own session.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_session = RequestSession()
+        token = request_session_var.set(request_session)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                await request_session.finish(commit=message["status"] < 400)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_session_var.reset(token)
+            await request_session.close()
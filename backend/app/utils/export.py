@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator
+
+from app import settings
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _dump(item, schema: type[BaseModel]) -> dict:
+    return schema.model_validate(item, from_attributes=True).model_dump(
+        mode="json"
+    )
+
+
+async def ndjson_chunks(
+    rows: AsyncIterator, schema: type[BaseModel],
+    log_schema: type[BaseModel] | None = None,
+) -> AsyncIterator[str]:
+    """
+    One JSON object per line, the logs nested under "logs" when asked for
+    """
+    lines = []
+    async for item in rows:
+        data = _dump(item, schema)
+        if log_schema is not None:
+            data["logs"] = [_dump(log, log_schema) for log in item.logs]
+        lines.append(json.dumps(data) + "\n")
+        if len(lines) >= settings.export_chunk_rows:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def csv_chunks(
+    rows: AsyncIterator, schema: type[BaseModel],
+    log_schema: type[BaseModel] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Flat rows, a log follows its parent with record=log and parent_id set
+    """
+    fields = ["record", "parent_id", *schema.model_fields]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    async for item in rows:
+        writer.writerow({"record": "item", **_dump(item, schema)})
+        if log_schema is not None:
+            for log in item.logs:
+                writer.writerow({
+                    "record": "log", "parent_id": item.id,
+                    **_dump(log, log_schema),
+                })
+        count += 1
+        if count % settings.export_chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(
+    rows: AsyncIterator, export_format: ExportFormat, name: str,
+    schema: type[BaseModel], log_schema: type[BaseModel] | None = None,
+) -> StreamingResponse:
+    """
+    The rows are only pulled once the body is being sent. Starlette cancels
+    the body when the client goes away, which closes the cursor and the
+    session behind it.
+    """
+    chunks = ndjson_chunks if export_format == ExportFormat.ndjson \
+        else csv_chunks
+    return StreamingResponse(
+        chunks(rows, schema, log_schema),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="{name}.{export_format.value}"'
+        },
+    )
@@ -0,0 +1,54 @@
+import uuid
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:
+    # pydantic's own encoder, also native code and writes the same JSON
+    orjson = None
+
+# Datetimes as pydantic writes them, UTC with a Z
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def _default(value):
+    # asyncpg hands out its own UUID subclass, orjson only takes uuid.UUID
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON rendered by orjson, datetimes, UUIDs and dates included, so rows
+    can go out without passing through jsonable_encoder first
+    """
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(
+                content, default=_default, option=ORJSON_OPTIONS
+            )
+        return to_json(content)
+
+
+def schema_columns(model, schema: type[BaseModel]) -> list:
+    # Only the columns the schema shows, fetched as plain rows
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def row_dicts(rows) -> list[dict]:
+    return [row._asdict() for row in rows]
+
+
+def rows_response(content: Any) -> FastJSONResponse:
+    """
+    Rows selected with schema_columns already have the shape and types of
+    the response model, returning a response skips validating them again
+    """
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+    return FastJSONResponse(content)
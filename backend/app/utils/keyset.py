@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from app.utils.app_exceptions import AppException
+from sqlalchemy import Select, asc, desc, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Sort keys a list can be ordered by, "-" prefix means descending. The id is
+# always appended as a tie breaker so the ordering is total.
+SORT_KEYS = ("id", "created", "amount")
+DEFAULT_SORT = "-id"
+
+
+def encode_cursor(sort: str, direction: str, values: list) -> str:
+    payload = json.dumps({"s": sort, "d": direction, "v": values})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _from_json(key: str, value):
+    """
+    Turns a cursor value back into something comparable with the column,
+    anything of the wrong type would otherwise only fail inside Postgres.
+    """
+    if key == "created":
+        if not isinstance(value, str):
+            raise TypeError(value)
+        return datetime.fromisoformat(value)
+    if key == "amount":
+        if not (_is_int(value) or isinstance(value, float)):
+            raise TypeError(value)
+        return float(value)
+    if not _is_int(value):
+        raise TypeError(value)
+    return value
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        key = payload["s"].lstrip("-")
+        value, last_id = payload["v"]
+        if key not in SORT_KEYS or payload["d"] not in ("next", "prev"):
+            raise ValueError(cursor)
+        if not _is_int(last_id):
+            raise TypeError(last_id)
+        payload["v"] = [_from_json(key, value), last_id]
+        return payload
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+        raise AppException.InvalidCursor({"cursor": cursor})
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def keyset_paginate(
+    db: AsyncSession, q: Select, model, cursor: str, sort: str, size: int
+) -> dict:
+    """
+    Seek pagination over (sort key, id), every page is a single index range
+    scan no matter how deep it is and no COUNT(*) is issued.
+    """
+    key = sort.lstrip("-")
+    if key not in SORT_KEYS:
+        raise AppException.InvalidCursor({"sort": sort})
+    descending = sort.startswith("-")
+    sort_column = getattr(model, key)
+    columns = (sort_column, model.id) if key != "id" else (model.id,)
+
+    direction = "next"
+    if cursor:
+        payload = decode_cursor(cursor)
+        if payload["s"] != sort:
+            raise AppException.InvalidCursor({"cursor": cursor})
+        direction = payload["d"]
+        value, last_id = payload["v"]
+        bound = (value, last_id)[-len(columns):]
+        row = tuple_(*columns)
+        # Walking backwards flips both the comparison and the ordering
+        if descending == (direction == "next"):
+            q = q.where(row < tuple_(*bound))
+        else:
+            q = q.where(row > tuple_(*bound))
+
+    order = desc if descending == (direction == "next") else asc
+    q = q.order_by(None).order_by(*[order(column) for column in columns])
+    # A select of the model gives objects, one of its columns plain rows,
+    # the sort key and id are read off either the same way
+    if q.column_descriptions[0]["expr"] is model:
+        rows = list(await db.scalars(q.limit(size + 1)))
+    else:
+        rows = list(await db.execute(q.limit(size + 1)))
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if direction == "prev":
+        rows.reverse()
+
+    def cursor_for(item, to):
+        return encode_cursor(
+            sort, to, [_to_json(getattr(item, key)), item.id]
+        )
+
+    has_next = has_more if direction == "next" else bool(cursor)
+    has_prev = has_more if direction == "prev" else bool(cursor)
+    return {
+        "items": rows,
+        "size": size,
+        "next": cursor_for(rows[-1], "next") if rows and has_next else None,
+        "prev": cursor_for(rows[0], "prev") if rows and has_prev else None,
+    }
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+
+def password_context(rounds: int) -> CryptContext:
+    # Hashes under min_rounds come back from verify_and_update with a new
+    # hash, so raising the rounds rehashes every password on its next login
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds,
+    )
+
+
+class PasswordHashPool:
+    """
+    Runs PasswordHelper's hash and verify on workers threads of their own.
+    bcrypt lets go of the GIL while it works, so a login only holds up the
+    requests queued behind it for a worker, not every request of the event
+    loop. workers=0 hashes inline, on the event loop.
+    """
+    def __init__(self, helper: PasswordHelper, workers: int):
+        self.helper = helper
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(
+            workers, thread_name_prefix="password"
+        ) if workers else None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def _job(self, submitted: float, function, *args):
+        waited_ms = (time.perf_counter() - submitted) * 1000
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_total_ms += waited_ms
+            self.wait_max_ms = max(self.wait_max_ms, waited_ms)
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def _run(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._job, time.perf_counter(), function, *args
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.helper.hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        return await self._run(
+            self.helper.verify_and_update, plain_password, hashed_password
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "wait_avg_ms": (
+                    self.wait_total_ms / self.completed
+                    if self.completed else 0.0
+                ),
+                "wait_max_ms": self.wait_max_ms,
+            }
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app import settings
+from loguru import logger
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    # No thumbnails then, attachments are stored and served all the same
+    Image = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    # PDFs go without a thumbnail
+    pdfium = None
+
+# thumbnail_format: Pillow's name for it and the type it's stored with
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+
+
+def supports(content_type: str | None) -> bool:
+    if Image is None or not content_type:
+        return False
+    if content_type == "application/pdf":
+        return pdfium is not None
+    return content_type.startswith("image/")
+
+
+def thumbnail_format() -> str:
+    # A Pillow built without libwebp writes JPEG
+    if settings.thumbnail_format == "webp" and not features.check("webp"):
+        return "jpeg"
+    return settings.thumbnail_format
+
+
+def _first_page(data: bytes, size: int):
+    pdf = pdfium.PdfDocument(data)
+    try:
+        page = pdf[0]
+        # At twice the size it's shown (a page is measured in points, 72 an
+        # inch), downscaled afterwards small print stays legible
+        return page.render(scale=2 * size / max(page.get_size())).to_pil()
+    finally:
+        pdf.close()
+
+
+def render_thumbnail(data: bytes, content_type: str, size: int,
+                     format: str, quality: int) -> bytes:
+    """
+    Thumbnail of an image or of a PDF's first page, at most size pixels a
+    side. Runs in a worker process, the bytes are pickled both ways.
+    """
+    if content_type == "application/pdf":
+        image = _first_page(data, size)
+    else:
+        image = Image.open(io.BytesIO(data))
+        # A JPEG is decoded at a fraction of its size when that's enough
+        image.draft("RGB", (size, size))
+        # Phone photos are stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size))
+    name, _ = FORMATS[format]
+    keep_alpha = name == "WEBP" and "A" in image.getbands()
+    image = image.convert("RGBA" if keep_alpha else "RGB")
+    out = io.BytesIO()
+    image.save(out, name, quality=quality)
+    return out.getvalue()
+
+
+class PreviewPool:
+    """
+    Renders thumbnails on workers processes of their own, decoding and
+    resizing hold the GIL and would hold up the event loop on a thread.
+    Jobs run as tasks off the request path, at most jobs of them at once so
+    the attachments waiting aren't all read into memory together. workers=0
+    renders nothing.
+    """
+    def __init__(self, workers: int, jobs: int):
+        self.workers = workers
+        self.executor: ProcessPoolExecutor | None = None
+        self.slots = asyncio.Semaphore(jobs)
+        self.tasks: set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+
+    def enabled(self, content_type: str | None) -> bool:
+        return self.workers > 0 and supports(content_type)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Started on first use. Spawned and not forked, the parent has an
+        # event loop and threads going.
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.executor
+
+    def schedule(self, job, *args):
+        # In a context of its own, the task outlives the request it was
+        # scheduled by and mustn't see its database session
+        task = asyncio.get_running_loop().create_task(
+            self._run(job, *args), context=contextvars.Context()
+        )
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, job, *args):
+        async with self.slots:
+            try:
+                await job(*args)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Thumbnail of {args[0]} failed")
+
+    async def render(self, data: bytes, content_type: str) -> tuple:
+        """The thumbnail's bytes and the format they're in"""
+        format = thumbnail_format()
+        image = await asyncio.get_running_loop().run_in_executor(
+            self._executor(), render_thumbnail, data, content_type,
+            settings.thumbnail_size, format, settings.thumbnail_quality,
+        )
+        return image, format
+
+    async def stop(self):
+        # The jobs running are finished, nothing new is scheduled after
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "images": Image is not None,
+            "pdfs": Image is not None and pdfium is not None,
+            "jobs": len(self.tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+preview_pool = PreviewPool(settings.preview_workers, settings.preview_jobs)
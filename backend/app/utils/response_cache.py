@@ -0,0 +1,169 @@
+import functools
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+
+from app import settings
+from app.utils.service_result import ServiceResult
+
+MISS = object()
+
+
+class CacheBackend:
+    """
+    Where cached reads are kept, values expire ttl seconds after they're
+    set. Every key starts with a namespace whose generation is part of it,
+    bumping the generation is what invalidates the namespace. Subclass it
+    for a store shared by all the workers (Redis: GET/SET EX/INCR) and set
+    it on response_cache.backend at startup.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    async def get(self, key: str):
+        raise NotImplementedError
+
+    async def set(self, key: str, value):
+        raise NotImplementedError
+
+    async def generation(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    async def bump(self, namespace: str):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """
+    LRU of at most max_entries values, per process. With more than one
+    worker a write only invalidates the one it ran on, the others keep
+    serving what they have until the ttl runs out.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: dict = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return MISS
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, (0, 0.0))[0]
+
+    async def bump(self, namespace: str):
+        now = time.monotonic()
+        if len(self._generations) > self.max_entries:
+            # Whatever was set before a bump older than the ttl has expired,
+            # forgetting the bump can't bring it back
+            self._generations = {
+                k: v for k, v in self._generations.items()
+                if now - v[1] < self.ttl
+            }
+        generation, _ = self._generations.get(namespace, (0, 0.0))
+        self._generations[namespace] = (generation + 1, now)
+
+
+class ResponseCache:
+    """
+    Per user cache of model reads. The generation is read before the
+    database is, so a read racing a write is stored under the generation
+    the write's commit bumps and is never served.
+    """
+    def __init__(self, backend: CacheBackend | None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, user_id, parts, load, schema=None):
+        if self.backend is None:
+            return await load()
+        namespace = str(user_id)
+        generation = await self.backend.generation(namespace)
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=16)
+        key = f"{namespace}:{generation}:{digest.hexdigest()}"
+        value = await self.backend.get(key)
+        if value is not MISS:
+            self.hits += 1
+            return ServiceResult(value)
+        self.misses += 1
+        result = await load()
+        if not result.success:
+            return result
+        # ORM objects belong to the session that loaded them, requests
+        # share the schema's copy instead
+        value = result.value
+        if schema:
+            value = schema.model_validate(value, from_attributes=True)
+        await self.backend.set(key, value)
+        return ServiceResult(value)
+
+    async def invalidate(self, user_ids):
+        if self.backend is None:
+            return
+        for user_id in user_ids:
+            await self.backend.bump(str(user_id))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": (
+                len(self.backend)
+                if isinstance(self.backend, MemoryBackend) else None
+            ),
+        }
+
+
+response_cache = ResponseCache(
+    MemoryBackend(
+        settings.response_cache_ttl, settings.response_cache_max_entries
+    ) if settings.response_cache_max_entries else None
+)
+
+
+def cached(kind: str, schema=None, params=None):
+    """
+    Caches what a read classmethod returns for its user and arguments,
+    params adds request state the arguments don't carry (the page asked
+    for). Failures aren't cached.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        async def wrapper(cls, *args, **kwargs):
+            bound = signature.bind(cls, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments["cls"]
+            user = arguments.pop("user")
+            parts = (cls.__name__, kind, sorted(arguments.items()))
+            if params:
+                parts += (params(),)
+            return await response_cache.get_or_load(
+                user.id, parts, lambda: method(cls, *args, **kwargs), schema
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,38 @@
+from sqlalchemy import func, or_
+
+# Backed by the pg_trgm GIN indexes on title and description, see
+# alembic/versions/V20261018__2_add_search_indexes.py. Patterns shorter than
+# three characters have no trigrams and fall back to filtering the user's rows.
+
+
+def escape_like(value: str) -> str:
+    # Backslash is the default LIKE escape character in postgres
+    return (
+        value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+
+
+def search_filter(model, search_param: str):
+    pattern = f"%{escape_like(search_param)}%"
+    return or_(
+        model.title.ilike(pattern),
+        model.description.ilike(pattern),
+        # Fuzzy match on whole words of the title, catches typos
+        model.title.op("%>")(search_param),
+    )
+
+
+def search_rank(model, search_param: str):
+    return func.greatest(
+        func.word_similarity(search_param, model.title),
+        func.word_similarity(search_param, model.description),
+    )
+
+
+def apply_search(q, model, search_param: str, ranked: bool = True):
+    q = q.where(search_filter(model, search_param))
+    if ranked:
+        q = q.order_by(None).order_by(
+            search_rank(model, search_param).desc(), model.id.desc()
+        )
+    return q
@@ -0,0 +1,173 @@
+import codecs
+import csv
+import hashlib
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import AsyncIterator
+
+from fastapi import UploadFile
+
+READ_SIZE = 64 * 1024
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    ofx = "ofx"
+
+
+def guess_format(filename: str | None) -> ImportFormat:
+    if filename and filename.lower().endswith((".ofx", ".qfx")):
+        return ImportFormat.ofx
+    return ImportFormat.csv
+
+
+async def read_text(file: UploadFile) -> AsyncIterator[str]:
+    # OFX 1.x files are often cp1252, a stray byte shouldn't fail the import
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while chunk := await file.read(READ_SIZE):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+async def csv_records(chunks: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    Yields (line, row) for every record after the header, the header names
+    lower cased. A quoted field may span lines, a record is complete once
+    its quotes are balanced.
+    """
+    header = None
+    pending, record, line, start = "", "", 0, 1
+    async for text in chunks:
+        pending += text
+        *lines, pending = pending.split("\n")
+        for physical in lines:
+            line += 1
+            record += physical + "\n"
+            if record.count('"') % 2:
+                continue
+            values = next(csv.reader([record]), [])
+            record, record_line, start = "", start, line + 1
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            yield record_line, dict(zip(header, values))
+    if (record + pending).strip() and header is not None:
+        values = next(csv.reader([record + pending]), [])
+        yield start, dict(zip(header, values))
+
+
+async def ofx_records(chunks: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    Yields (n, transaction) for every STMTTRN. Splitting on "<" reads both
+    the SGML flavour (OFX 1.x, no closing tags) and the XML one, no matter
+    how the file is broken into lines.
+    """
+    pending, currency, transaction, count = "", None, None, 0
+    async for text in chunks:
+        pending += text
+        *tokens, pending = pending.split("<")
+        for token in tokens:
+            tag, _, value = token.partition(">")
+            tag, value = tag.strip().upper(), value.strip()
+            if tag == "CURDEF":
+                currency = value
+            elif tag == "STMTTRN":
+                transaction = {}
+            elif tag == "/STMTTRN" and transaction is not None:
+                count += 1
+                yield count, dict(transaction, CURDEF=currency)
+                transaction = None
+            elif transaction is not None and not tag.startswith("/"):
+                transaction[tag] = value
+
+
+def _parse_date(value: str | None):
+    # Leave anything odd to the schema validation so it's reported per row
+    if not value:
+        return None
+    if len(value) == 10:
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            return value
+        return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return value
+
+
+def _parse_ofx_date(value: str | None):
+    # 20240308120000.000[-5:EST], the time and zone are optional
+    try:
+        return datetime.strptime(value[:8], "%Y%m%d").replace(
+            tzinfo=timezone.utc
+        )
+    except (TypeError, ValueError):
+        return value
+
+
+def from_csv(row: dict) -> dict:
+    """
+    Columns: title, amount and optionally description, currency_code, date
+    and reference (a bank transaction id, used for duplicate detection)
+    """
+    return {
+        "title": row.get("title"),
+        "description": row.get("description") or None,
+        "amount": row.get("amount"),
+        "currency_code": row.get("currency_code") or "USD",
+        "attachment": None,
+        "created": _parse_date(row.get("date")),
+        "reference": row.get("reference") or None,
+    }
+
+
+def from_ofx(transaction: dict) -> dict | None:
+    """
+    Debits become expenses, credits are not expenses and give None
+    """
+    try:
+        amount = float(transaction.get("TRNAMT", ""))
+    except ValueError:
+        amount = transaction.get("TRNAMT")
+    else:
+        if amount >= 0:
+            return None
+        amount = -amount
+    return {
+        "title": transaction.get("NAME") or transaction.get("MEMO"),
+        "description": transaction.get("MEMO") or None,
+        "amount": amount,
+        "currency_code": transaction.get("CURDEF") or "USD",
+        "attachment": None,
+        "created": _parse_ofx_date(transaction.get("DTPOSTED")),
+        "reference": transaction.get("FITID") or None,
+    }
+
+
+async def statement_rows(
+    file: UploadFile, import_format: ImportFormat
+) -> AsyncIterator[tuple]:
+    """
+    (row, data) pairs ready for schemas.Expense, data is None for rows
+    that aren't expenses
+    """
+    if import_format == ImportFormat.ofx:
+        async for row, transaction in ofx_records(read_text(file)):
+            yield row, from_ofx(transaction)
+    else:
+        async for row, record in csv_records(read_text(file)):
+            yield row, from_csv(record)
+
+
+def fingerprint(reference: str | None, expense) -> str:
+    """
+    The bank's transaction id when there is one, the day, amount and text
+    otherwise. Repeats within one file are told apart by the merge.
+    """
+    if reference is None:
+        day = expense.created.date().isoformat() if expense.created else ""
+        reference = "|".join((
+            day, str(expense.amount), expense.title, expense.description or ""
+        ))
+    return hashlib.sha1(reference.encode()).hexdigest()
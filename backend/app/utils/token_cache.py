@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    LRU of access token -> user snapshot, at most max_entries of them, each
+    kept ttl seconds or until the token expires if that's sooner. Changing
+    a user bumps their generation, which drops every snapshot of them. The
+    generation is taken before the user is read, so a snapshot read while
+    the user was being changed is never served. Per process, a logout or
+    deactivation reaches the other workers only once their ttl runs out.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: dict = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def generation(self, user_id) -> int:
+        return self._generations.get(user_id, (0, 0.0))[0]
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is not None:
+            expires_at, user_id, generation, snapshot = entry
+            if (
+                expires_at > time.monotonic()
+                and generation == self.generation(user_id)
+            ):
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return snapshot
+            del self._entries[token]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, user_id, generation: int, snapshot,
+            expires_in: float | None = None):
+        ttl = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        if ttl <= 0:
+            return
+        self._entries[token] = (
+            time.monotonic() + ttl, user_id, generation, snapshot
+        )
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        self._entries.pop(token, None)
+
+    def drop_user(self, user_id):
+        now = time.monotonic()
+        if len(self._generations) > self.max_entries:
+            # Snapshots taken before a bump older than the ttl have expired,
+            # forgetting the bump can't bring them back
+            self._generations = {
+                k: v for k, v in self._generations.items()
+                if now - v[1] < self.ttl
+            }
+        generation = self.generation(user_id)
+        self._generations[user_id] = (generation + 1, now)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
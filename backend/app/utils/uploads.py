@@ -0,0 +1,228 @@
+from typing import Awaitable, Callable
+
+from app import settings
+from app.utils.app_exceptions import AppException
+from app.utils.aws import StreamingUpload
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from multipart.multipart import MultipartParser, parse_options_header
+from pydantic import BaseModel, ValidationError
+
+# What the first bytes of an attachment must be for the type it's sent as
+SIGNATURES = {
+    "application/pdf": (b"%PDF-",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/webp": (b"RIFF",),
+}
+SIGNATURE_SIZE = 8
+# Room for the text fields and the multipart framing around the attachment
+MAX_FIELDS_BYTES = 64 * 1024
+
+
+class FormStream:
+    """
+    Reads a multipart body as it arrives. Text fields are kept, the file
+    field goes straight into a StreamingUpload, nothing is spooled to disk.
+    The size and type limits are checked as early as the body allows: the
+    declared length before anything is read, the declared type once the
+    file's headers are in, its first bytes before they're sent on.
+    """
+    def __init__(self, request: Request, file_field: str,
+                 key: Callable[[str], str],
+                 accept_file: Callable[[], Awaitable[bool]] | None):
+        self.request = request
+        self.file_field = file_field
+        self.key = key
+        self.accept_file = accept_file
+        self.fields: dict[str, bytearray] = {}
+        self.fields_size = 0
+        self.upload: StreamingUpload | None = None
+        self.messages = []
+        self.header_field = b""
+        self.header_value = b""
+        self.headers: dict[bytes, bytes] = {}
+        # Where the data of the current part goes: a field name, the upload
+        # or None to drop it
+        self.target = None
+        self.head = bytearray()
+
+    def _callbacks(self):
+        def message(kind):
+            def callback(data=None, start=None, end=None):
+                self.messages.append(
+                    (kind, data[start:end] if data is not None else b"")
+                )
+            return callback
+        return {
+            name: message(name) for name in (
+                "on_part_begin", "on_part_data", "on_part_end",
+                "on_header_field", "on_header_value", "on_header_end",
+                "on_headers_finished",
+            )
+        }
+
+    async def read(self):
+        content_type, options = parse_options_header(
+            self.request.headers.get("content-type", "")
+        )
+        if (
+            content_type != b"multipart/form-data"
+            or b"boundary" not in options
+        ):
+            raise RequestValidationError([{
+                "type": "multipart", "loc": ("body",),
+                "msg": "Expected a multipart/form-data body", "input": None,
+            }])
+        length = self.request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > (
+            settings.attachment_max_bytes + MAX_FIELDS_BYTES
+        ):
+            raise AppException.AttachmentTooLarge(
+                {"max_bytes": settings.attachment_max_bytes}
+            )
+        parser = MultipartParser(options[b"boundary"], self._callbacks())
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                await self._process()
+            parser.finalize()
+            await self._process()
+        except BaseException:
+            if self.upload is not None:
+                await self.upload.abort()
+            raise
+
+    async def _process(self):
+        messages, self.messages = self.messages, []
+        for kind, data in messages:
+            if kind == "on_part_begin":
+                self.headers = {}
+                self.target = None
+            elif kind == "on_header_field":
+                self.header_field += data
+            elif kind == "on_header_value":
+                self.header_value += data
+            elif kind == "on_header_end":
+                self.headers[self.header_field.lower()] = self.header_value
+                self.header_field = self.header_value = b""
+            elif kind == "on_headers_finished":
+                await self._begin_part()
+            elif kind == "on_part_data":
+                await self._part_data(data)
+            elif kind == "on_part_end" and isinstance(
+                self.target, StreamingUpload
+            ):
+                # Shorter than a signature, never checked while it arrived
+                if len(self.head) < SIGNATURE_SIZE:
+                    self._check_signature()
+
+    async def _begin_part(self):
+        _, options = parse_options_header(
+            self.headers.get(b"content-disposition", b"")
+        )
+        name = options.get(b"name", b"").decode()
+        filename = options.get(b"filename", b"").decode()
+        if name != self.file_field:
+            self.fields[name] = bytearray()
+            self.target = name
+            return
+        # A form sent without a file still has the part, with no filename
+        if not filename or self.upload is not None or (
+            self.accept_file is not None and not await self.accept_file()
+        ):
+            return
+        content_type = self.headers.get(
+            b"content-type", b"application/octet-stream"
+        ).decode()
+        if content_type not in settings.attachment_types:
+            raise AppException.AttachmentType({
+                "content_type": content_type,
+                "allowed": settings.attachment_types,
+            })
+        self.upload = StreamingUpload(
+            self.key(filename), content_type, settings.upload_part_size,
+            settings.upload_part_concurrency,
+        )
+        self.target = self.upload
+
+    async def _part_data(self, data: bytes):
+        if self.target is None:
+            return
+        if isinstance(self.target, str):
+            self.fields_size += len(data)
+            if self.fields_size > MAX_FIELDS_BYTES:
+                raise AppException.AttachmentTooLarge(
+                    {"max_fields_bytes": MAX_FIELDS_BYTES}
+                )
+            self.fields[self.target] += data
+            return
+        if len(self.head) < SIGNATURE_SIZE:
+            self.head += data[:SIGNATURE_SIZE - len(self.head)]
+            if len(self.head) == SIGNATURE_SIZE:
+                self._check_signature()
+        if self.upload.size + len(data) > settings.attachment_max_bytes:
+            raise AppException.AttachmentTooLarge(
+                {"max_bytes": settings.attachment_max_bytes}
+            )
+        await self.upload.write(data)
+
+    def _check_signature(self):
+        signatures = SIGNATURES.get(self.upload.content_type)
+        if signatures and not bytes(self.head).startswith(signatures):
+            raise AppException.AttachmentType({
+                "content_type": self.upload.content_type,
+                "allowed": settings.attachment_types,
+            })
+
+
+async def read_form(
+    request: Request,
+    schema: type[BaseModel],
+    key: Callable[[str], str],
+    file_field: str = "attachment",
+    accept_file: Callable[[], Awaitable[bool]] | None = None,
+    finish: Callable[[StreamingUpload], Awaitable[str]] | None = None,
+) -> tuple[BaseModel, str | None]:
+    """
+    Validates the text fields of a multipart body against schema while its
+    file_field streams to S3 under key(filename), returns them with the
+    attachment's key. The upload is only completed once the fields are
+    valid, by finish when given, accept_file returning False skips the
+    file.
+    """
+    content_type, _ = parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    if content_type == b"application/x-www-form-urlencoded":
+        # Can't carry a file, Starlette's parser will do
+        fields, upload = dict(await request.form()), None
+    else:
+        form = FormStream(request, file_field, key, accept_file)
+        await form.read()
+        fields = {
+            name: value.decode(errors="replace")
+            for name, value in form.fields.items()
+        }
+        upload = form.upload
+    try:
+        data = schema.model_validate(fields)
+    except ValidationError as e:
+        if upload is not None:
+            await upload.abort()
+        raise RequestValidationError(e.errors())
+    if upload is None:
+        return data, None
+    return data, await (finish or StreamingUpload.complete)(upload)
+
+
+def form_body(schema: type[BaseModel], file_field: str = "attachment"):
+    """
+    openapi_extra of an endpoint reading its body with read_form, FastAPI
+    can't see the form it doesn't parse
+    """
+    body = schema.model_json_schema()
+    body["properties"][file_field] = {"type": "string", "format": "binary"}
+    return {"requestBody": {"content": {
+        "multipart/form-data": {"schema": body},
+    }, "required": True}}
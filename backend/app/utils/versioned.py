@@ -0,0 +1,35 @@
+from app.utils.app_exceptions import AppException, AppExceptionCase
+from sqlalchemy import Subquery, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def current_row(model, id: int, user_id, version: int | None,
+                *columns) -> Subquery:
+    """
+    The row as it was before the UPDATE/DELETE it's joined into, so the
+    statement can return old values next to the new ones. FOR UPDATE takes
+    the row lock the write takes anyway, only earlier, so the old values
+    are the ones being overwritten even when two writes race.
+    """
+    q = select(model.id, *columns).where(
+        model.id == id, model.user_id == user_id
+    )
+    if version is not None:
+        q = q.where(model.version == version)
+    return q.with_for_update().subquery("current")
+
+
+async def not_written(
+    db: AsyncSession, model, id: int, user_id, version: int | None,
+    context: dict,
+) -> AppExceptionCase:
+    """
+    Why a versioned write matched no row, only asked once it didn't
+    """
+    if version is not None:
+        current = await db.scalar(select(model.version).where(
+            model.id == id, model.user_id == user_id
+        ))
+        if current is not None:
+            return AppException.StaleObject(dict(context, version=current))
+    return AppException.GetObject(context)
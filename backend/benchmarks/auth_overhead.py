@@ -0,0 +1,100 @@
+# Times resolving the user of a bearer token, what current_active_user
+# does on every request: DatabaseStrategy with the user's oauth_accounts
+# joined (as before), DatabaseStrategy alone, and CachedDatabaseStrategy.
+# Needs a migrated database, run from the backend folder:
+# PYTHONPATH=. python benchmarks/auth_overhead.py [requests]
+import asyncio
+import secrets
+import sys
+import time
+import uuid
+
+from app.config.database import async_session, engine
+from app.config.users import (CachedDatabaseStrategy, UserManager,
+                              token_cache)
+from app.models import *  # noqa
+from app.models.user_model import (AccessToken, OAuthAccount, User,
+                                   UserDatabase)
+from fastapi_users.authentication.strategy import DatabaseStrategy
+from fastapi_users_db_sqlalchemy.access_token import \
+    SQLAlchemyAccessTokenDatabase
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import joinedload
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+LIFETIME = 60 * 60 * 24 * 30
+
+statements = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def count(*args):
+    global statements
+    statements += 1
+
+
+class JoinedUserDatabase(UserDatabase):
+    async def get(self, id):
+        return await self._get_user(
+            select(User).where(User.id == id)
+            .options(joinedload(User.oauth_accounts))
+        )
+
+
+async def measure(name, strategy_class, user_db_class, token):
+    global statements
+    statements = 0
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        # A session per request, like the request scoped one
+        async with async_session() as session:
+            strategy = strategy_class(
+                SQLAlchemyAccessTokenDatabase(session, AccessToken),
+                lifetime_seconds=LIFETIME,
+            )
+            manager = UserManager(user_db_class(session, User, OAuthAccount))
+            assert await strategy.read_token(token, manager) is not None
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name}: {statements / REQUESTS:.2f} statements,"
+        f" {elapsed / REQUESTS * 1000:.3f} ms per request"
+    )
+
+
+async def main():
+    user_id, token = uuid.uuid4(), secrets.token_urlsafe()
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, '', true, false, true)"
+            ),
+            {"id": user_id, "email": f"{user_id.hex}@bench.local"},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO accesstoken (token, user_id, created_at)"
+                " VALUES (:token, :id, now())"
+            ),
+            {"token": token, "id": user_id},
+        )
+
+    try:
+        await measure(
+            "joined oauth_accounts", DatabaseStrategy, JoinedUserDatabase,
+            token,
+        )
+        await measure("user only", DatabaseStrategy, UserDatabase, token)
+        await measure(
+            "cached", CachedDatabaseStrategy, UserDatabase, token
+        )
+        print(token_cache.stats())
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM \"user\" WHERE id = :id"), {"id": user_id}
+            )
+        await engine.dispose()
+
+asyncio.run(main())
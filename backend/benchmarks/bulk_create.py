@@ -0,0 +1,85 @@
+# Times creating expenses and their log rows the way the frontend does it, an
+# Expense.create and an ExpenseLog.create per item, against Expense.create_bulk.
+# Needs a migrated database, run from the backend folder:
+# PYTHONPATH=. python benchmarks/bulk_create.py [items]
+import asyncio
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+from app import schemas, settings
+from app.config.database import engine
+from app.models import *  # noqa
+from app.models.expense_log_model import ExpenseLog
+from app.models.expense_model import Expense
+from sqlalchemy import text
+
+ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+def items(prefix: str) -> list[dict]:
+    return [
+        {"title": f"{prefix} {i}", "description": "bench", "amount": i % 100}
+        for i in range(ITEMS)
+    ]
+
+
+async def single(user):
+    for item in items("single"):
+        result = await Expense.create(
+            user, item["title"], item["description"], item["amount"], None
+        )
+        expense = result.value
+        await ExpenseLog.create(schemas.ExpenseLog(
+            title=expense.title, description=expense.description,
+            amount=expense.amount, currency_code=expense.currency_code,
+            user_id=user.id, expense_id=expense.id,
+        ))
+
+
+async def bulk(user):
+    batch = items("bulk")
+    for start in range(0, ITEMS, settings.bulk_max_items):
+        result = await Expense.create_bulk(
+            user, batch[start:start + settings.bulk_max_items]
+        )
+        assert result.value["created"] == len(
+            batch[start:start + settings.bulk_max_items]
+        )
+
+
+async def main():
+    user = SimpleNamespace(id=uuid.uuid4())
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, '', true, false, true)"
+            ),
+            {"id": user.id, "email": f"{user.id.hex}@bench.local"},
+        )
+
+    try:
+        timings = {}
+        for name, run in (("single", single), ("bulk", bulk)):
+            started = time.perf_counter()
+            await run(user)
+            timings[name] = time.perf_counter() - started
+            print(
+                f"{name}: {ITEMS} items in {timings[name]:.2f}s,"
+                f" {ITEMS / timings[name]:.0f} items/s"
+            )
+        print(f"bulk is {timings['single'] / timings['bulk']:.1f}x faster")
+    finally:
+        async with engine.begin() as conn:
+            for table in ("expenses", "ledger_counters", "\"user\""):
+                column = "id" if table == "\"user\"" else "user_id"
+                await conn.execute(
+                    text(f"DELETE FROM {table} WHERE {column} = :user_id"),
+                    {"user_id": user.id},
+                )
+        await engine.dispose()
+
+asyncio.run(main())
@@ -0,0 +1,116 @@
+# Latency of an endpoint that has nothing to do with passwords while logins
+# hammer the same event loop, with bcrypt on the loop (workers=0) and on
+# password_pool. A minimal app with the bearer login route and a probe
+# route, driven in process through httpx. Needs a migrated database, run
+# from the backend folder:
+# PYTHONPATH=. python benchmarks/login_storm.py [seconds] [concurrent logins]
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+from app import settings
+from app.config import users
+from app.config.database import engine
+from app.models import *  # noqa
+from app.utils.db_session_middleware import DBSessionMiddleware
+from app.utils.password_pool import PasswordHashPool
+from fastapi import FastAPI
+from sqlalchemy import text
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+LOGINS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+PASSWORD = "bench-password"
+
+app = FastAPI()
+app.add_middleware(DBSessionMiddleware)
+app.include_router(
+    users.fastapi_users.get_auth_router(users.bearer_auth_backend),
+    prefix="/auth/bearer",
+)
+
+
+@app.get("/probe")
+async def probe():
+    return {"ok": True}
+
+
+async def storm(client, email, deadline):
+    while time.perf_counter() < deadline:
+        r = await client.post(
+            "/auth/bearer/login",
+            data={"username": email, "password": PASSWORD},
+        )
+        assert r.status_code == 200, r.text
+
+
+async def probes(client, deadline) -> list[float]:
+    # One every 10 ms, timed from when it was due rather than from when the
+    # loop got round to sending it, a stalled loop shows up as latency
+    latencies = []
+    due = time.perf_counter()
+    while due < deadline:
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        r = await client.get("/probe")
+        assert r.status_code == 200
+        latencies.append((time.perf_counter() - due) * 1000)
+        due += 0.01
+    return latencies
+
+
+def percentile(values, p) -> float:
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+async def run(name, pool, client, email, logins):
+    users.password_pool = pool
+    deadline = time.perf_counter() + SECONDS
+    tasks = [storm(client, email, deadline) for _ in range(logins)]
+    latencies, *_ = await asyncio.gather(probes(client, deadline), *tasks)
+    print(
+        f"{name}: probe p50 {percentile(latencies, 50):.1f} ms,"
+        f" p99 {percentile(latencies, 99):.1f} ms,"
+        f" max {max(latencies):.1f} ms, {len(latencies)} probes,"
+        f" {pool.snapshot()}"
+    )
+
+
+async def main():
+    helper = users.password_pool.helper
+    email = f"{uuid.uuid4().hex}@bench.local"
+    hashed = helper.hash(PASSWORD)
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, :hashed, true, false, true)"
+            ),
+            {"id": uuid.uuid4(), "email": email, "hashed": hashed},
+        )
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            await run("no logins", PasswordHashPool(helper, 0), client,
+                      email, 0)
+            await run("logins on the event loop",
+                      PasswordHashPool(helper, 0), client, email, LOGINS)
+            await run(
+                f"logins on {settings.password_hash_workers} workers",
+                PasswordHashPool(helper, settings.password_hash_workers),
+                client, email, LOGINS,
+            )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM \"user\" WHERE email = :email"),
+                {"email": email},
+            )
+        await engine.dispose()
+
+asyncio.run(main())
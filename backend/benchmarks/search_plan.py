@@ -0,0 +1,86 @@
+# Seeds a throwaway user with 1M expenses, runs the list search query under
+# EXPLAIN ANALYZE and checks the planner picks the trigram indexes.
+# Needs a migrated database, run from the backend folder:
+# python benchmarks/search_plan.py [rows]
+import asyncio
+import json
+import sys
+import uuid
+
+from app.config.database import engine
+from app.models import *  # noqa
+from app.models.expense_model import Expense
+from app.utils.search import apply_search
+from sqlalchemy import select, text
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+SEARCH = "cofee"
+
+
+def find_nodes(plan: dict, found: list) -> list:
+    found.append((plan["Node Type"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        find_nodes(child, found)
+    return found
+
+
+async def main():
+    user_id = uuid.uuid4()
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, '', true, false, true)"
+            ),
+            {"id": user_id, "email": f"{user_id.hex}@bench.local"},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO expenses"
+                " (title, description, amount, currency_code, user_id)"
+                " SELECT md5(i::text) || CASE WHEN i % 1000 = 0"
+                " THEN ' coffee' ELSE '' END, md5(random()::text),"
+                " i % 100, 'USD', :user_id"
+                " FROM generate_series(1, :rows) AS i"
+            ),
+            {"user_id": user_id, "rows": ROWS},
+        )
+        await conn.execute(text("ANALYZE expenses"))
+
+    try:
+        q = apply_search(
+            select(Expense).where(Expense.user_id == user_id),
+            Expense,
+            SEARCH,
+        ).limit(5)
+        sql = q.compile(
+            dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"
+            )
+            plan = json.loads(result.scalar())[0]
+        nodes = find_nodes(plan["Plan"], [])
+        print(f"rows={ROWS} execution={plan['Execution Time']:.1f}ms")
+        for node_type, index_name in nodes:
+            print(f"  {node_type} {index_name or ''}")
+        if not any(
+            index_name and index_name.endswith("_trgm")
+            for _, index_name in nodes
+        ):
+            sys.exit("Search query does not use the trigram indexes")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM expenses WHERE user_id = :user_id"),
+                {"user_id": user_id},
+            )
+            await conn.execute(
+                text("DELETE FROM \"user\" WHERE id = :user_id"),
+                {"user_id": user_id},
+            )
+        await engine.dispose()
+
+asyncio.run(main())
@@ -0,0 +1,103 @@
+# Times one page of expenses from query to response body, the ORM path
+# (select the model, validate through response_model=list[ExpenseRead],
+# stdlib json) against the rows path (select the ExpenseRead columns, dicts
+# straight to FastJSONResponse), at page sizes 5, 100 and 1000.
+# Needs a migrated database, run from the backend folder:
+# PYTHONPATH=. python benchmarks/serialization.py [repeats]
+import asyncio
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+from app import schemas
+from app.config.database import engine
+from app.models import *  # noqa
+from app.models.expense_model import Expense
+from app.utils.fast_json import FastJSONResponse, row_dicts, schema_columns
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import desc, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+SIZES = (5, 100, 1000)
+
+response_field = create_response_field(
+    name="Response", type_=list[schemas.ExpenseRead], mode="serialization"
+)
+
+
+async def orm_page(db, user, size) -> bytes:
+    q = select(Expense).where(Expense.user_id == user.id).order_by(
+        desc(Expense.id)
+    ).limit(size)
+    items = list(await db.scalars(q))
+    content = await serialize_response(
+        field=response_field, response_content=items
+    )
+    return JSONResponse(content).body
+
+
+async def rows_page(db, user, size) -> bytes:
+    q = select(*schema_columns(Expense, schemas.ExpenseRead)).where(
+        Expense.user_id == user.id
+    ).order_by(desc(Expense.id)).limit(size)
+    return FastJSONResponse(row_dicts(await db.execute(q))).body
+
+
+async def measure(run, user, size) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        # A session per page like a request, so the ORM path pays for
+        # hydrating the identity map every time
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn) as db:
+                await run(db, user, size)
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+async def main():
+    user = SimpleNamespace(id=uuid.uuid4())
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, '', true, false, true)"
+            ),
+            {"id": user.id, "email": f"{user.id.hex}@bench.local"},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO expenses (title, description, amount,"
+                " currency_code, user_id) SELECT 'bench ' || n, 'row ' || n,"
+                " n % 100, 'USD', :id FROM generate_series(1, :rows) n"
+            ),
+            {"id": user.id, "rows": max(SIZES)},
+        )
+
+    try:
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn) as db:
+                assert await orm_page(db, user, 5) == \
+                    await rows_page(db, user, 5), "bodies differ"
+        for size in SIZES:
+            orm = await measure(orm_page, user, size)
+            rows = await measure(rows_page, user, size)
+            print(
+                f"page of {size}: orm {orm:.2f} ms, rows {rows:.2f} ms,"
+                f" {orm / rows:.1f}x"
+            )
+    finally:
+        async with engine.begin() as conn:
+            for table in ("expenses", "\"user\""):
+                column = "id" if table == "\"user\"" else "user_id"
+                await conn.execute(
+                    text(f"DELETE FROM {table} WHERE {column} = :user_id"),
+                    {"user_id": user.id},
+                )
+        await engine.dispose()
+
+asyncio.run(main())
@@ -0,0 +1,133 @@
+# Counts the statements sent to postgres, and times, an expense update and
+# delete the way they used to be written (SELECT, change the object, flush,
+# refresh) against the UPDATE/DELETE ... RETURNING ones in Expense.
+# Needs a migrated database, run from the backend folder:
+# PYTHONPATH=. python benchmarks/write_round_trips.py [items]
+import asyncio
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.config.database import engine, get_db_cm
+from app.models import *  # noqa
+from app.models.expense_model import Expense
+from app.models.ledger_counter_model import EXPENSE, LedgerCounter
+from app.models.ledger_rollup_model import LedgerMonthlyRollup
+from sqlalchemy import event, select, text
+
+ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+statements = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def count(*args):
+    global statements
+    statements += 1
+
+
+async def orm_update(user, expense_id, amount):
+    async with asynccontextmanager(get_db_cm)() as db:
+        q = select(Expense).where(
+            Expense.id == expense_id, Expense.user_id == user.id
+        )
+        expense = await db.scalar(q)
+        await LedgerCounter.apply(
+            db, user.id, EXPENSE, 0, amount - expense.amount
+        )
+        await LedgerMonthlyRollup.apply(
+            db, user.id, EXPENSE, expense.created, expense.currency_code,
+            0, amount - expense.amount,
+        )
+        expense.title = "orm"
+        expense.amount = amount
+        await db.flush()
+        await db.refresh(expense)
+
+
+async def orm_delete(user, expense_id):
+    async with asynccontextmanager(get_db_cm)() as db:
+        q = select(Expense).where(
+            Expense.id == expense_id, Expense.user_id == user.id
+        )
+        expense = await db.scalar(q)
+        await db.delete(expense)
+        await db.flush()
+        await LedgerCounter.apply(db, user.id, EXPENSE, -1, -expense.amount)
+        await LedgerMonthlyRollup.apply(
+            db, user.id, EXPENSE, expense.created, expense.currency_code,
+            -1, -expense.amount,
+        )
+
+
+async def returning_update(user, expense_id, amount):
+    await Expense.update(expense_id, user, "returning", None, amount, None)
+
+
+async def returning_delete(user, expense_id):
+    await Expense.delete(expense_id, user)
+
+
+async def create(user) -> list[int]:
+    ids = []
+    for i in range(ITEMS):
+        result = await Expense.create(user, f"bench {i}", None, 1, None)
+        ids.append(result.value.id)
+    return ids
+
+
+async def measure(name, run, ids, *args):
+    global statements
+    statements = 0
+    started = time.perf_counter()
+    for expense_id in ids:
+        await run(*args[:1], expense_id, *args[1:])
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name}: {statements / len(ids):.1f} statements per request,"
+        f" {len(ids) / elapsed:.0f} requests/s"
+    )
+
+
+async def main():
+    user = SimpleNamespace(id=uuid.uuid4())
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+                " is_superuser, is_verified) VALUES"
+                " (:id, :email, '', true, false, true)"
+            ),
+            {"id": user.id, "email": f"{user.id.hex}@bench.local"},
+        )
+
+    try:
+        orm_ids, returning_ids = await create(user), await create(user)
+        # Same amount, the counters aren't touched by the new update
+        await measure("orm update", orm_update, orm_ids, user, 1)
+        await measure(
+            "returning update", returning_update, returning_ids, user, 1
+        )
+        await measure("orm update, amount", orm_update, orm_ids, user, 2)
+        await measure(
+            "returning update, amount", returning_update, returning_ids,
+            user, 2,
+        )
+        await measure("orm delete", orm_delete, orm_ids, user)
+        await measure("returning delete", returning_delete, returning_ids, user)
+    finally:
+        async with engine.begin() as conn:
+            for table in (
+                "expenses", "ledger_counters", "ledger_monthly_rollup",
+                "\"user\"",
+            ):
+                column = "id" if table == "\"user\"" else "user_id"
+                await conn.execute(
+                    text(f"DELETE FROM {table} WHERE {column} = :user_id"),
+                    {"user_id": user.id},
+                )
+        await engine.dispose()
+
+asyncio.run(main())
@@ -4,3 +4,110 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # TODO unique
     app_name: str = "fullstack-remix"
+
+    # Database connection pool, every value can be overridden from the env
+    # i.e. DB_POOL_SIZE=20. Per worker, so the total connections hitting
+    # postgres are workers * (db_pool_size + db_max_overflow).
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    # Recycle before RDS/ELB idle timeouts kill the connection under us
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    # PgBouncer in transaction mode can't keep prepared statements between
+    # transactions, this turns off the asyncpg and SQLAlchemy statement caches
+    db_pgbouncer_transaction_mode: bool = False
+
+    # Read replicas, i.e. DB_REPLICA_ADDRESSES='["replica-1:5432"]'. Reads
+    # are routed there unless the user wrote within the stickiness window
+    # or the replica is down or lagging, then the primary serves them.
+    db_replica_addresses: list[str] = []
+    db_read_your_writes_seconds: float = 5
+    db_replica_max_lag_seconds: float = 10
+    db_replica_lag_check_interval: float = 5
+    db_replica_retry_after: float = 30
+
+    # Ledger exports are streamed, rows are pulled from a server side cursor
+    # export_batch_size at a time and flushed every export_chunk_rows
+    export_batch_size: int = 1000
+    export_chunk_rows: int = 500
+
+    # Upper bound for the items of one bulk create, all of them go in a
+    # single transaction
+    bulk_max_items: int = 500
+
+    # Statement imports are parsed as they're read and COPYed into a staging
+    # table import_batch_rows at a time
+    import_batch_rows: int = 5000
+
+    # Log entries shown as recent activity on the dashboard
+    dashboard_activity_limit: int = 10
+
+    # Latest logs embedded in an expense/invoice asked for with include=logs,
+    # older ones are paged through the log endpoints
+    detail_logs_limit: int = 10
+    max_detail_logs_limit: int = 100
+
+    # Per user cache of the expense/invoice reads, any write of the user
+    # drops theirs. In process, with more than one worker set a shared
+    # backend on response_cache.backend. 0 entries turns it off.
+    response_cache_max_entries: int = 10_000
+    response_cache_ttl: float = 60
+
+    # Access token -> user snapshots, an authenticated request with a known
+    # token skips the accesstoken and user queries. Per process, a logout
+    # reaches other workers after auth_cache_ttl. 0 entries turns it off.
+    auth_cache_max_entries: int = 10_000
+    auth_cache_ttl: float = 60
+
+    # bcrypt runs on password_hash_workers threads of its own, 0 runs it on
+    # the event loop. Hashes with fewer than password_bcrypt_rounds are
+    # redone with them on the next login.
+    password_hash_workers: int = 2
+    password_bcrypt_rounds: int = 12
+
+    # Verification and reset mail is queued in process and sent by one
+    # worker, up to email_batch_size of a template per call once the first
+    # has waited email_batch_wait seconds. A failed batch is retried after
+    # email_retry_base_delay, doubling, email_max_attempts times in all.
+    # email_transport "file" writes the mail to email_file_directory
+    # instead of sending it through Brevo.
+    email_transport: str = "brevo"
+    email_file_directory: str = "/tmp/emails"
+    email_queue_size: int = 1000
+    email_batch_size: int = 50
+    email_batch_wait: float = 0.5
+    email_max_attempts: int = 5
+    email_retry_base_delay: float = 2
+
+    # Attachments stream to S3 while the request arrives, in parts of
+    # upload_part_size (S3 wants 5 MiB at least) with upload_part_concurrency
+    # of them in flight per upload, reading the body waits beyond that.
+    # boto3 calls run on upload_workers threads. Bigger attachments or other
+    # types are refused before anything is stored.
+    attachment_max_bytes: int = 20 * 1024 * 1024
+    attachment_types: list[str] = [
+        "application/pdf", "image/jpeg", "image/png", "image/webp",
+    ]
+    upload_part_size: int = 5 * 1024 * 1024
+    upload_part_concurrency: int = 3
+    upload_workers: int = 8
+
+    # Attachments are private objects. The presigned POST a client uploads
+    # one with is good for attachment_upload_url_ttl seconds, the presigned
+    # GET it's read with for attachment_download_url_ttl.
+    attachment_upload_url_ttl: int = 900
+    attachment_download_url_ttl: int = 300
+
+    # Image and PDF attachments get a thumbnail no bigger than
+    # thumbnail_size pixels a side, in thumbnail_format (webp or jpeg) at
+    # thumbnail_quality. They're rendered after the upload commits, on
+    # preview_workers processes, at most preview_jobs at a time. 0 workers
+    # renders none.
+    preview_workers: int = 2
+    preview_jobs: int = 4
+    thumbnail_size: int = 320
+    thumbnail_format: str = "webp"
+    thumbnail_quality: int = 80
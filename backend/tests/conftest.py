@@ -0,0 +1,101 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+# app.config.database builds the engine URL at import time, the engine only
+# connects on first use so unit tests just need a parseable port
+os.environ.setdefault("DB_PORT", "5432")
+
+
+class MemoryS3:
+    """
+    The part of the S3 API the uploads use, objects kept in a dict, with
+    every call taking delay seconds
+    """
+    def __init__(self, delay=0.0, fail_part=None):
+        self.delay = delay
+        self.fail_part = fail_part
+        self.objects = {}
+        self.types = {}
+        self.uploads = {}
+        self.aborted = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        self.objects[Key] = Body
+        self.types[Key] = ContentType
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {
+            "ContentLength": len(self.objects[Key]),
+            "ContentType": self.types.get(Key),
+        }
+
+    def get_object(self, Bucket, Key, Range=None):
+        body = self.objects[Key]
+        if Range:
+            start, end = map(int, Range.removeprefix("bytes=").split("-"))
+            body = body[start:end + 1]
+        return {
+            "Body": io.BytesIO(body),
+            "ContentLength": len(body),
+            "ContentType": self.types.get(Key),
+        }
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self.objects[Key] = self.objects[CopySource["Key"]]
+        self.types[Key] = self.types.get(CopySource["Key"])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None,
+                                **kwargs):
+        self.types[Key] = ContentType
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if PartNumber == self.fail_part:
+                raise ConnectionError("part failed")
+            self.uploads[UploadId][PartNumber] = Body
+            return {"ETag": f"etag-{PartNumber}"}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId,
+                                  MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    from app.utils import aws
+
+    s3 = MemoryS3()
+    monkeypatch.setattr(aws, "s3", s3)
+    monkeypatch.setenv("STORAGE_BUCKET", "bucket")
+    monkeypatch.delenv("STORAGE_ENDPOINT_URL", raising=False)
+    return s3
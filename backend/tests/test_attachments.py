@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from app.utils import attachments, aws
+from app.utils.app_exceptions import AppException
+
+PDF = b"%PDF-1.7\n" + b"x" * 100
+USER = "4b0f5e3c-0000-0000-0000-000000000001"
+
+
+def test_upload_key():
+    key = attachments.upload_key(USER, "../../etc/my receipt?.pdf")
+    user, directory, name = key.split("/")
+    assert user == USER
+    assert len(directory) == 32
+    assert name == "my_receipt_.pdf"
+    assert attachments.upload_key(USER, "a.pdf") != (
+        attachments.upload_key(USER, "a.pdf")
+    )
+
+
+def signer(monkeypatch):
+    # Presigning is local, a client with made up credentials will do
+    monkeypatch.setattr(aws, "s3", boto3.client(
+        "s3", region_name="eu-central-1",
+        aws_access_key_id="key", aws_secret_access_key="secret",
+    ))
+    monkeypatch.setenv("STORAGE_BUCKET", "bucket")
+
+
+def test_upload_form(monkeypatch):
+    signer(monkeypatch)
+    result = attachments.upload_form(USER, "r.pdf", "application/pdf")
+    assert result.success
+    form = result.value
+    assert form["key"].startswith(f"{USER}/")
+    assert form["fields"]["key"] == form["key"]
+    assert form["fields"]["Content-Type"] == "application/pdf"
+    assert "policy" in form["fields"]
+
+    refused = attachments.upload_form(USER, "r.sh", "text/x-sh")
+    assert isinstance(refused.value, AppException.AttachmentType)
+
+
+def test_download_url(monkeypatch):
+    signer(monkeypatch)
+    result = attachments.download_url(USER, f"{USER}/abc/r.pdf")
+    url = urlparse(result.value["url"])
+    assert url.path.endswith(f"/{USER}/abc/r.pdf")
+    assert parse_qs(url.query)["X-Amz-Expires"] == [
+        str(result.value["expires_in"])
+    ]
+    for key in (None, "someone-else/abc/r.pdf"):
+        missing = attachments.download_url(USER, key)
+        assert isinstance(missing.value, AppException.GetObject)
+
+
+def test_check_upload(s3):
+    key = f"{USER}/abc/r.pdf"
+    s3.put_object("bucket", key, PDF, ContentType="application/pdf")
+    assert asyncio.run(attachments.check_upload(USER, key)).value == key
+
+    for other in ("someone-else/abc/r.pdf", f"{USER}/abc/missing.pdf"):
+        result = asyncio.run(attachments.check_upload(USER, other))
+        assert isinstance(result.value, AppException.GetObject)
+
+
+def test_check_upload_deletes_what_it_refuses(s3):
+    key = f"{USER}/abc/r.pdf"
+    s3.put_object("bucket", key, b"#!/bin/sh\n", ContentType="application/pdf")
+    result = asyncio.run(attachments.check_upload(USER, key))
+    assert isinstance(result.value, AppException.AttachmentType)
+    assert s3.objects == {}
+
+
+def test_digest(s3):
+    key = f"{USER}/abc/r.pdf"
+    s3.put_object("bucket", key, PDF, ContentType="application/pdf")
+    sha256, size, content_type = asyncio.run(attachments.digest(key))
+    assert sha256 == hashlib.sha256(PDF).hexdigest()
+    assert (size, content_type) == (len(PDF), "application/pdf")
+    assert attachments.content_key(USER, sha256) == f"{USER}/{sha256}"
@@ -0,0 +1,38 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app import schemas, settings
+from app.models.expense_model import Expense
+from app.utils.bulk import fill_ids, validate_items
+
+
+def test_invalid_items_are_reported_in_place():
+    results, valid = validate_items([
+        {"title": "a", "amount": 1},
+        {"title": "b"},
+        {"title": "c", "amount": "2.5", "currency_code": "EUR"},
+    ], schemas.BulkItem)
+    assert [item.title for item in valid] == ["a", "c"]
+    assert valid[0].currency_code == "USD"
+    assert results[1]["errors"][0]["loc"] == ("amount",)
+
+    response = fill_ids(results, [7, 8])
+    assert response["created"] == 2
+    assert [result.get("id") for result in response["items"]] == [7, None, 8]
+
+
+def test_too_many_items(monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_items", 2)
+    user = SimpleNamespace(id=uuid.uuid4())
+    items = [{"title": "a", "amount": 1}] * 3
+    result = asyncio.run(Expense.create_bulk(user, items))
+    assert not result.success
+    assert result.status_code == 413
+
+
+def test_nothing_valid_skips_the_database():
+    user = SimpleNamespace(id=uuid.uuid4())
+    result = asyncio.run(Expense.create_bulk(user, [{"title": "a"}]))
+    assert result.value["created"] == 0
+    assert "errors" in result.value["items"][0]
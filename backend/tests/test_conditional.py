@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from app.utils.conditional import (detail_validator, is_conditional, is_fresh,
+                                   list_etag, not_modified)
+from starlette.requests import Request
+
+CREATED = datetime(2026, 10, 18, 9, 30, 15, 250000, tzinfo=timezone.utc)
+USER = SimpleNamespace(id=uuid.uuid4())
+
+
+def request(query="", **headers):
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string":
+        query.encode(), "headers": [
+            (name.replace("_", "-").encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    })
+
+
+def item(version=1, updated=None):
+    return SimpleNamespace(
+        id=7, version=version, created=CREATED, updated=updated
+    )
+
+
+def test_detail_tag_follows_the_version():
+    tag, modified = detail_validator(item())
+    assert tag.startswith('"') and modified == CREATED
+    assert detail_validator(item())[0] == tag
+    assert detail_validator(item(version=2, updated=CREATED))[0] != tag
+
+
+def test_detail_with_logs_has_no_last_modified():
+    tag, modified = detail_validator(item(), [(3, None), (2, None)])
+    assert modified is None
+    assert tag != detail_validator(item(), [(3, None)])[0]
+    assert tag != detail_validator(item())[0]
+    assert detail_validator(item(), [])[0] != detail_validator(item())[0]
+
+
+@pytest.mark.parametrize("if_none_match, fresh", [
+    ('"a"', True),
+    ('"b", "a"', True),
+    ('W/"a"', True),
+    ("*", True),
+    ('"b"', False),
+])
+def test_if_none_match(if_none_match, fresh):
+    assert is_fresh(request(if_none_match=if_none_match), '"a"') is fresh
+
+
+@pytest.mark.parametrize("since, fresh", [
+    ("Sun, 18 Oct 2026 09:30:15 GMT", True),
+    ("Sun, 18 Oct 2026 09:30:14 GMT", False),
+    ("not a date", False),
+])
+def test_if_modified_since(since, fresh):
+    assert is_fresh(request(if_modified_since=since), '"a"', CREATED) is fresh
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    r = request(
+        if_none_match='"b"', if_modified_since="Sun, 18 Oct 2026 10:00:00 GMT"
+    )
+    assert is_conditional(r)
+    assert not is_fresh(r, '"a"', CREATED)
+    assert not is_conditional(request())
+
+
+def test_list_tag_covers_state_and_query():
+    tag = list_etag(request("size=2&page=1"), USER, (3, 10, CREATED))
+    assert list_etag(request("page=1&size=2"), USER, (3, 10, CREATED)) == tag
+    assert list_etag(request("size=2&page=2"), USER, (3, 10, CREATED)) != tag
+    assert list_etag(request("size=2&page=1"), USER, (2, 10, CREATED)) != tag
+
+
+def test_not_modified_has_no_body():
+    response = not_modified('"a"', CREATED)
+    assert response.status_code == 304 and response.body == b""
+    assert response.headers["etag"] == '"a"'
+    assert response.headers["last-modified"] == "Sun, 18 Oct 2026 09:30:15 GMT"
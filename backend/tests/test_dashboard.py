@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app import schemas
+from app.services import dashboard_service
+from app.services.dashboard_service import DashboardService
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def one(self):
+        return self.row
+
+
+class FakeDB:
+    def __init__(self, row):
+        self.row = row
+        self.statements = []
+
+    async def execute(self, q):
+        self.statements.append(q)
+        return FakeResult(self.row)
+
+
+def run(monkeypatch, row):
+    db = FakeDB(row)
+
+    async def read_db(user_id):
+        yield db
+
+    monkeypatch.setattr(dashboard_service, "get_read_db_cm", read_db)
+    user = SimpleNamespace(
+        id=uuid.uuid4(), email="a@b.c", is_active=True, is_superuser=False,
+        is_verified=True, username="a",
+    )
+    return db, asyncio.run(DashboardService.get(user)).value
+
+
+def test_one_statement_for_the_whole_dashboard(monkeypatch):
+    row = SimpleNamespace(
+        latest_expense={
+            "id": 3, "title": "t", "description": None, "amount": 2.0,
+            "currency_code": "USD", "attachment": None,
+            "created": "2024-03-08T00:00:00+00:00", "version": 1,
+        },
+        latest_invoice=None,
+        counters=[{"kind": "expense", "row_count": 3, "amount_sum": 6.0}],
+        activity=[{
+            "kind": "expense", "parent_id": 3, "id": 9, "title": "t",
+            "amount": 2.0, "currency_code": "USD",
+            "created": "2024-03-08T00:00:00+00:00",
+        }],
+    )
+    db, dashboard = run(monkeypatch, row)
+    assert len(db.statements) == 1
+    dashboard = schemas.Dashboard.model_validate(dashboard)
+    assert dashboard.latest_expense.id == 3
+    assert dashboard.latest_invoice is None
+    assert dashboard.totals.expenses.count == 3
+    assert dashboard.totals.invoices.count == 0
+    assert dashboard.activity[0].parent_id == 3
+
+
+def test_new_user(monkeypatch):
+    row = SimpleNamespace(
+        latest_expense=None, latest_invoice=None, counters=None,
+        activity=None,
+    )
+    _, dashboard = run(monkeypatch, row)
+    dashboard = schemas.Dashboard.model_validate(dashboard)
+    assert dashboard.totals.expenses.amount == 0
+    assert dashboard.activity == []
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from app.config.database import InstrumentedAsyncAdaptedQueuePool, PoolStats
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.util import greenlet_spawn
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_wait_histogram_buckets():
+    stats = PoolStats()
+    for elapsed_ms in (0.2, 1, 1.5, 5000, 7000):
+        stats.record_wait(elapsed_ms)
+    snapshot = stats.snapshot()
+    # Bucket bounds are inclusive
+    assert snapshot["wait_histogram"]["le_1ms"] == 2
+    assert snapshot["wait_histogram"]["le_5ms"] == 1
+    assert snapshot["wait_histogram"]["le_5000ms"] == 1
+    assert snapshot["wait_histogram"]["inf"] == 1
+    assert snapshot["checkouts"] == 5
+    assert snapshot["wait_max_ms"] == 7000
+    assert snapshot["wait_avg_ms"] == pytest.approx(12002.7 / 5)
+
+
+def test_pool_counts_checkouts_and_timeouts():
+    stats = PoolStats()
+    pool_class = type(
+        "Pool", (InstrumentedAsyncAdaptedQueuePool,), {"stats": stats}
+    )
+    pool = pool_class(
+        creator=FakeConnection, pool_size=1, max_overflow=0, timeout=0.01
+    )
+
+    def exhaust():
+        connection = pool.connect()
+        with pytest.raises(PoolTimeoutError):
+            pool.connect()
+        connection.close()
+
+    asyncio.run(greenlet_spawn(exhaust))
+    snapshot = stats.snapshot()
+    assert snapshot["checkouts"] == 1
+    assert snapshot["timeouts"] == 1
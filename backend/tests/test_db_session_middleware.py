@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from app.config import database
+from app.utils.db_session_middleware import DBSessionMiddleware
+
+
+class FakeSession:
+    def __init__(self):
+        self.info = {}
+        self.writes = []
+        self.committed = []
+        self.closed = False
+
+    def in_transaction(self):
+        return bool(self.writes)
+
+    async def commit(self):
+        self.committed.extend(self.writes)
+        self.writes = []
+
+    async def close(self):
+        self.closed = True
+
+    def begin(self):
+        @asynccontextmanager
+        async def transaction():
+            yield
+            await self.commit()
+        return transaction()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    opened = []
+
+    def factory():
+        opened.append(FakeSession())
+        return opened[-1]
+
+    monkeypatch.setattr(database, "async_session", factory)
+    return opened
+
+
+async def auth_dependency():
+    # What fastapi-users does through get_db
+    async for session in database.get_db():
+        return session
+
+
+async def model_method(name):
+    async with asynccontextmanager(database.get_db_cm)() as session:
+        session.writes.append(name)
+        return session
+
+
+def make_app(status, after_response=None):
+    async def app(scope, receive, send):
+        auth_session = await auth_dependency()
+        model_session = await model_method("expense")
+        assert auth_session is model_session
+        await send({"type": "http.response.start", "status": status})
+        await send({"type": "http.response.body", "body": b""})
+        if after_response is not None:
+            await after_response()
+    return app
+
+
+def run(app):
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    asyncio.run(DBSessionMiddleware(app)({"type": "http"}, receive, send))
+
+
+def test_auth_and_models_share_one_session(sessions):
+    run(make_app(201))
+    assert len(sessions) == 1
+    assert sessions[0].committed == ["expense"]
+    assert sessions[0].closed
+
+
+def test_error_response_rolls_back(sessions):
+    run(make_app(422))
+    assert len(sessions) == 1
+    assert sessions[0].committed == []
+    assert sessions[0].closed
+
+
+def test_work_after_response_gets_its_own_session(sessions):
+    async def background_task():
+        await model_method("email_log")
+
+    run(make_app(200, after_response=background_task))
+    assert len(sessions) == 2
+    assert sessions[0].committed == ["expense"]
+    assert sessions[1].committed == ["email_log"]
+
+
+@pytest.mark.parametrize("status", [201, 422])
+def test_writes_drop_the_writers_cached_reads(sessions, monkeypatch, status):
+    # Committed or rolled back, reads cached in between are gone either way
+    dropped = []
+
+    async def invalidate(user_ids):
+        dropped.extend(user_ids)
+
+    monkeypatch.setattr(database.response_cache, "invalidate", invalidate)
+
+    async def app(scope, receive, send):
+        session = await model_method("expense")
+        database.mark_user_write(session, "writer")
+        await send({"type": "http.response.start", "status": status})
+        await send({"type": "http.response.body", "body": b""})
+
+    run(app)
+    assert dropped == ["writer"]
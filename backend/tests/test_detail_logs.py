@@ -0,0 +1,103 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app import schemas
+from app.models import expense_model
+from app.models.expense_model import Expense
+from pydantic import TypeAdapter
+from sqlalchemy.dialects import postgresql
+
+CREATED = datetime(2024, 3, 8, tzinfo=timezone.utc)
+DETAIL = TypeAdapter(schemas.ExpenseDetail | schemas.ExpenseRead)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, q):
+        self.statements.append(str(q.compile(dialect=postgresql.dialect())))
+        return FakeResult(self.rows)
+
+
+def expense(**kwargs):
+    return SimpleNamespace(
+        id=3, title="t", description=None, amount=2.0, currency_code="USD",
+        attachment=None, created=CREATED, updated=None, user_id=None,
+        version=1, **kwargs,
+    )
+
+
+def log(id):
+    return SimpleNamespace(
+        id=id, title="t", description=None, amount=2.0, currency_code="USD",
+        created=CREATED, updated=None, user_id=None, expense_id=3,
+    )
+
+
+def get_with_logs(monkeypatch, rows, limit=2):
+    db = FakeDB(rows)
+
+    async def read_db(user_id):
+        yield db
+
+    monkeypatch.setattr(expense_model, "get_read_db_cm", read_db)
+    user = SimpleNamespace(id=uuid.uuid4())
+    return db, asyncio.run(Expense.get_with_logs(3, user, limit))
+
+
+def test_item_and_latest_logs_in_one_statement(monkeypatch):
+    item = expense()
+    db, result = get_with_logs(
+        monkeypatch, [(item, log(9)), (item, log(8))]
+    )
+    assert len(db.statements) == 1
+    sql = db.statements[0]
+    assert "LEFT OUTER JOIN LATERAL" in sql
+    assert "LIMIT" in sql
+    assert [x.id for x in result.value.latest_logs] == [9, 8]
+
+
+def test_item_without_logs(monkeypatch):
+    _, result = get_with_logs(monkeypatch, [(expense(), None)])
+    assert result.value.latest_logs == []
+
+
+def test_missing_item(monkeypatch):
+    _, result = get_with_logs(monkeypatch, [])
+    assert not result.success
+
+
+def test_logs_only_in_the_response_when_loaded():
+    touched = []
+
+    class Unloaded(SimpleNamespace):
+        # Stands in for the lazy relationship, loading it outside of an
+        # await would fail
+        @property
+        def logs(self):
+            touched.append(True)
+            raise AttributeError("logs")
+
+    plain = DETAIL.validate_python(
+        Unloaded(**vars(expense())), from_attributes=True
+    )
+    assert type(plain) is schemas.ExpenseRead
+    assert not touched
+
+    detail = DETAIL.validate_python(
+        expense(latest_logs=[log(9)]), from_attributes=True
+    )
+    assert type(detail) is schemas.ExpenseDetail
+    assert detail.model_dump(mode="json")["logs"][0]["id"] == 9
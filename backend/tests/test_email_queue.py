@@ -0,0 +1,134 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.config import users
+from app.services.email_service import (RESET_PASSWORD_TEMPLATE,
+                                        VERIFY_EMAIL_TEMPLATE, EmailJob,
+                                        EmailQueue, EmailTransport,
+                                        FileTransport)
+
+
+def make_queue(transport, **options):
+    return EmailQueue(transport, **{
+        "maxsize": 100, "batch_size": 10, "batch_wait": 0.05,
+        "max_attempts": 3, "retry_base_delay": 0, **options,
+    })
+
+
+def job(n, template_id=VERIFY_EMAIL_TEMPLATE):
+    return EmailJob(
+        to=f"user{n}@example.com", template_id=template_id,
+        subject="Subject", params={"token": f"token{n}"},
+    )
+
+
+class RecordingTransport(EmailTransport):
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def send(self, jobs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("brevo is down")
+        self.batches.append([job.to for job in jobs])
+
+
+def test_batches_per_template(tmp_path):
+    queue = make_queue(FileTransport(str(tmp_path)))
+
+    async def run():
+        for n in range(3):
+            await queue.enqueue(job(n))
+        for n in range(3, 5):
+            await queue.enqueue(job(n, RESET_PASSWORD_TEMPLATE))
+        await queue.stop()
+
+    asyncio.run(run())
+    verify = (tmp_path / f"template_{VERIFY_EMAIL_TEMPLATE}.jsonl")
+    reset = (tmp_path / f"template_{RESET_PASSWORD_TEMPLATE}.jsonl")
+    assert [
+        json.loads(line)["to"] for line in verify.read_text().splitlines()
+    ] == ["user0@example.com", "user1@example.com", "user2@example.com"]
+    assert len(reset.read_text().splitlines()) == 2
+    assert queue.snapshot()["batches"] == 2
+    assert queue.snapshot()["sent"] == 5
+
+
+def test_batch_size_splits_batches():
+    transport = RecordingTransport()
+    queue = make_queue(transport, batch_size=2)
+
+    async def run():
+        for n in range(5):
+            await queue.enqueue(job(n))
+        await queue.stop()
+
+    asyncio.run(run())
+    assert [len(batch) for batch in transport.batches] == [2, 2, 1]
+
+
+def test_failed_batch_is_retried():
+    transport = RecordingTransport(failures=2)
+    queue = make_queue(transport)
+
+    async def run():
+        await queue.enqueue(job(0))
+        await queue.enqueue(job(1))
+        await queue.stop()
+
+    asyncio.run(run())
+    assert transport.batches == [["user0@example.com", "user1@example.com"]]
+    snapshot = queue.snapshot()
+    assert snapshot["sent"] == 2
+    assert snapshot["retried"] == 4
+    assert snapshot["dropped"] == 0
+
+
+def test_job_dropped_after_max_attempts():
+    transport = RecordingTransport(failures=100)
+    queue = make_queue(transport, max_attempts=3)
+
+    async def run():
+        await queue.enqueue(job(0))
+        await queue.stop()
+
+    asyncio.run(run())
+    snapshot = queue.snapshot()
+    assert transport.batches == []
+    assert snapshot["batches"] == 3
+    assert snapshot["dropped"] == 1
+    assert snapshot["sent"] == 0
+
+
+class BlockedTransport(EmailTransport):
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.sent = []
+
+    async def send(self, jobs):
+        await self.release.wait()
+        self.sent.extend(jobs)
+
+
+def test_hooks_return_before_the_mail_is_sent(monkeypatch):
+    user = SimpleNamespace(id="id", email="user@example.com")
+
+    async def run():
+        transport = BlockedTransport()
+        queue = make_queue(transport, batch_wait=0)
+        monkeypatch.setattr(users, "email_queue", queue)
+        manager = users.UserManager(None)
+        await manager.on_after_forgot_password(user, "reset")
+        await manager.on_after_request_verify(user, "verify")
+        assert transport.sent == []
+        transport.release.set()
+        await queue.stop()
+        return transport.sent
+
+    sent = asyncio.run(run())
+    assert {(job.template_id, job.params["token"]) for job in sent} == {
+        (RESET_PASSWORD_TEMPLATE, "reset"),
+        (VERIFY_EMAIL_TEMPLATE, "verify"),
+    }
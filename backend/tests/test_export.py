@@ -0,0 +1,80 @@
+import asyncio
+import csv
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from app import schemas, settings
+from app.utils.export import csv_chunks, ndjson_chunks
+
+
+def expense(id, logs=()):
+    return SimpleNamespace(
+        id=id, title=f"t{id}", description=None, amount=float(id),
+        currency_code="USD", attachment=None, created=None, updated=None,
+        user_id=None, version=1, logs=list(logs),
+    )
+
+
+def log(id, expense_id):
+    return SimpleNamespace(
+        id=id, title="l", description="d", amount=1.0, currency_code="USD",
+        created=None, updated=None, user_id=None, expense_id=expense_id,
+    )
+
+
+async def rows(items):
+    for item in items:
+        yield item
+
+
+def collect(chunks):
+    async def run():
+        return [chunk async for chunk in chunks]
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def chunk_rows(monkeypatch):
+    monkeypatch.setattr(settings, "export_chunk_rows", 2)
+
+
+def test_ndjson_is_flushed_in_chunks(chunk_rows):
+    items = [expense(i) for i in range(5)]
+    chunks = collect(ndjson_chunks(rows(items), schemas.ExpenseRead))
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
+    lines = "".join(chunks).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [0, 1, 2, 3, 4]
+    assert "logs" not in json.loads(lines[0])
+
+
+def test_ndjson_nests_logs():
+    items = [expense(1, [log(10, 1), log(11, 1)]), expense(2)]
+    chunks = collect(ndjson_chunks(
+        rows(items), schemas.ExpenseRead, schemas.ExpenseLogRead
+    ))
+    first, second = map(json.loads, "".join(chunks).splitlines())
+    assert [item["id"] for item in first["logs"]] == [10, 11]
+    assert second["logs"] == []
+
+
+def test_csv_puts_logs_after_their_parent(chunk_rows):
+    items = [expense(1, [log(10, 1)]), expense(2), expense(3)]
+    chunks = collect(csv_chunks(
+        rows(items), schemas.ExpenseRead, schemas.ExpenseLogRead
+    ))
+    assert len(chunks) == 2
+    records = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [(r["record"], r["parent_id"], r["id"]) for r in records] == [
+        ("item", "", "1"), ("log", "1", "10"), ("item", "", "2"),
+        ("item", "", "3"),
+    ]
+
+
+def test_csv_without_rows_is_just_the_header():
+    chunks = collect(csv_chunks(rows([]), schemas.InvoiceRead))
+    assert chunks == [
+        "record,parent_id,title,description,amount,currency_code,"
+        "attachment,created,updated,user_id,id,version,thumbnail_url\r\n"
+    ]
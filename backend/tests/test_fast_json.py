@@ -0,0 +1,57 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from app import schemas
+from app.models import Expense
+from app.utils import fast_json
+from app.utils.fast_json import FastJSONResponse, rows_response, schema_columns
+from fastapi.responses import JSONResponse
+from fastapi_pagination.cursor import CursorPage
+
+
+class DriverUUID(uuid.UUID):
+    """Stands in for asyncpg's UUID subclass"""
+
+
+ROW = {
+    "id": 1,
+    "user_id": DriverUUID(int=7),
+    "created": datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc),
+    "amount": 12.5,
+}
+
+
+@pytest.fixture(params=["orjson", "pydantic"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+
+
+def test_rows_render_like_pydantic(encoder):
+    body = json.loads(FastJSONResponse([ROW]).body)
+    assert body == [{
+        "id": 1,
+        "user_id": str(uuid.UUID(int=7)),
+        "created": "2026-10-18T09:30:00Z",
+        "amount": 12.5,
+    }]
+
+
+def test_schema_columns_follow_the_read_schema():
+    columns = schema_columns(Expense, schemas.ExpenseRead)
+    assert [column.key for column in columns] == \
+        list(schemas.ExpenseRead.model_fields)
+
+
+def test_rows_response_dumps_pages(encoder):
+    page = CursorPage[schemas.ExpenseRead].model_construct(
+        items=[], total=None, current_page=None, current_page_backwards=None,
+        previous_page=None, next_page="abc",
+    )
+    response = rows_response(page)
+    assert json.loads(response.body) == \
+        json.loads(JSONResponse(page.model_dump(mode="json")).body)
@@ -0,0 +1,116 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from app import schemas
+from app.models import expense_model, invoice_model
+from app.models.expense_log_model import ExpenseLog
+from app.models.expense_model import Expense
+from app.models.invoice_log_model import InvoiceLog
+from app.models.invoice_model import Invoice
+
+USER = SimpleNamespace(id=uuid.uuid4())
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def one_or_none(self):
+        return self.row
+
+
+class FakeDB:
+    """
+    One session, keeps what was added and the statements run, hands out ids
+    on flush. An update returns the given row.
+    """
+    def __init__(self, updated=None):
+        self.updated = updated
+        self.added = []
+        self.statements = []
+        self.info = {}
+
+    def add(self, item):
+        if item not in self.added:
+            self.added.append(item)
+
+    async def flush(self):
+        for n, item in enumerate(self.added, 1):
+            if item.id is None:
+                item.id = n
+
+    async def execute(self, q, **kwargs):
+        self.statements.append(q)
+        return FakeResult(self.updated)
+
+
+def run(monkeypatch, module, call, updated=None):
+    db = FakeDB(updated)
+
+    async def write_db():
+        yield db
+
+    monkeypatch.setattr(module, "get_db_cm", write_db)
+    return db, asyncio.run(call).value
+
+
+@pytest.mark.parametrize("log", [False, True])
+def test_expense_create(monkeypatch, log):
+    db, expense = run(
+        monkeypatch, expense_model,
+        Expense.create(USER, "t", "d", 2.0, None, log),
+    )
+    logs = [item for item in db.added if isinstance(item, ExpenseLog)]
+    assert len(logs) == log
+    if log:
+        assert logs[0].expense_id == expense.id
+        assert (logs[0].title, logs[0].amount) == ("t", 2.0)
+        assert logs[0].user_id == USER.id
+
+
+def test_expense_update_logs_the_new_state(monkeypatch):
+    updated = Expense(
+        id=7, title="new", description="d", amount=3.0,
+        currency_code="USD", attachment="a", user_id=USER.id, version=2,
+    )
+    db, expense = run(
+        monkeypatch, expense_model,
+        Expense.update(7, USER, "new", "d", 3.0, None, log=True),
+        (updated, 1.0, "a"),
+    )
+    [log] = [item for item in db.added if isinstance(item, ExpenseLog)]
+    assert (log.expense_id, log.title, log.amount) == (7, "new", 3.0)
+    # The update, then the counter and the rollup for the amount change
+    assert len(db.statements) == 3
+
+
+def test_invoice_update_without_log(monkeypatch):
+    updated = Invoice(
+        id=5, title="new", description=None, amount=4.0,
+        currency_code="USD", attachment=None, user_id=USER.id, version=2,
+    )
+    data = schemas.InvoiceUpdate(
+        title="new", description=None, amount=4, attachment=None
+    )
+    db, invoice = run(
+        monkeypatch, invoice_model, Invoice.update(5, data, USER),
+        (updated, 4.0, None),
+    )
+    assert not [item for item in db.added if isinstance(item, InvoiceLog)]
+    assert invoice.title == "new"
+    # Same amount, nothing for the counters
+    assert len(db.statements) == 1
+
+
+def test_invoice_create_with_log(monkeypatch):
+    item = schemas.Invoice(
+        title="i", description=None, amount=5, currency_code="USD",
+        attachment=None, user_id=USER.id,
+    )
+    db, invoice = run(
+        monkeypatch, invoice_model, Invoice.create(item, log=True),
+    )
+    [log] = [item for item in db.added if isinstance(item, InvoiceLog)]
+    assert (log.invoice_id, log.amount) == (invoice.id, 5)
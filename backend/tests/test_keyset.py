@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from app.models import Expense
+from app.utils.app_exceptions import AppExceptionCase
+from app.utils.keyset import decode_cursor, encode_cursor, keyset_paginate
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+
+class FakeDB:
+    """Returns canned rows and keeps the SQL it was asked to run."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = None
+
+    async def scalars(self, q):
+        self.sql = str(q.compile(dialect=postgresql.dialect()))
+        return iter(self.rows)
+
+
+def rows(*ids):
+    return [SimpleNamespace(id=id, amount=float(id)) for id in ids]
+
+
+def paginate(db, cursor=None, sort="-id", size=2):
+    return asyncio.run(
+        keyset_paginate(db, select(Expense), Expense, cursor, sort, size)
+    )
+
+
+def test_cursor_round_trip():
+    created = datetime(2024, 3, 8, 22, 58, tzinfo=timezone.utc)
+    cursor = encode_cursor("-created", "next", [created.isoformat(), 42])
+    assert decode_cursor(cursor) == {
+        "s": "-created", "d": "next", "v": [created, 42]
+    }
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    encode_cursor("-id", "up", [1, 1]),
+    encode_cursor("-title", "next", ["a", 1]),
+    encode_cursor("-id", "next", [1]),
+    encode_cursor("-id", "next", ["1", 1]),
+    encode_cursor("-id", "next", [1, True]),
+    encode_cursor("-created", "next", [1, 1]),
+    encode_cursor("-created", "next", ["yesterday", 1]),
+    encode_cursor("amount", "next", ["10", 1]),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(AppExceptionCase):
+        decode_cursor(cursor)
+
+
+def test_first_page():
+    db = FakeDB(rows(9, 8, 7))
+    page = paginate(db)
+    assert "WHERE" not in db.sql
+    assert "ORDER BY expenses.id DESC" in db.sql
+    assert [item.id for item in page["items"]] == [9, 8]
+    assert decode_cursor(page["next"])["v"] == [8, 8]
+    assert page["prev"] is None
+
+
+def test_next_page_descending():
+    db = FakeDB(rows(7, 6))
+    page = paginate(db, encode_cursor("-id", "next", [8, 8]))
+    assert "WHERE (expenses.id) < (%(param_1)s)" in db.sql
+    assert "ORDER BY expenses.id DESC" in db.sql
+    assert page["next"] is None
+    assert decode_cursor(page["prev"])["v"] == [7, 7]
+
+
+def test_prev_page_descending_is_reversed():
+    # Walking back from 5 the query runs ascending and the rows are flipped
+    db = FakeDB(rows(6, 7, 8))
+    page = paginate(db, encode_cursor("-id", "prev", [5, 5]))
+    assert "WHERE (expenses.id) > (%(param_1)s)" in db.sql
+    assert "ORDER BY expenses.id ASC" in db.sql
+    assert [item.id for item in page["items"]] == [7, 6]
+    assert decode_cursor(page["next"])["v"] == [6, 6]
+    assert decode_cursor(page["prev"])["v"] == [7, 7]
+
+
+def test_next_page_ascending_composite_key():
+    db = FakeDB(rows(3, 4))
+    page = paginate(db, encode_cursor("amount", "next", [2, 2]), "amount")
+    assert (
+        "WHERE (expenses.amount, expenses.id) > "
+        "(%(param_1)s, %(param_2)s)" in db.sql
+    )
+    assert "ORDER BY expenses.amount ASC, expenses.id ASC" in db.sql
+    assert page["next"] is None
+    assert decode_cursor(page["prev"])["v"] == [3.0, 3]
+
+
+def test_cursor_for_another_sort_is_rejected():
+    with pytest.raises(AppExceptionCase):
+        paginate(FakeDB([]), encode_cursor("created", "next", [
+            "2024-03-08T22:58:00+00:00", 1
+        ]))
@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.models import ledger_counter_model
+from app.models.ledger_counter_model import EXPENSE, INVOICE, LedgerCounter
+from sqlalchemy.dialects import postgresql
+
+
+def compile(q):
+    return q.compile(dialect=postgresql.dialect())
+
+
+class FakeDB:
+    def __init__(self, counters=()):
+        self.counters = counters
+        self.executed = []
+
+    async def execute(self, q):
+        self.executed.append(q)
+
+    async def scalars(self, q):
+        return iter(self.counters)
+
+
+def test_apply_upserts_the_delta():
+    db = FakeDB()
+    user_id = uuid.uuid4()
+    asyncio.run(LedgerCounter.apply(db, user_id, EXPENSE, 1, 12.5))
+    q = compile(db.executed[0])
+    sql = " ".join(str(q).split())
+    assert sql.startswith("INSERT INTO ledger_counters")
+    assert "ON CONFLICT (user_id, kind) DO UPDATE SET" in sql
+    assert "row_count = (ledger_counters.row_count + %(row_count_1)s)" in sql
+    assert (
+        "amount_sum = (ledger_counters.amount_sum + %(amount_sum_1)s)" in sql
+    )
+    assert q.params["user_id"] == user_id
+    assert q.params["kind"] == EXPENSE
+    assert q.params["row_count"] == q.params["row_count_1"] == 1
+    assert q.params["amount_sum"] == q.params["amount_sum_1"] == 12.5
+
+
+def test_count_query_defaults_to_zero():
+    user_id = uuid.uuid4()
+    q = compile(LedgerCounter.count_query(user_id, INVOICE))
+    sql = " ".join(str(q).split())
+    assert sql.startswith("SELECT coalesce((SELECT ledger_counters.row_count")
+    assert "ledger_counters.user_id = %(user_id_1)s::UUID" in sql
+    assert "ledger_counters.kind = %(kind_1)s" in sql
+    assert q.params["user_id_1"] == user_id
+    assert q.params["kind_1"] == INVOICE
+    assert q.params["coalesce_2"] == 0
+
+
+def test_get_totals(monkeypatch):
+    counter = LedgerCounter(kind=EXPENSE, row_count=3, amount_sum=30.0)
+
+    async def read_db(user_id):
+        yield FakeDB([counter])
+
+    monkeypatch.setattr(ledger_counter_model, "get_read_db_cm", read_db)
+    user = SimpleNamespace(id=uuid.uuid4())
+    result = asyncio.run(LedgerCounter.get_totals(user))
+    assert result.value == {
+        "expenses": {"count": 3, "amount": 30.0},
+        "invoices": {"count": 0, "amount": 0.0},
+    }
+
+
+def test_get_totals_without_counters(monkeypatch):
+    async def read_db(user_id):
+        yield FakeDB()
+
+    monkeypatch.setattr(ledger_counter_model, "get_read_db_cm", read_db)
+    user = SimpleNamespace(id=uuid.uuid4())
+    result = asyncio.run(LedgerCounter.get_totals(user))
+    assert result.value == {
+        "expenses": {"count": 0, "amount": 0.0},
+        "invoices": {"count": 0, "amount": 0.0},
+    }
@@ -0,0 +1,69 @@
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from app.models.expense_model import Expense
+from app.models.ledger_counter_model import EXPENSE
+from app.models.ledger_rollup_model import LedgerMonthlyRollup, month_of
+from app.routers.analytics_router import months_before, parse_month
+from sqlalchemy.dialects import postgresql
+
+
+class FakeDB:
+    def __init__(self):
+        self.executed = []
+
+    async def execute(self, q):
+        self.executed.append(q.compile(dialect=postgresql.dialect()))
+
+
+def sql(compiled):
+    return " ".join(str(compiled).split())
+
+
+def test_months_are_utc():
+    sofia = timezone(timedelta(hours=3))
+    assert month_of(datetime(2024, 4, 1, 1, tzinfo=sofia)) == date(2024, 3, 1)
+    assert month_of(datetime(2024, 3, 31, 23, tzinfo=timezone.utc)) == \
+        date(2024, 3, 1)
+
+
+def test_apply_upserts_the_delta():
+    db = FakeDB()
+    created = datetime(2024, 3, 8, tzinfo=timezone.utc)
+    asyncio.run(LedgerMonthlyRollup.apply(
+        db, uuid.uuid4(), EXPENSE, created, "EUR", -1, -12.5
+    ))
+    q = db.executed[0]
+    assert (
+        "ON CONFLICT (user_id, month, kind, currency_code) DO UPDATE SET "
+        "row_count = (ledger_monthly_rollup.row_count + excluded.row_count)"
+    ) in sql(q)
+    assert q.params["month"] == date(2024, 3, 1)
+    assert q.params["currency_code"] == "EUR"
+    assert q.params["row_count"] == -1
+    assert q.params["amount_sum"] == -12.5
+
+
+def test_apply_rows_groups_server_side():
+    db = FakeDB()
+    asyncio.run(LedgerMonthlyRollup.apply_rows(db, Expense, EXPENSE, [1, 2]))
+    statement = sql(db.executed[0])
+    assert statement.startswith(
+        "INSERT INTO ledger_monthly_rollup (user_id, month, kind, "
+        "currency_code, row_count, amount_sum) SELECT expenses.user_id, "
+        "CAST(date_trunc("
+    )
+    assert "timezone(%(timezone_1)s, expenses.created)) AS DATE)" in statement
+    assert "WHERE expenses.id IN (__[POSTCOMPILE_id_1])" in statement
+    assert "GROUP BY expenses.user_id, CAST(date_trunc" in statement
+
+
+@pytest.mark.parametrize("month, count, expected", [
+    ("2024-12", 11, date(2024, 1, 1)),
+    ("2024-03", 11, date(2023, 4, 1)),
+    ("2024-01", 0, date(2024, 1, 1)),
+])
+def test_months_before(month, count, expected):
+    assert months_before(parse_month(month), count) == expected
@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from app.config import users
+from app.utils.password_pool import PasswordHashPool, password_context
+from fastapi_users.password import PasswordHelper
+
+# bcrypt's lowest cost, the tests only care about the rounds changing
+ROUNDS = 4
+
+
+@pytest.fixture(params=[0, 2], ids=["inline", "pooled"])
+def pool(request, monkeypatch):
+    pool = PasswordHashPool(
+        PasswordHelper(password_context(ROUNDS + 1)), request.param
+    )
+    monkeypatch.setattr(users, "password_pool", pool)
+    yield pool
+    if pool.executor is not None:
+        pool.executor.shutdown()
+
+
+def test_hash_and_verify(pool):
+    async def run():
+        hashed = await pool.hash("secret")
+        return hashed, await pool.verify_and_update("secret", hashed)
+
+    hashed, (verified, updated) = asyncio.run(run())
+    assert verified and updated is None
+    assert f"${ROUNDS + 1:02d}$" in hashed
+    if pool.workers:
+        assert pool.snapshot()["completed"] == 2
+        assert pool.snapshot()["queued"] == pool.snapshot()["running"] == 0
+
+
+class FakeUserDB:
+    def __init__(self, user):
+        self.user = user
+        self.updates = []
+
+    async def get_by_email(self, email):
+        return self.user if email == self.user.email else None
+
+    async def update(self, user, update_dict):
+        self.updates.append(update_dict)
+        return user
+
+
+def login(pool, user, password, email=None):
+    user_db = FakeUserDB(user)
+    manager = users.UserManager(user_db, pool.helper)
+    credentials = SimpleNamespace(username=email or user.email,
+                                  password=password)
+    return asyncio.run(manager.authenticate(credentials)), user_db
+
+
+def test_login_rehashes_with_more_rounds(pool):
+    weaker = PasswordHelper(password_context(ROUNDS)).hash("secret")
+    user = SimpleNamespace(
+        id=uuid.uuid4(), email="a@b.c", hashed_password=weaker
+    )
+    authenticated, user_db = login(pool, user, "secret")
+    assert authenticated is user
+    [update] = user_db.updates
+    assert f"${ROUNDS + 1:02d}$" in update["hashed_password"]
+
+
+def test_wrong_password_and_unknown_email(pool):
+    user = SimpleNamespace(
+        id=uuid.uuid4(), email="a@b.c",
+        hashed_password=pool.helper.hash("secret"),
+    )
+    assert login(pool, user, "wrong")[0] is None
+    authenticated, user_db = login(pool, user, "secret", email="x@y.z")
+    assert authenticated is None and user_db.updates == []
@@ -0,0 +1,75 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from app.config.database import after_commit, run_after_commit
+from app.models.expense_model import Expense
+from app.models.invoice_model import Invoice
+from app.utils import previews
+from app.utils.previews import PreviewPool
+from sqlalchemy import select
+
+
+def test_thumbnail_url():
+    assert Expense(id=3, attachment="k").thumbnail_url == (
+        "/expenses/3/attachment/thumbnail"
+    )
+    assert Invoice(id=4, attachment=None).thumbnail_url is None
+    # The same path for rows selected with schema_columns
+    q = select(Expense.id, Expense.thumbnail_url)
+    assert list(q.selected_columns.keys()) == ["id", "thumbnail_url"]
+
+
+def test_after_commit_runs_once():
+    session = SimpleNamespace(info={})
+    called = []
+    after_commit(session, lambda: called.append(1))
+    run_after_commit(session)
+    run_after_commit(session)
+    assert called == [1]
+
+
+def test_nothing_is_rendered_without_pillow(monkeypatch):
+    monkeypatch.setattr(previews, "Image", None)
+    assert not PreviewPool(2, 2).enabled("image/png")
+    assert not previews.supports("application/pdf")
+
+
+def test_no_workers_renders_nothing():
+    assert not PreviewPool(0, 2).enabled("image/png")
+
+
+def test_pool_counts_jobs_and_waits_for_them():
+    pool = PreviewPool(1, 1)
+    done = []
+
+    async def job(key):
+        await asyncio.sleep(0.01)
+        done.append(key)
+
+    async def broken(key):
+        raise ValueError(key)
+
+    async def run():
+        pool.schedule(job, "a")
+        pool.schedule(broken, "b")
+        pool.schedule(job, "c")
+        assert pool.snapshot()["jobs"] == 3
+        await pool.stop()
+
+    asyncio.run(run())
+    assert done == ["a", "c"]
+    snapshot = pool.snapshot()
+    assert (snapshot["jobs"], snapshot["completed"]) == (0, 2)
+    assert snapshot["failed"] == 1
+
+
+def test_render_thumbnail():
+    Image = pytest.importorskip("PIL.Image")
+    photo = io.BytesIO()
+    Image.new("RGB", (1200, 600), "white").save(photo, "JPEG")
+    thumbnail = previews.render_thumbnail(
+        photo.getvalue(), "image/jpeg", 320, "jpeg", 80
+    )
+    assert Image.open(io.BytesIO(thumbnail)).size == (320, 160)
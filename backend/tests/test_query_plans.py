@@ -0,0 +1,177 @@
+# Runs every model read query under EXPLAIN against a seeded, migrated local
+# postgres and fails when one of them falls back to a sequential scan of a
+# ledger table. Uses the same DB_* env variables as the app and is skipped
+# when DB_ADDRESS isn't set, i.e. docker compose run backend pytest
+import asyncio
+import json
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+if not os.getenv("DB_ADDRESS"):
+    pytest.skip("needs a local postgres", allow_module_level=True)
+
+from app.config.database import engine  # noqa: E402
+from app.models import *  # noqa: E402,F403
+from app.models.expense_log_model import ExpenseLog  # noqa: E402
+from app.models.expense_model import Expense  # noqa: E402
+from app.models.invoice_log_model import InvoiceLog  # noqa: E402
+from app.models.invoice_model import Invoice  # noqa: E402
+from fastapi_pagination import Page, Params, set_page, set_params  # noqa
+from sqlalchemy import event, text  # noqa: E402
+
+USERS = 200
+ROWS_PER_USER = 250
+LEDGER_TABLES = {"expenses", "invoices", "expense_logs", "invoice_logs"}
+
+
+def query_cases(user, expense_id, invoice_id):
+    return {
+        "expense_get": lambda: Expense.get(expense_id, user),
+        "expense_first": lambda: Expense.first(user),
+        "expense_page": lambda: Expense.get_all(user, None),
+        "expense_cursor_id": lambda: Expense.get_all_cursor(
+            user, None, "", "-id", 5
+        ),
+        "expense_cursor_created": lambda: Expense.get_all_cursor(
+            user, None, "", "-created", 5
+        ),
+        "expense_cursor_amount": lambda: Expense.get_all_cursor(
+            user, None, "", "amount", 5
+        ),
+        "expense_logs": lambda: ExpenseLog.get_all(user, expense_id),
+        "invoice_get": lambda: Invoice.get(invoice_id, user),
+        "invoice_first": lambda: Invoice.first(user),
+        "invoice_page": lambda: Invoice.get_all(user, None),
+        "invoice_cursor_id": lambda: Invoice.get_all_cursor(
+            user, None, "", "-id", 5
+        ),
+        "invoice_logs": lambda: InvoiceLog.get_all(user, invoice_id),
+    }
+
+
+async def seed(conn, user_ids):
+    await conn.execute(
+        text(
+            "INSERT INTO \"user\" (id, email, hashed_password, is_active,"
+            " is_superuser, is_verified)"
+            " SELECT id, id::text || '@plan.test', '', true, false, true"
+            " FROM unnest(CAST(:ids AS uuid[])) AS id"
+        ),
+        {"ids": user_ids},
+    )
+    for table, log_table, fk in (
+        ("expenses", "expense_logs", "expense_id"),
+        ("invoices", "invoice_logs", "invoice_id"),
+    ):
+        await conn.execute(
+            text(
+                f"INSERT INTO {table}"
+                " (title, description, amount, currency_code, user_id)"
+                " SELECT md5(random()::text), md5(random()::text),"
+                " (random() * 100)::int, 'USD', u.id"
+                " FROM unnest(CAST(:ids AS uuid[])) AS u(id),"
+                " generate_series(1, :rows)"
+            ),
+            {"ids": user_ids, "rows": ROWS_PER_USER},
+        )
+        await conn.execute(
+            text(
+                f"INSERT INTO {log_table}"
+                f" (title, description, amount, currency_code, user_id, {fk})"
+                " SELECT title, description, amount, currency_code, user_id,"
+                f" id FROM {table} WHERE user_id = ANY(CAST(:ids AS uuid[]))"
+            ),
+            {"ids": user_ids},
+        )
+        await conn.execute(text(f"ANALYZE {table}"))
+        await conn.execute(text(f"ANALYZE {log_table}"))
+
+
+async def explain_all() -> dict:
+    user_ids = [uuid.uuid4() for _ in range(USERS)]
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    async with engine.begin() as conn:
+        await seed(conn, user_ids)
+
+    plans = {}
+    try:
+        async with engine.connect() as conn:
+            expense_id = await conn.scalar(text(
+                "SELECT max(id) FROM expenses WHERE user_id = :id"
+            ), {"id": user_ids[0]})
+            invoice_id = await conn.scalar(text(
+                "SELECT max(id) FROM invoices WHERE user_id = :id"
+            ), {"id": user_ids[0]})
+        user = SimpleNamespace(id=user_ids[0])
+
+        cases = query_cases(user, expense_id, invoice_id)
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            with set_page(Page), set_params(Params(page=3, size=5)):
+                for name, run in cases.items():
+                    captured.clear()
+                    await run()
+                    plans[name] = list(captured)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        async with engine.connect() as conn:
+            for name, statements in plans.items():
+                explained = []
+                for statement, parameters in statements:
+                    result = await conn.exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                    )
+                    plan = result.scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    explained.append((statement, plan[0]["Plan"]))
+                plans[name] = explained
+    finally:
+        async with engine.begin() as conn:
+            # Logs go with their parents through ON DELETE CASCADE
+            for table in ("expenses", "invoices", "\"user\""):
+                column = "id" if table == "\"user\"" else "user_id"
+                await conn.execute(
+                    text(
+                        f"DELETE FROM {table}"
+                        f" WHERE {column} = ANY(CAST(:ids AS uuid[]))"
+                    ),
+                    {"ids": user_ids},
+                )
+        await engine.dispose()
+    return plans
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if (
+        plan["Node Type"] == "Seq Scan"
+        and plan.get("Relation Name") in LEDGER_TABLES
+    ):
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return asyncio.run(explain_all())
+
+
+@pytest.mark.parametrize(
+    "name", list(query_cases(None, None, None))
+)
+def test_no_seq_scan(plans, name):
+    assert plans[name], f"{name} ran no SELECT"
+    for statement, plan in plans[name]:
+        assert not seq_scans(plan), f"{name} seq scans:\n{statement}"
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from app import settings
+from app.config import database
+from app.config.database import ReplicaRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSession:
+    def __init__(self, lag=0.0, fail=False):
+        self.lag = lag
+        self.fail = fail
+        self.closed = False
+
+    async def connection(self):
+        if self.fail:
+            raise OSError("connection refused")
+
+    async def scalar(self, q):
+        return self.lag
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(database.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def router(clock):
+    return ReplicaRouter(["replica-1", "replica-2:5433"])
+
+
+def addresses(replicas):
+    return [replica.address for replica in replicas]
+
+
+def test_round_robin(router):
+    first = addresses(router.candidates("user"))
+    second = addresses(router.candidates("user"))
+    assert sorted(first) == sorted(second) == ["replica-1", "replica-2:5433"]
+    assert first[0] != second[0]
+
+
+def test_sticky_after_write(router, clock):
+    router.mark_write("writer")
+    assert router.candidates("writer") == []
+    assert len(router.candidates("reader")) == 2
+    clock.now += settings.db_read_your_writes_seconds
+    assert len(router.candidates("writer")) == 2
+
+
+def test_down_replica_comes_back(router, clock):
+    replica = router.replicas[0]
+    replica.session = lambda: FakeSession(fail=True)
+    router.replicas = [replica]
+
+    assert asyncio.run(router.open_session("user")) is None
+    assert router.candidates("user") == []
+
+    clock.now += settings.db_replica_retry_after
+    replica.session = lambda: FakeSession()
+    assert asyncio.run(router.open_session("user")) is not None
+
+
+def test_lagging_replica_is_probed_again(router, clock):
+    replica = router.replicas[0]
+    router.replicas = [replica]
+    lagging = settings.db_replica_max_lag_seconds + 1
+    replica.session = lambda: FakeSession(lag=lagging)
+
+    assert asyncio.run(router.open_session("user")) is None
+    assert router.candidates("user") == []
+
+    clock.now += settings.db_replica_lag_check_interval
+    replica.session = lambda: FakeSession(lag=0.0)
+    assert asyncio.run(router.open_session("user")) is not None
+    assert replica.lag_seconds == 0.0
+
+
+def test_writes_are_recorded_on_commit(router, monkeypatch):
+    monkeypatch.setattr(database, "replica_router", router)
+    session = FakeSession()
+    session.info = {}
+    database.mark_user_write(session, "writer")
+    assert len(router.candidates("writer")) == 2
+    database.record_user_writes(session)
+    assert router.candidates("writer") == []
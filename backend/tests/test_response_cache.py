@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from app.utils import response_cache as cache_module
+from app.utils.app_exceptions import AppException
+from app.utils.response_cache import (MISS, MemoryBackend, ResponseCache,
+                                      cached)
+from app.utils.service_result import ServiceResult
+
+USER = SimpleNamespace(id=uuid.uuid4())
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(MemoryBackend(ttl=60, max_entries=100))
+    monkeypatch.setattr(cache_module, "response_cache", cache)
+    return cache
+
+
+class Ledger:
+    calls = 0
+
+    @classmethod
+    @cached("get")
+    async def get(cls, item_id: int, user):
+        cls.calls += 1
+        if item_id < 0:
+            return ServiceResult(AppException.GetObject({"item_id": item_id}))
+        return ServiceResult({"id": item_id, "calls": cls.calls})
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_memory_backend_is_a_bounded_lru(clock):
+    backend = MemoryBackend(ttl=60, max_entries=2)
+    run(backend.set("a", 1))
+    run(backend.set("b", 2))
+    assert run(backend.get("a")) == 1
+    run(backend.set("c", 3))
+    assert run(backend.get("b")) is MISS
+    assert len(backend) == 2
+    clock.now += 60
+    assert run(backend.get("a")) is MISS
+
+
+def test_forgotten_generations_only_had_expired_values(clock):
+    backend = MemoryBackend(ttl=60, max_entries=1)
+    run(backend.bump("old"))
+    clock.now += 61
+    run(backend.bump("new"))
+    run(backend.bump("newer"))
+    assert run(backend.generation("old")) == 0
+    assert run(backend.generation("newer")) == 1
+
+
+def test_reads_are_cached_per_user_and_arguments(cache):
+    first = run(Ledger.get(1, USER)).value
+    assert run(Ledger.get(1, user=USER)).value == first
+    assert run(Ledger.get(2, USER)).value != first
+    other = SimpleNamespace(id=uuid.uuid4())
+    assert run(Ledger.get(1, other)).value != first
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_a_write_drops_only_that_users_reads(cache):
+    other = SimpleNamespace(id=uuid.uuid4())
+    mine, theirs = run(Ledger.get(1, USER)), run(Ledger.get(1, other))
+    run(cache.invalidate({USER.id}))
+    assert run(Ledger.get(1, USER)).value != mine.value
+    assert run(Ledger.get(1, other)).value == theirs.value
+
+
+def test_failures_are_not_cached(cache):
+    assert not run(Ledger.get(-1, USER)).success
+    assert not run(Ledger.get(-1, USER)).success
+    assert cache.hits == 0 and cache.stats()["entries"] == 0
+
+
+def test_turned_off_without_a_backend(monkeypatch):
+    cache = ResponseCache(None)
+    monkeypatch.setattr(cache_module, "response_cache", cache)
+    assert run(Ledger.get(1, USER)).value != run(Ledger.get(1, USER)).value
+    assert cache.stats()["backend"] is None
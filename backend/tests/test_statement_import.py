@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app import schemas
+from app.utils.statement_import import (csv_records, fingerprint, from_csv,
+                                        from_ofx, ofx_records)
+
+CSV = (
+    'Title,Description,Amount,Date\r\n'
+    'Coffee,"two\nlines",3.5,2024-03-08\r\n'
+    '\r\n'
+    'Rent,,1200,2024-03-01'
+)
+OFX = (
+    "OFXHEADER:100\nDATA:OFXSGML\n<OFX><STMTRS><CURDEF>EUR<BANKTRANLIST>"
+    "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240308120000[-5:EST]"
+    "<TRNAMT>-42.10<FITID>F1<NAME>Grocer<MEMO>weekly</STMTTRN>\n"
+    "<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20240309\n<TRNAMT>100.00\n"
+    "<FITID>F2\n<NAME>Salary\n</STMTTRN></BANKTRANLIST></STMTRS></OFX>"
+)
+
+
+async def pieces(text, size):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def collect(records):
+    async def run():
+        return [record async for record in records]
+    return asyncio.run(run())
+
+
+def test_csv_records_survive_any_chunking():
+    expected = [
+        (2, {"title": "Coffee", "description": "two\nlines",
+             "amount": "3.5", "date": "2024-03-08"}),
+        (5, {"title": "Rent", "description": "", "amount": "1200",
+             "date": "2024-03-01"}),
+    ]
+    for size in (1, 7, len(CSV)):
+        assert collect(csv_records(pieces(CSV, size))) == expected
+
+
+def test_csv_row_to_expense():
+    data = from_csv({"title": "Rent", "amount": "1200", "date": "2024-03-01"})
+    expense = schemas.Expense.model_validate(data)
+    assert expense.currency_code == "USD"
+    assert expense.created == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert data["reference"] is None
+
+
+def test_ofx_records_survive_any_chunking():
+    for size in (1, 13, len(OFX)):
+        records = collect(ofx_records(pieces(OFX, size)))
+        assert [row for row, _ in records] == [1, 2]
+        assert records[0][1]["FITID"] == "F1"
+        assert records[1][1]["NAME"] == "Salary"
+
+
+def test_ofx_debits_become_expenses():
+    (_, debit), (_, credit) = collect(ofx_records(pieces(OFX, len(OFX))))
+    data = from_ofx(debit)
+    assert data["amount"] == 42.10
+    assert data["currency_code"] == "EUR"
+    assert data["created"] == datetime(2024, 3, 8, tzinfo=timezone.utc)
+    assert data["reference"] == "F1"
+    assert from_ofx(credit) is None
+
+
+def test_fingerprint():
+    data = from_csv({"title": "Coffee", "amount": "3.5", "date": "2024-03-08"})
+    expense = schemas.Expense.model_validate(data)
+    assert fingerprint(None, expense) == fingerprint(None, expense)
+    assert fingerprint("F1", expense) != fingerprint(None, expense)
+    assert len(fingerprint(None, expense)) == 40
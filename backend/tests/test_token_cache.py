@@ -0,0 +1,129 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from app.config import users
+from app.models import *  # noqa: F403
+from app.models.user_model import User
+from app.utils import token_cache as cache_module
+from app.utils.token_cache import TokenCache
+from sqlalchemy import inspect
+
+USER_ID = uuid.uuid4()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_entries_expire_with_the_ttl_or_the_token(clock):
+    cache = TokenCache(ttl=60, max_entries=10)
+    cache.set("a", USER_ID, 0, "user")
+    cache.set("b", USER_ID, 0, "user", expires_in=5)
+    cache.set("c", USER_ID, 0, "user", expires_in=-1)
+    assert cache.get("b") == "user" and cache.get("c") is None
+    clock.now += 5
+    assert cache.get("a") == "user" and cache.get("b") is None
+    clock.now += 55
+    assert cache.get("a") is None
+
+
+def test_bounded_lru():
+    cache = TokenCache(ttl=60, max_entries=2)
+    cache.set("a", USER_ID, 0, "a")
+    cache.set("b", USER_ID, 0, "b")
+    cache.get("a")
+    cache.set("c", USER_ID, 0, "c")
+    assert cache.get("b") is None and len(cache) == 2
+
+
+def test_dropping_a_user_drops_all_their_tokens():
+    cache = TokenCache(ttl=60, max_entries=10)
+    other = uuid.uuid4()
+    cache.set("a", USER_ID, 0, "a")
+    cache.set("b", USER_ID, 0, "b")
+    cache.set("c", other, 0, "c")
+    cache.drop_user(USER_ID)
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") == "c"
+
+
+def test_a_snapshot_read_during_a_change_is_not_served():
+    cache = TokenCache(ttl=60, max_entries=10)
+    generation = cache.generation(USER_ID)
+    cache.drop_user(USER_ID)
+    cache.set("a", USER_ID, generation, "before the change")
+    assert cache.get("a") is None
+
+
+class FakeTokenDB:
+    def __init__(self):
+        self.reads = 0
+        self.deleted = []
+
+    async def get_by_token(self, token, max_age=None):
+        self.reads += 1
+        return SimpleNamespace(
+            token=token, user_id=USER_ID, created_at=datetime.now(timezone.utc)
+        )
+
+    async def delete(self, access_token):
+        self.deleted.append(access_token.token)
+
+
+class FakeUserManager:
+    def __init__(self):
+        self.username = "first"
+
+    def parse_id(self, value):
+        return value
+
+    async def get(self, id):
+        return User(
+            id=id, email="a@b.c", hashed_password="", is_active=True,
+            is_superuser=False, is_verified=True, username=self.username,
+        )
+
+
+@pytest.fixture
+def strategy(monkeypatch):
+    monkeypatch.setattr(
+        users, "token_cache", TokenCache(ttl=60, max_entries=10)
+    )
+    return users.CachedDatabaseStrategy(FakeTokenDB(), lifetime_seconds=3600)
+
+
+def test_a_known_token_skips_the_database(strategy):
+    manager = FakeUserManager()
+    first = asyncio.run(strategy.read_token("t", manager))
+    second = asyncio.run(strategy.read_token("t", manager))
+    assert strategy.database.reads == 1
+    assert second is not first and second.id == first.id == USER_ID
+    # Detached, not pending, so adding it to a session updates the user
+    assert inspect(second).detached
+
+
+def test_changes_and_logout_reach_the_cache(strategy):
+    manager = FakeUserManager()
+    asyncio.run(strategy.read_token("t", manager))
+    manager.username = "second"
+    users.drop_cached_user(SimpleNamespace(id=USER_ID))
+    user = asyncio.run(strategy.read_token("t", manager))
+    assert user.username == "second" and strategy.database.reads == 2
+
+    asyncio.run(strategy.destroy_token("t", user))
+    assert strategy.database.deleted == ["t"]
+    assert users.token_cache.get("t") is None
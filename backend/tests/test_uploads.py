@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+
+import pytest
+from app import settings
+from app.utils.app_exceptions import AppException
+from app.utils.aws import StreamingUpload
+from app.utils.uploads import read_form
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel
+from starlette.requests import Request
+
+PDF = b"%PDF-1.7\n" + b"x" * 100
+BOUNDARY = "boundary"
+
+
+def test_small_object_is_put_once(s3):
+    async def run():
+        upload = StreamingUpload("key", "application/pdf", 1024, 2)
+        await upload.write(PDF)
+        return await upload.complete()
+
+    key = asyncio.run(run())
+    assert s3.objects == {"key": PDF}
+    assert s3.uploads == {}
+    assert key == "key"
+
+
+def test_parts_are_bounded_and_in_order(s3):
+    s3.delay = 0.02
+    body = bytes(range(256)) * 40
+
+    async def run():
+        upload = StreamingUpload("key", "application/pdf", 1000, 2)
+        for start in range(0, len(body), 300):
+            await upload.write(body[start:start + 300])
+        await upload.complete()
+
+    asyncio.run(run())
+    assert s3.objects["key"] == body
+    assert s3.max_in_flight == 2
+
+
+def test_multipart_is_moved_to_its_key(s3):
+    body = b"x" * 2500
+
+    async def run():
+        upload = StreamingUpload("tmp", "application/pdf", 1000, 2)
+        await upload.write(body)
+        key = await upload.complete(upload.sha256.hexdigest())
+        return key
+
+    key = asyncio.run(run())
+    assert key == hashlib.sha256(body).hexdigest()
+    assert s3.objects == {key: body}
+    assert s3.types[key] == "application/pdf"
+
+
+def test_failed_part_aborts(s3):
+    s3.fail_part = 1
+
+    async def run():
+        upload = StreamingUpload("key", "application/pdf", 10, 1)
+        with pytest.raises(ConnectionError):
+            for _ in range(5):
+                await upload.write(b"x" * 10)
+            await upload.complete()
+        await upload.abort()
+
+    asyncio.run(run())
+    assert s3.aborted == ["key"]
+    assert s3.objects == {}
+
+
+class Form(BaseModel):
+    title: str
+    amount: float
+
+
+def multipart(fields: dict, filename=None, content_type=None, data=b""):
+    body = b""
+    for name, value in fields.items():
+        body += (
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data;"
+            f' name="{name}"\r\n\r\n{value}\r\n'
+        ).encode()
+    if filename is not None:
+        body += (
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data;"
+            f' name="attachment"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def request(body: bytes, chunk=64, length=None):
+    chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+
+    async def receive():
+        data = chunks.pop(0) if chunks else b""
+        return {
+            "type": "http.request", "body": data, "more_body": bool(chunks)
+        }
+
+    headers = [(
+        b"content-type",
+        f"multipart/form-data; boundary={BOUNDARY}".encode(),
+    ), (b"content-length", str(length or len(body)).encode())]
+    return Request(
+        {"type": "http", "method": "POST", "headers": headers}, receive
+    )
+
+
+def read(body, **kwargs):
+    return asyncio.run(read_form(
+        request(body, length=kwargs.pop("length", None)), Form,
+        lambda name: f"user/{name}", **kwargs,
+    ))
+
+
+def test_fields_and_attachment(s3):
+    form, key = read(multipart(
+        {"title": "Lunch", "amount": "12.5"}, "receipt.pdf",
+        "application/pdf", PDF,
+    ))
+    assert form == Form(title="Lunch", amount=12.5)
+    assert key == "user/receipt.pdf"
+    assert s3.objects == {"user/receipt.pdf": PDF}
+
+
+def test_no_file(s3):
+    form, key = read(multipart({"title": "Lunch", "amount": "1"}, "", ""))
+    assert key is None
+    assert s3.objects == {}
+
+
+def test_declined_file_is_skipped(s3):
+    async def accept_file():
+        return False
+
+    _, key = read(multipart(
+        {"title": "Lunch", "amount": "1"}, "receipt.pdf",
+        "application/pdf", PDF,
+    ), accept_file=accept_file)
+    assert key is None
+    assert s3.objects == {}
+
+
+def test_invalid_fields_store_nothing(s3, monkeypatch):
+    monkeypatch.setattr(settings, "upload_part_size", 16)
+    with pytest.raises(RequestValidationError):
+        read(multipart(
+            {"title": "Lunch", "amount": "lots"}, "receipt.pdf",
+            "application/pdf", PDF,
+        ))
+    assert s3.objects == {}
+    assert s3.aborted == ["user/receipt.pdf"]
+
+
+def test_type_refused(s3):
+    with pytest.raises(AppException.AttachmentType):
+        read(multipart({}, "run.sh", "text/x-sh", b"#!/bin/sh\n"))
+    with pytest.raises(AppException.AttachmentType):
+        read(multipart({}, "fake.pdf", "application/pdf", b"#!/bin/sh\n"))
+    assert s3.objects == {}
+
+
+def test_too_large(s3, monkeypatch):
+    monkeypatch.setattr(settings, "attachment_max_bytes", 50)
+    monkeypatch.setattr(settings, "upload_part_size", 16)
+    body = multipart({"title": "t", "amount": "1"}, "big.pdf",
+                     "application/pdf", PDF)
+    # Refused on its declared length, before a byte is read
+    with pytest.raises(AppException.AttachmentTooLarge):
+        read(body, length=10 ** 9)
+    assert s3.uploads == {}
+    with pytest.raises(AppException.AttachmentTooLarge):
+        read(body)
+    assert s3.objects == {}
+    assert s3.uploads == {}
+
+
+def test_urlencoded_form(s3):
+    body = b"title=Lunch&amount=3"
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    headers = [(b"content-type", b"application/x-www-form-urlencoded")]
+    form, key = asyncio.run(read_form(
+        Request({"type": "http", "method": "POST", "headers": headers},
+                receive),
+        Form, lambda name: f"user/{name}",
+    ))
+    assert form == Form(title="Lunch", amount=3)
+    assert key is None
@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+
+import pytest
+from app.models import Expense
+from app.utils.app_exceptions import AppException
+from app.utils.versioned import current_row, not_written
+from sqlalchemy.dialects import postgresql
+
+USER_ID = uuid.uuid4()
+
+
+class FakeDB:
+    def __init__(self, version):
+        self.version = version
+        self.queries = 0
+
+    async def scalar(self, q):
+        self.queries += 1
+        return self.version
+
+
+def why(db, version):
+    return asyncio.run(not_written(
+        db, Expense, 7, USER_ID, version, {"expense_id": 7}
+    ))
+
+
+def test_current_row_is_locked_and_checks_the_version():
+    sql = str(current_row(Expense, 7, USER_ID, 3, Expense.amount).compile(
+        dialect=postgresql.dialect()
+    ))
+    assert "expenses.version = " in sql
+    assert sql.rstrip().endswith("FOR UPDATE")
+
+
+def test_unversioned_miss_is_not_found_without_asking():
+    db = FakeDB(version=4)
+    assert isinstance(why(db, None), AppException.GetObject)
+    assert db.queries == 0
+
+
+@pytest.mark.parametrize("current, expected", [
+    (4, AppException.StaleObject),
+    (None, AppException.GetObject),
+])
+def test_versioned_miss(current, expected):
+    error = why(FakeDB(current), 3)
+    assert isinstance(error, expected)
+    if current is not None:
+        assert error.status_code == 409
+        assert error.context == {"expense_id": 7, "version": 4}
@@ -0,0 +1,72 @@
+import axios from 'axios';
+import type { AxiosResponse, InternalAxiosRequestConfig } from 'axios';
+
+// The API sends an ETag with expense and invoice reads. The last body of
+// every GET is kept with it, so a loader revalidating an unchanged page
+// gets a 304 and the kept body instead of a fresh one.
+const MAX_ENTRIES = 500;
+
+type Entry = { etag: string; data: unknown };
+
+const cache = new Map<string, Entry>();
+
+declare global {
+  // eslint-disable-next-line no-var
+  var __etagCacheInstalled: boolean | undefined;
+}
+
+function cacheKey(config: InternalAxiosRequestConfig) {
+  // Bodies are per user, the token is part of the key
+  const auth = config.headers.get('Authorization') ?? '';
+  return `${auth} ${axios.getUri(config)}`;
+}
+
+function onRequest(config: InternalAxiosRequestConfig) {
+  if (config.method !== 'get') {
+    return config;
+  }
+  const entry = cache.get(cacheKey(config));
+  if (entry) {
+    config.headers.set('If-None-Match', entry.etag);
+  }
+  const validateStatus = config.validateStatus;
+  config.validateStatus = (status) =>
+    status === 304 || (validateStatus ? validateStatus(status) : status >= 200 && status < 300);
+  return config;
+}
+
+function onResponse(response: AxiosResponse) {
+  if (response.config.method !== 'get') {
+    return response;
+  }
+  const key = cacheKey(response.config);
+  if (response.status === 304) {
+    const entry = cache.get(key);
+    if (entry) {
+      // Most recently used goes last, the first one is evicted
+      cache.delete(key);
+      cache.set(key, entry);
+      return { ...response, status: 200, data: entry.data };
+    }
+    // Evicted while the request was out, ask again without the tag
+    response.config.headers.delete('If-None-Match');
+    return axios.request(response.config);
+  }
+  const etag = response.headers['etag'];
+  if (etag && response.status === 200) {
+    cache.delete(key);
+    cache.set(key, { etag, data: response.data });
+    if (cache.size > MAX_ENTRIES) {
+      cache.delete(cache.keys().next().value as string);
+    }
+  }
+  return response;
+}
+
+// Module state survives the dev server's rebuilds, the interceptors must be
+// added only once
+if (!global.__etagCacheInstalled) {
+  axios.interceptors.request.use(onRequest);
+  axios.interceptors.response.use(onResponse);
+  global.__etagCacheInstalled = true;
+}
@@ -3,6 +3,8 @@ import { createCookieSessionStorage, redirect } from '@remix-run/node';
 import { setVisitorCookieData } from '../visitors.server';
 import axios from 'axios';
 import { logger } from '~/logger.server';
+// Loaders revalidate their GETs against the API's ETags from here on
+import '~/modules/etag-cache.server';
 
 // type UserRegistrationData = {
 //   name: string;
@@ -43,15 +43,7 @@ async function handleUpdate(
   request: Request, id: string, userId: string, formData: FormData
 ): Promise<Response> {
   try {
-    const expense = await axios.put(`/expenses/${id}`, formData)
-    const logData = {
-      title: expense.data.title,
-      description: expense.data.description,
-      amount: expense.data.amount,
-      currency_code: expense.data.currency_code,
-      expense_id: expense.data.id
-    }
-    await axios.post("/expense_logs/", logData)
+    await axios.put(`/expenses/${id}?log=true`, formData)
     // emitter.emit(userId);
     return json({ success: true });
   } catch (error) {
@@ -94,26 +86,15 @@ export async function action({ params, request }: ActionFunctionArgs) {
   throw new Response('Bad request', { status: 400 });
 }
 
-async function getLogs(id) {
-  // const delay = (ms) => new Promise(resolve => setTimeout(resolve, ms));
-  // await delay(5000)
-  const expenseLogsResponse = await axios.get(`/expense_logs/?expense_id=${id}`)
-  const expenseLogs = expenseLogsResponse.data
-  return expenseLogs
-}
-
 export async function loader({ request, params }: LoaderFunctionArgs) {
   await requireUserId(request);
   const { id } = params;
   if (!id) throw Error('id route parameter must be defined');
 
   try {
-    // TODO: this can be nested expense/logs response?
-    const expense_response = await axios.get(`/expenses/${id}`)
-    const expense = expense_response.data
-    // Note we are not awaiting the expenseLogs promise here and passing it unresolved,
-    // so it will be awaited in the Suspense/Await boundary
-    const expenseLogs = getLogs(id)
+    // The latest logs come embedded, one request and one query
+    const expense_response = await axios.get(`/expenses/${id}?include=logs`)
+    const { logs: expenseLogs, ...expense } = expense_response.data
     return defer({ expense, expenseLogs });
   } catch (error) {
     logger.error(new Error(error as string))
@@ -139,6 +120,8 @@ export default function Component() {
         <Input label="Title:" type="text" name="title" defaultValue={expense.title} required />
         <Textarea label="Description:" name="description" defaultValue={expense.description || ''} />
         <Input label="Amount (in USD):" type="number" defaultValue={expense.amount} name="amount" required />
+        {/* Saving over a newer version fails with 409 instead of overwriting it */}
+        <input type="hidden" name="version" value={expense.version} />
         {(isUploadingAttachment || expense.attachment) && !isRemovingAttachment ? (
           <Attachment
             label="Current Attachment"
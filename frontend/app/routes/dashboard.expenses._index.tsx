@@ -13,16 +13,8 @@ export async function action({ request }: ActionFunctionArgs) {
   const formData = await request.formData();
 
   try {
-    // The /expenses endpoint accepts form data where the /expense_logs endpoint accepts JSON
-    const expenseResponse = await axios.post("/expenses/", formData)
-    const logRecord = {
-      title: expenseResponse.data.title,
-      description: expenseResponse.data.description,
-      amount: expenseResponse.data.amount,
-      currency_code: expenseResponse.data.currency_code,
-      expense_id: expenseResponse.data.id
-    }
-    await axios.post("/expense_logs/", logRecord)
+    // log=true writes the expense log along with the expense, in one commit
+    const expenseResponse = await axios.post("/expenses/?log=true", formData)
     return redirect(`/dashboard/expenses/${expenseResponse.data.id}`);
     // emitter.emit(userId);
   } catch(error) {
@@ -48,8 +48,7 @@ async function handleUpdate(formData: FormData, id: string): Promise<Response> {
   try {
     invoiceData.attachment = null
     invoiceData.currency_code = "USD"
-    await axios.put(`/invoices/${id}`, {...invoiceData, invoice_id: id})
-    await axios.post("/invoice_logs/", {...invoiceData, invoice_id: id})
+    await axios.put(`/invoices/${id}?log=true`, {...invoiceData, version: formData.get('version'), invoice_id: id})
     return json({ success: true });
   } catch (error) {
     logger.error(new Error(error as string))
@@ -102,11 +101,9 @@ export async function loader({ request, params }: LoaderFunctionArgs) {
   if (!id) throw Error('id route parameter must be defined');
 
   try {
-    // TODO: this can be nested expense/logs response?
-    const invoice_response = await axios.get(`/invoices/${id}`)
-    const invoice = invoice_response.data
-    const invoiceLogsResponse = await axios.get(`/invoice_logs/?invoice_id=${id}`)
-    const invoiceLogs = invoiceLogsResponse.data
+    // The latest logs come embedded, one request and one query
+    const invoice_response = await axios.get(`/invoices/${id}?include=logs`)
+    const { logs: invoiceLogs, ...invoice } = invoice_response.data
     return defer({ invoice, invoiceLogs });
   } catch (error) {
     logger.error(new Error(error as string))
@@ -137,6 +134,8 @@ export default function Component() {
         <Input label="Title:" type="text" name="title" defaultValue={invoice.title} required />
         <Textarea label="Description:" name="description" defaultValue={invoice.description || ''} />
         <Input label="Amount (in USD):" type="number" defaultValue={invoice.amount} name="amount" required />
+        {/* Saving over a newer version fails with 409 instead of overwriting it */}
+        <input type="hidden" name="version" value={invoice.version} />
         {(isUploadingAttachment || invoice.attachment) && !isRemovingAttachment ? (
           <Attachment
             label="Current Attachment"
@@ -28,9 +28,7 @@ export async function action({ request }: ActionFunctionArgs) {
     // return redirect(`/dashboard/expenses/${expense.id}`);
   
     try {
-      const invoiceResponse = await axios.post("/invoices/", invoiceData)
-      delete invoiceData.attachment
-      await axios.post("/invoice_logs/", {...invoiceData, invoice_id: invoiceResponse.data.id})
+      const invoiceResponse = await axios.post("/invoices/?log=true", invoiceData)
       return redirect(`/dashboard/income/${invoiceResponse.data.id}`);
     } catch(error) {
       logger.error(new Error(error as string))
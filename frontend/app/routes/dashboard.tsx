@@ -28,10 +28,9 @@ export async function loader({ request }: LoaderFunctionArgs) {
   // throw Error('Something went wrong on the BE!');
   await requireUserId(request);
   try {
-    const firstExpense = (await axios.get('/expenses/first')).data
-    const firstInvoice = (await axios.get('/invoices/first')).data
+    const dashboard = (await axios.get('/dashboard/')).data
     return json(
-      { firstExpense, firstInvoice }
+      { firstExpense: dashboard.latest_expense, firstInvoice: dashboard.latest_invoice }
     );
   } catch(error) {
     logger.error( new Error(error as string))